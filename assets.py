@@ -0,0 +1,103 @@
+"""
+Fingerprint static asset (JS, CSS, ảnh) theo nội dung + cache immutable, render HTML một lần
+- build_asset_manifest() băm nội dung file lúc startup: /static/js/app.v2.js -> /static/js/app.v2.<hash>.js
+- Template dùng {{ asset_url('/static/js/app.v2.js') }}; URL đổi khi và chỉ khi nội dung đổi
+- FingerprintedStaticFiles trả URL có hash đúng với Cache-Control immutable (1 năm), trình duyệt
+  không gửi request revalidate nào cho static ở lần truy cập sau
+- URL có hash cũ (HTML cũ sau deploy) vẫn trả file hiện tại nhưng no-cache, không bao giờ cache sai
+- index.html/login.html render một lần sau khi có manifest; mỗi request chỉ trả bytes có sẵn kèm ETag
+"""
+import hashlib
+import os
+import re
+
+from fastapi import Request
+from fastapi.responses import HTMLResponse, Response
+
+from compression import PrecompressedStaticFiles
+
+ASSET_EXTENSIONS = (".js", ".css", ".png", ".jpg", ".jpeg", ".gif", ".svg", ".webp", ".ico", ".woff", ".woff2")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+_HASH_LENGTH = 12
+_FINGERPRINT_PATTERN = re.compile(r"^(?P<base>.+)\.(?P<hash>[0-9a-f]{%d})(?P<ext>\.[A-Za-z0-9]+)$" % _HASH_LENGTH)
+
+# URL gốc -> URL có hash, và (thư mục mount, đường dẫn tương đối) -> hash hiện tại
+_asset_urls = {}
+_asset_hashes = {}
+_rendered_pages = {}
+
+
+def _file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as asset_file:
+        for chunk in iter(lambda: asset_file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:_HASH_LENGTH]
+
+
+def build_asset_manifest(mounts) -> int:
+    """mounts: [(url_prefix, thư mục mount, [thư mục con/file cần fingerprint])]; trả về số asset"""
+    urls = {}
+    hashes = {}
+    for url_prefix, directory, entries in mounts:
+        for entry in entries:
+            start = os.path.join(directory, entry)
+            if os.path.isfile(start):
+                candidates = [start]
+            else:
+                candidates = [os.path.join(root, name) for root, _, files in os.walk(start) for name in files]
+            for path in candidates:
+                relative = os.path.relpath(path, directory).replace(os.sep, "/")
+                if not relative.endswith(ASSET_EXTENSIONS) or _FINGERPRINT_PATTERN.match(relative):
+                    continue
+                file_hash = _file_hash(path)
+                base, extension = os.path.splitext(relative)
+                urls[f"{url_prefix}/{relative}"] = f"{url_prefix}/{base}.{file_hash}{extension}"
+                hashes[(directory, relative)] = file_hash
+    _asset_urls.clear()
+    _asset_urls.update(urls)
+    _asset_hashes.clear()
+    _asset_hashes.update(hashes)
+    _rendered_pages.clear()
+    return len(urls)
+
+
+def asset_url(url: str) -> str:
+    """URL có fingerprint (Jinja global); asset ngoài manifest giữ nguyên URL"""
+    return _asset_urls.get(url, url)
+
+
+class FingerprintedStaticFiles(PrecompressedStaticFiles):
+    """Nhận URL dạng name.<hash>.ext, trả file name.ext (kể cả bản .br/.gz nén sẵn)"""
+
+    async def get_response(self, path: str, scope):
+        match = _FINGERPRINT_PATTERN.match(path)
+        if match is None:
+            return await super().get_response(path, scope)
+        real_path = match["base"] + match["ext"]
+        response = await super().get_response(real_path, scope)
+        if _asset_hashes.get((str(self.directory), real_path)) == match["hash"]:
+            response.headers["cache-control"] = IMMUTABLE_CACHE_CONTROL
+        else:
+            # Hash cũ/không khớp: trả nội dung hiện tại nhưng không cho cache lâu
+            response.headers["cache-control"] = "no-cache"
+        return response
+
+
+def render_pages(templates, names) -> None:
+    """Render các trang tĩnh một lần (gọi sau build_asset_manifest)"""
+    for name in names:
+        content = templates.get_template(name).render().encode("utf-8")
+        etag = '"' + hashlib.sha256(content).hexdigest()[:20] + '"'
+        _rendered_pages[name] = (content, etag)
+
+
+def page_response(request: Request, templates, name: str) -> Response:
+    """Trả trang đã render sẵn; HTML luôn revalidate (no-cache) để nhận URL asset mới sau deploy"""
+    if name not in _rendered_pages:
+        render_pages(templates, [name])
+    content, etag = _rendered_pages[name]
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag in [value.strip() for value in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+    return HTMLResponse(content, headers=headers)
@@ -0,0 +1,155 @@
+"""
+Benchmark encode JSON cho các response lớn nhất (danh sách task, cây thread):
+đường cũ (jsonable_encoder + JSONResponse/json.dumps) so với AppJSONResponse (orjson).
+Payload giả lập đúng shape của GET /api/tasks và GET /api/threads.
+
+Chạy:
+    python bench_json.py --tasks 1000 --threads 200 --replies 10
+"""
+import argparse
+import json
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+# Chỉ cần enum trong models, không kết nối DB thật (database.py tạo engine lúc import)
+os.environ.setdefault("SQLALCHEMY_DATABASE_URL", "sqlite://")
+
+from models import TaskPriority, TaskStatus  # noqa: E402
+from responses import AppJSONResponse  # noqa: E402
+
+NOW = datetime(2024, 5, 6, 9, 30, 15, 123456, tzinfo=timezone.utc)
+
+
+def _user(user_id: int) -> dict:
+    return {
+        "id": user_id,
+        "username": f"user{user_id}",
+        "email": f"user{user_id}@example.com",
+        "full_name": f"Nguyễn Văn {user_id}",
+        "avatar_url": f"/static/uploads/avatars/{user_id}.png",
+        "role": "member",
+        "is_active": True,
+        "created_at": NOW - timedelta(days=user_id),
+        "department": "Kỹ thuật",
+        "team": "Backend",
+    }
+
+
+def build_task_list(count: int) -> list:
+    """Giống TaskResponse: task + project_name + assignees + subtasks + progress"""
+    statuses = list(TaskStatus)
+    priorities = list(TaskPriority)
+    tasks = []
+    for index in range(count):
+        tasks.append({
+            "id": index + 1,
+            "title": f"Task {index} - cập nhật giao diện",
+            "description": "Mô tả chi tiết công việc " * 5,
+            "status": statuses[index % len(statuses)],
+            "priority": priorities[index % len(priorities)],
+            "project_id": index % 10 + 1,
+            "project_name": f"Project {index % 10 + 1}",
+            "due_date": NOW + timedelta(days=index % 30),
+            "tags": "frontend,urgent",
+            "position": index,
+            "created_at": NOW - timedelta(hours=index),
+            "updated_at": None if index % 3 else NOW,
+            "assignees": [_user(index % 7 + 1), _user(index % 5 + 10)],
+            "subtasks": [
+                {
+                    "id": index * 10 + sub,
+                    "task_id": index + 1,
+                    "title": f"Subtask {sub}",
+                    "is_done": bool(sub % 2),
+                    "created_at": NOW - timedelta(minutes=sub),
+                }
+                for sub in range(4)
+            ],
+            "total_subtasks": 4,
+            "completed_subtasks": 2,
+            "progress_percent": 50.0,
+        })
+    return tasks
+
+
+def build_thread_tree(count: int, replies: int) -> list:
+    """Giống _thread_to_dict: message top-level + replies"""
+    def message(message_id: int, parent_id):
+        return {
+            "id": message_id,
+            "project_id": 1,
+            "user_id": message_id % 9 + 1,
+            "content": f"Tin nhắn {message_id} @user{message_id % 9 + 1} xem giúp nhé",
+            "parent_id": parent_id,
+            "mentions": [message_id % 9 + 1],
+            "is_edited": False,
+            "is_deleted": False,
+            "created_at": NOW - timedelta(minutes=message_id),
+            "updated_at": None,
+            "user": _user(message_id % 9 + 1),
+        }
+
+    tree = []
+    for index in range(count):
+        thread = message(index + 1, None)
+        thread["replies"] = [
+            {**message(10000 + index * replies + reply, index + 1), "replies": []} for reply in range(replies)
+        ]
+        tree.append(thread)
+    return tree
+
+
+def encode_legacy(payload) -> bytes:
+    return JSONResponse(jsonable_encoder(payload)).body
+
+
+def encode_orjson(payload) -> bytes:
+    return AppJSONResponse(payload).body
+
+
+def encode_orjson_after_encoder(payload) -> bytes:
+    """Đường thực tế khi endpoint không khai báo response_model (FastAPI vẫn chạy jsonable_encoder)"""
+    return AppJSONResponse(jsonable_encoder(payload)).body
+
+
+def time_encode(func_, payload, repeat: int) -> float:
+    func_(payload)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func_(payload)
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON encode benchmark")
+    parser.add_argument("--tasks", type=int, default=1000)
+    parser.add_argument("--threads", type=int, default=200)
+    parser.add_argument("--replies", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    payloads = {
+        "task_list": build_task_list(args.tasks),
+        "thread_tree": build_thread_tree(args.threads, args.replies),
+    }
+    results = {}
+    for name, payload in payloads.items():
+        legacy_ms = time_encode(encode_legacy, payload, args.repeat)
+        orjson_ms = time_encode(encode_orjson, payload, args.repeat)
+        mixed_ms = time_encode(encode_orjson_after_encoder, payload, args.repeat)
+        results[name] = {
+            "bytes": len(encode_orjson(payload)),
+            "jsonable_encoder+json_ms": round(legacy_ms, 2),
+            "jsonable_encoder+orjson_ms": round(mixed_ms, 2),
+            "orjson_ms": round(orjson_ms, 2),
+            "speedup": round(legacy_ms / orjson_ms, 1) if orjson_ms else None,
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Benchmark throughput đăng nhập khi có burst login (giống 9h sáng)
+Đồng thời đo latency của một API sync thường (/api/auth/me, chạy trong threadpool
+của FastAPI) để kiểm tra API khác không bị xếp hàng sau bcrypt.
+
+Chạy server trước (uvicorn main:app), sau đó:
+    python bench_login.py --username admin --password admin123 --concurrency 50 --requests 500
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+def login_once(base_url: str, username: str, password: str):
+    """Trả về (status_code, latency giây)"""
+    body = urllib.parse.urlencode({"username": username, "password": password}).encode()
+    request = urllib.request.Request(
+        f"{base_url}/api/auth/login",
+        data=body,
+        headers={"Content-Type": "application/x-www-form-urlencoded"},
+        method="POST",
+    )
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=60) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except Exception:
+        status = 0
+    return status, time.perf_counter() - started
+
+
+def get_token(base_url: str, username: str, password: str) -> str:
+    body = urllib.parse.urlencode({"username": username, "password": password}).encode()
+    with urllib.request.urlopen(f"{base_url}/api/auth/login", data=body, timeout=60) as response:
+        return json.loads(response.read())["access_token"]
+
+
+def probe_api(base_url: str, token: str, stop_event: threading.Event, latencies: list):
+    """Gọi /api/auth/me liên tục trong lúc burst login để đo ảnh hưởng lên API thường"""
+    request = urllib.request.Request(f"{base_url}/api/auth/me", headers={"Authorization": f"Bearer {token}"})
+    while not stop_event.is_set():
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                response.read()
+            latencies.append(time.perf_counter() - started)
+        except Exception:
+            pass
+        time.sleep(0.05)
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Login throughput benchmark")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--username", default="admin")
+    parser.add_argument("--password", default="admin123")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    token = get_token(args.base_url, args.username, args.password)
+    api_latencies = []
+    stop_event = threading.Event()
+    probe = threading.Thread(target=probe_api, args=(args.base_url, token, stop_event, api_latencies), daemon=True)
+    probe.start()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(
+            lambda _: login_once(args.base_url, args.username, args.password),
+            range(args.requests),
+        ))
+    elapsed = time.perf_counter() - started
+
+    stop_event.set()
+    probe.join()
+
+    by_status = {}
+    for status, _ in results:
+        by_status[status] = by_status.get(status, 0) + 1
+    ok_latencies = [latency for status, latency in results if status == 200]
+
+    summary = {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "elapsed_s": round(elapsed, 2),
+        "successful_logins_per_s": round(len(ok_latencies) / elapsed, 2) if elapsed else 0,
+        "status_counts": by_status,
+        "login_latency_ms": {
+            "p50": round(percentile(ok_latencies, 50) * 1000, 1),
+            "p95": round(percentile(ok_latencies, 95) * 1000, 1),
+            "mean": round(statistics.mean(ok_latencies) * 1000, 1) if ok_latencies else 0,
+        },
+        "api_latency_ms_during_burst": {
+            "samples": len(api_latencies),
+            "p50": round(percentile(api_latencies, 50) * 1000, 1),
+            "p95": round(percentile(api_latencies, 95) * 1000, 1),
+            "max": round(max(api_latencies) * 1000, 1) if api_latencies else 0,
+        },
+    }
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
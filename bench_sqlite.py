@@ -0,0 +1,195 @@
+"""
+Benchmark SQLite: cấu hình mặc định (chỉ check_same_thread=False) so với SQLite profile
+(WAL + pragma, pool ghi với BEGIN IMMEDIATE + pool connection đọc, xem sqlite_profile.py).
+Workload giống API:
+- threads: nhiều thread đọc (list theo project) xen kẽ ghi (insert + commit), như handler def sync
+- async: nhiều handler async trên một event loop, mỗi handler giữ connection qua await (đọc, chờ
+  stream file, rồi ghi) như upload attachment
+
+Chạy:
+    python bench_sqlite.py --threads 16 --ops 300 --write-ratio 0.2 --async-handlers 16
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.pool import QueuePool
+
+from sqlite_profile import enable_sqlite_profile
+
+CONNECT_ARGS = {"check_same_thread": False}
+
+
+def build_default(url: str, threads: int):
+    engine = create_engine(url, connect_args=CONNECT_ARGS, pool_size=threads, max_overflow=0)
+    return engine, engine
+
+
+def build_profile(url: str, threads: int):
+    # Giống database.py: pool ghi bình thường (DB_POOL_SIZE=5, DB_MAX_OVERFLOW=10), ghi tuần tự hóa ở SQLite
+    writer = create_engine(url, connect_args=CONNECT_ARGS, poolclass=QueuePool, pool_size=5, max_overflow=10, pool_timeout=30)
+    reader = create_engine(url, connect_args=CONNECT_ARGS, poolclass=QueuePool, pool_size=max(1, threads), max_overflow=0)
+    enable_sqlite_profile(writer)
+    enable_sqlite_profile(reader, read_only=True)
+    return writer, reader
+
+
+def setup_schema(url: str, rows: int):
+    engine = create_engine(url, connect_args=CONNECT_ARGS)
+    with engine.begin() as connection:
+        connection.execute(text(
+            "CREATE TABLE tasks (id INTEGER PRIMARY KEY, project_id INTEGER, title TEXT, created_at TEXT)"
+        ))
+        connection.execute(text("CREATE INDEX idx_tasks_project ON tasks(project_id)"))
+        connection.execute(
+            text("INSERT INTO tasks (project_id, title, created_at) VALUES (:project_id, :title, datetime('now'))"),
+            [{"project_id": i % 20, "title": f"Task {i}"} for i in range(rows)],
+        )
+    engine.dispose()
+
+
+def run_op(writer, reader, write_ratio: float):
+    """Trả về (loại, latency giây, lỗi)"""
+    started = time.perf_counter()
+    is_write = random.random() < write_ratio
+    try:
+        if is_write:
+            with writer.begin() as connection:
+                connection.execute(
+                    text("INSERT INTO tasks (project_id, title, created_at) VALUES (:project_id, 'bench', datetime('now'))"),
+                    {"project_id": random.randint(0, 19)},
+                )
+                connection.execute(text("UPDATE tasks SET title = 'bench-updated' WHERE id = :id"), {"id": random.randint(1, 100)})
+        else:
+            with reader.connect() as connection:
+                connection.execute(
+                    text("SELECT id, title, created_at FROM tasks WHERE project_id = :project_id ORDER BY id DESC LIMIT 100"),
+                    {"project_id": random.randint(0, 19)},
+                ).fetchall()
+        error = None
+    except OperationalError as e:
+        error = str(e.orig)
+    return ("write" if is_write else "read"), time.perf_counter() - started, error
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def run_async_handler(writer, stream_seconds: float):
+    """Một request upload: đọc owner, await stream file (connection vẫn giữ), rồi ghi + commit"""
+    started = time.perf_counter()
+    connection = None
+    try:
+        connection = writer.connect()
+        connection.execute(text("SELECT id, title FROM tasks WHERE id = :id"), {"id": random.randint(1, 100)}).fetchall()
+        await asyncio.sleep(stream_seconds)
+        connection.execute(
+            text("INSERT INTO tasks (project_id, title, created_at) VALUES (:project_id, 'upload', datetime('now'))"),
+            {"project_id": random.randint(0, 19)},
+        )
+        connection.commit()
+        error = None
+    except Exception as e:
+        error = str(getattr(e, "orig", None) or e).splitlines()[0]
+    finally:
+        if connection is not None:
+            connection.close()
+    return "write", time.perf_counter() - started, error
+
+
+def _summary(name: str, results: list, elapsed: float) -> dict:
+    errors = [error for _, _, error in results if error]
+    ok = [(kind, latency) for kind, latency, error in results if not error]
+    summary = {"profile": name, "elapsed_s": round(elapsed, 2), "ops_per_s": round(len(ok) / elapsed, 1), "errors": len(errors)}
+    for kind in ("read", "write"):
+        latencies = [latency for op_kind, latency in ok if op_kind == kind]
+        summary[f"{kind}_latency_ms"] = {
+            "count": len(latencies),
+            "p50": round(percentile(latencies, 50) * 1000, 2),
+            "p95": round(percentile(latencies, 95) * 1000, 2),
+            "mean": round(statistics.mean(latencies) * 1000, 2) if latencies else 0,
+        }
+    if errors:
+        summary["sample_error"] = errors[0]
+    return summary
+
+
+def bench_async(name: str, builder, args) -> dict:
+    directory = tempfile.mkdtemp(prefix="bench_sqlite_")
+    url = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+    setup_schema(url, args.rows)
+    writer, reader = builder(url, args.async_handlers)
+
+    async def run_all():
+        results = []
+        for _ in range(args.async_rounds):
+            results += await asyncio.gather(*(
+                run_async_handler(writer, args.stream_ms / 1000) for _ in range(args.async_handlers)
+            ))
+        return results
+
+    started = time.perf_counter()
+    results = asyncio.run(run_all())
+    elapsed = time.perf_counter() - started
+    writer.dispose()
+    reader.dispose()
+    return _summary(f"{name} (async handlers)", results, elapsed)
+
+
+def bench(name: str, builder, args) -> dict:
+    directory = tempfile.mkdtemp(prefix="bench_sqlite_")
+    url = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+    setup_schema(url, args.rows)
+    writer, reader = builder(url, args.threads)
+
+    lock = threading.Lock()
+    results = []
+
+    def worker(_):
+        for _ in range(args.ops):
+            result = run_op(writer, reader, args.write_ratio)
+            with lock:
+                results.append(result)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        list(pool.map(worker, range(args.threads)))
+    elapsed = time.perf_counter() - started
+    writer.dispose()
+    reader.dispose()
+
+    return _summary(name, results, elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite default vs performance profile")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--ops", type=int, default=300, help="Số thao tác mỗi thread")
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--async-handlers", type=int, default=16, help="Số handler async chạy đồng thời (0 = bỏ qua)")
+    parser.add_argument("--async-rounds", type=int, default=20)
+    parser.add_argument("--stream-ms", type=float, default=5, help="Thời gian await giả lập stream file")
+    args = parser.parse_args()
+
+    results = [bench("default", build_default, args), bench("profile", build_profile, args)]
+    if args.async_handlers:
+        results += [bench_async("default", build_default, args), bench_async("profile", build_profile, args)]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
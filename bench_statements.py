@@ -0,0 +1,112 @@
+"""
+Micro-benchmark chi phí dựng/compile statement ORM cho các query chạy nhiều nhất:
+so sánh cách viết cũ (db.query(...).filter(...)) với routers/queries.py (lambda_stmt).
+Dùng SQLite in-memory để thời gian chạy SQL rất nhỏ, phần chênh lệch chủ yếu là
+overhead phía Python (dựng statement, cache key, compile).
+
+Chạy:
+    python bench_statements.py --iterations 5000
+"""
+import argparse
+import json
+import os
+import time
+
+# Không dùng DB thật: database.py đọc URL lúc import
+os.environ["SQLALCHEMY_DATABASE_URL"] = "sqlite://"
+
+from sqlalchemy import create_engine, func, select  # noqa: E402
+from sqlalchemy.orm import Session, joinedload  # noqa: E402
+from sqlalchemy.pool import StaticPool  # noqa: E402
+
+from database import Base  # noqa: E402
+from models import Notification, Project, Task, TaskAssignee, User  # noqa: E402
+from routers.queries import (  # noqa: E402
+    get_task_by_id,
+    get_task_with_members,
+    get_user_by_username,
+    unread_count_statement,
+)
+
+
+def seed(db: Session):
+    user = User(username="bench", email="bench@example.com", hashed_password="x", full_name="Bench")
+    db.add(user)
+    db.flush()
+    project = Project(name="Bench project", owner_id=user.id)
+    db.add(project)
+    db.flush()
+    task = Task(title="Bench task", project_id=project.id)
+    db.add(task)
+    db.flush()
+    db.add(TaskAssignee(task_id=task.id, user_id=user.id))
+    for index in range(20):
+        db.add(Notification(user_id=user.id, type="task_assigned", title=f"N{index}", message="bench"))
+    db.commit()
+    return user.id, task.id
+
+
+def legacy_cases(user_id: int, task_id: int) -> dict:
+    return {
+        "user_by_username": lambda db: db.query(User).filter(User.username == "bench").first(),
+        "task_by_id": lambda db: db.query(Task).filter(Task.id == task_id).first(),
+        "task_with_members": lambda db: db.query(Task).options(
+            joinedload(Task.assignees).joinedload(TaskAssignee.user),
+            joinedload(Task.project).joinedload(Project.team_members),
+        ).filter(Task.id == task_id).first(),
+        "unread_count": lambda db: db.scalar(
+            select(func.count()).select_from(Notification).where(
+                Notification.user_id == user_id,
+                Notification.is_read == False
+            )
+        ),
+    }
+
+
+def cached_cases(user_id: int, task_id: int) -> dict:
+    return {
+        "user_by_username": lambda db: get_user_by_username(db, "bench"),
+        "task_by_id": lambda db: get_task_by_id(db, task_id),
+        "task_with_members": lambda db: get_task_with_members(db, task_id),
+        "unread_count": lambda db: db.scalar(unread_count_statement(user_id)),
+    }
+
+
+def time_case(db: Session, func_, iterations: int) -> float:
+    """Micro giây trung bình mỗi lần gọi (identity map được xóa để lần nào cũng chạy SQL)"""
+    for _ in range(min(100, iterations)):
+        func_(db)
+        db.expunge_all()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func_(db)
+        db.expunge_all()
+    return (time.perf_counter() - started) / iterations * 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ORM statement compile overhead benchmark")
+    parser.add_argument("--iterations", type=int, default=5000)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    with Session(engine) as db:
+        user_id, task_id = seed(db)
+        legacy = legacy_cases(user_id, task_id)
+        cached = cached_cases(user_id, task_id)
+        results = {}
+        for name in legacy:
+            legacy_us = time_case(db, legacy[name], args.iterations)
+            cached_us = time_case(db, cached[name], args.iterations)
+            results[name] = {
+                "legacy_us": round(legacy_us, 1),
+                "cached_us": round(cached_us, 1),
+                "saved_us": round(legacy_us - cached_us, 1),
+                "saved_pct": round((legacy_us - cached_us) / legacy_us * 100, 1) if legacy_us else 0,
+            }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
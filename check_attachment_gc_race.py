@@ -0,0 +1,150 @@
+"""
+Kiểm tra upload attachment không bị mất khi job GC (collect_garbage) chạy đúng giữa lúc đưa blob
+vào storage (_place_blob) và lúc gắn ref (_attach_placed): upload trùng nội dung với một blob
+ref_count = 0 đã quá hạn, GC xóa dòng + file ở giữa, upload phải đưa lại file của nó.
+
+Chạy trên SQLite và thư mục storage tạm (không đụng DB/static/uploads thật):
+    python check_attachment_gc_race.py
+Exit code 1 nếu có bước lỗi.
+"""
+import asyncio
+import hashlib
+import io
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+
+_workdir = tempfile.mkdtemp(prefix="check_attachment_gc_")
+os.environ["SQLALCHEMY_DATABASE_URL"] = f"sqlite:///{os.path.join(_workdir, 'check.db')}"
+os.environ["ATTACHMENT_GC_INTERVAL_SECONDS"] = "0"
+
+from starlette.datastructures import Headers, UploadFile  # noqa: E402
+
+import routers.attachment_store as attachment_store  # noqa: E402
+from database import Base, SessionLocal, engine  # noqa: E402
+from models import Attachment, AttachmentRef  # noqa: E402
+from routers.storage import LocalStorage  # noqa: E402
+
+storage = LocalStorage(Path(_workdir) / "uploads")
+attachment_store.storage = storage
+
+
+def _check(name: str, condition: bool, failures: list):
+    print(f"{'✓' if condition else '✗'} {name}")
+    if not condition:
+        failures.append(name)
+
+
+def _expired_blob(content: bytes, filename: str) -> str:
+    """Blob đã có trong storage, ref_count = 0 và quá thời gian chờ: GC sẽ xóa ở lần chạy tới"""
+    sha256 = hashlib.sha256(content).hexdigest()
+    key = attachment_store._blob_path(sha256, filename)
+    fd, tmp_path = tempfile.mkstemp(dir=_workdir)
+    with os.fdopen(fd, "wb") as tmp_file:
+        tmp_file.write(content)
+    storage.put_file(Path(tmp_path), key)
+    db = SessionLocal()
+    try:
+        db.add(Attachment(
+            sha256=sha256, size=len(content), content_type="text/plain", storage_path=key,
+            ref_count=0, unreferenced_at=datetime.utcnow() - timedelta(days=1),
+        ))
+        db.commit()
+    finally:
+        db.close()
+    return sha256
+
+
+def _run_gc_after_place(collected: list):
+    """Bọc _place_blob: chạy GC (session riêng) ngay sau lần đưa blob vào storage đầu tiên"""
+    place_blob = attachment_store._place_blob
+
+    async def place_then_gc(db, staged):
+        storage_path = await place_blob(db, staged)
+        if not collected:
+            gc_db = SessionLocal()
+            try:
+                collected.append(attachment_store.collect_garbage(gc_db, grace_seconds=0))
+            finally:
+                gc_db.close()
+        return storage_path
+
+    attachment_store._place_blob = place_then_gc
+    return place_blob
+
+
+def _upload(content: bytes, filename: str) -> UploadFile:
+    return UploadFile(
+        io.BytesIO(content), size=len(content), filename=filename,
+        headers=Headers({"content-type": "text/plain"}),
+    )
+
+
+def _check_blob(db, sha256: str, label: str, failures: list):
+    attachment = db.query(Attachment).filter(Attachment.sha256 == sha256).first()
+    _check(f"{label}: attachment row exists", attachment is not None, failures)
+    if attachment is None:
+        return
+    _check(f"{label}: ref_count = 1", attachment.ref_count == 1, failures)
+    _check(f"{label}: blob exists in storage", storage.exists(attachment.storage_path), failures)
+    refs = db.query(AttachmentRef).filter(AttachmentRef.attachment_id == attachment.id).count()
+    _check(f"{label}: one ref", refs == 1, failures)
+
+
+async def check_single(failures: list):
+    print("\n[store_attachment]")
+    content = "Biên bản họp ✓\n".encode("utf-8") * 512
+    sha256 = _expired_blob(content, "bien-ban.txt")
+    collected = []
+    place_blob = _run_gc_after_place(collected)
+    db = SessionLocal()
+    try:
+        await attachment_store.store_attachment(db, _upload(content, "bien-ban.txt"), "comment", "comment", 1)
+        db.commit()
+        _check("GC deleted the expired blob between place and attach", collected == [1], failures)
+        _check_blob(db, sha256, "re-uploaded blob", failures)
+    finally:
+        db.close()
+        attachment_store._place_blob = place_blob
+
+
+async def check_batch(failures: list):
+    print("\n[store_attachments]")
+    reused = "Báo cáo tuần ✓\n".encode("utf-8") * 512
+    fresh = "Báo cáo tháng ✓\n".encode("utf-8") * 512
+    reused_sha256 = _expired_blob(reused, "bao-cao-tuan.txt")
+    collected = []
+    place_blob = _run_gc_after_place(collected)
+    db = SessionLocal()
+    try:
+        await attachment_store.store_attachments(
+            db, [_upload(reused, "bao-cao-tuan.txt"), _upload(fresh, "bao-cao-thang.txt")], "worklog", "worklog", 1,
+        )
+        db.commit()
+        _check("GC deleted the expired blob between place and attach", collected == [1], failures)
+        _check_blob(db, reused_sha256, "re-uploaded blob", failures)
+        _check_blob(db, hashlib.sha256(fresh).hexdigest(), "new blob", failures)
+    finally:
+        db.close()
+        attachment_store._place_blob = place_blob
+
+
+def main():
+    Base.metadata.create_all(bind=engine)
+    failures = []
+    asyncio.run(check_single(failures))
+    asyncio.run(check_batch(failures))
+    staging = Path(_workdir) / "uploads" / attachment_store.BLOB_SUBDIR / ".staging"
+    leftovers = [path.name for path in staging.glob("*")] if staging.exists() else []
+    _check("no temp files left", not leftovers, failures)
+
+    if failures:
+        print(f"\n{len(failures)} bước lỗi")
+        sys.exit(1)
+    print("\nAttachment upload/GC race OK")
+
+
+if __name__ == "__main__":
+    main()
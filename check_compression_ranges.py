@@ -0,0 +1,96 @@
+"""
+Kiểm tra CompressionMiddleware không nén response tải file theo Range (routers/attachments.py):
+206 + Content-Range và 200 + Accept-Ranges phải giữ nguyên byte gốc dù client gửi
+Accept-Encoding: gzip, br; response JSON lớn vẫn được nén như cũ.
+
+Chạy: python check_compression_ranges.py   (exit code 1 nếu có bước lỗi)
+"""
+import asyncio
+import os
+import sys
+import tempfile
+
+from fastapi.responses import FileResponse
+
+from compression import CompressionMiddleware
+from responses import AppJSONResponse
+from routers.attachments import _PartialFileResponse
+
+PAYLOAD = "Nhật ký công việc ✓\n".encode("utf-8") * 300
+
+
+def _check(name: str, condition: bool, failures: list):
+    print(f"{'✓' if condition else '✗'} {name}")
+    if not condition:
+        failures.append(name)
+
+
+async def _call(response, headers: dict):
+    """Chạy response qua CompressionMiddleware như một request GET; trả về (status, headers, body)"""
+    scope = {
+        "type": "http", "method": "GET", "path": "/", "query_string": b"",
+        "headers": [(name.lower().encode(), value.encode()) for name, value in headers.items()],
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    async def app(scope, receive, send):
+        await response(scope, receive, send)
+
+    await CompressionMiddleware(app)(scope, receive, send)
+    start = messages[0]
+    response_headers = {name.decode().lower(): value.decode() for name, value in start["headers"]}
+    body = b"".join(message.get("body", b"") for message in messages[1:])
+    return start["status"], response_headers, body
+
+
+async def run_checks(path: str) -> list:
+    failures = []
+    accept = {"Accept-Encoding": "gzip, br"}
+    size = len(PAYLOAD)
+
+    range_headers = {
+        "ETag": '"blob"', "Accept-Ranges": "bytes",
+        "Content-Range": f"bytes 0-2999/{size}", "Content-Length": "3000",
+    }
+    status, headers, body = await _call(
+        _PartialFileResponse(path, 0, 2999, headers=range_headers, media_type="text/plain"),
+        {**accept, "Range": "bytes=0-2999"},
+    )
+    _check("206 Range response stays 206", status == 206, failures)
+    _check("206 Range response is not compressed", "content-encoding" not in headers, failures)
+    _check("206 Range body is the raw byte range", body == PAYLOAD[:3000], failures)
+
+    status, headers, body = await _call(
+        FileResponse(path, headers={"ETag": '"blob"', "Accept-Ranges": "bytes"}, media_type="text/plain"), accept
+    )
+    _check("full download with Accept-Ranges is not compressed", "content-encoding" not in headers, failures)
+    _check("full download body is the raw file", status == 200 and body == PAYLOAD, failures)
+
+    status, headers, body = await _call(AppJSONResponse({"content": PAYLOAD.decode("utf-8")}), accept)
+    _check("large JSON response is still compressed", headers.get("content-encoding") in ("br", "gzip"), failures)
+    return failures
+
+
+def main():
+    fd, path = tempfile.mkstemp(prefix=".check-", suffix=".txt")
+    with os.fdopen(fd, "wb") as tmp_file:
+        tmp_file.write(PAYLOAD)
+    try:
+        failures = asyncio.run(run_checks(path))
+    finally:
+        os.remove(path)
+
+    if failures:
+        print(f"\n{len(failures)} bước lỗi")
+        sys.exit(1)
+    print("\nCompression + Range OK")
+
+
+if __name__ == "__main__":
+    main()
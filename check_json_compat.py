@@ -0,0 +1,53 @@
+"""
+Kiểm tra AppJSONResponse (orjson) cho ra cùng dữ liệu với JSONResponse mặc định của FastAPI
+(jsonable_encoder + json.dumps): datetime có/không timezone, date, Enum, key số, Decimal,
+set, chuỗi tiếng Việt và payload lớn (task list, thread tree).
+
+Chạy: python check_json_compat.py   (exit code 1 nếu có khác biệt)
+"""
+import json
+import sys
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+
+from bench_json import build_task_list, build_thread_tree, encode_legacy, encode_orjson, encode_orjson_after_encoder
+from models import TaskStatus, UserRole
+
+CASES = {
+    "naive datetime": {"at": datetime(2024, 1, 2, 3, 4, 5)},
+    "naive datetime with microseconds": {"at": datetime(2024, 1, 2, 3, 4, 5, 678)},
+    "aware datetime (UTC)": {"at": datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc)},
+    "aware datetime (+07:00)": {"at": datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone(timedelta(hours=7)))},
+    "date": {"day": date(2024, 2, 29)},
+    "str enum": {"status": TaskStatus.IN_PROGRESS, "role": UserRole.ADMIN},
+    "int keys": {"users": {1: {"id": 1}, 2: {"id": 2}}},
+    "decimal and set": {"amount": Decimal("12.50"), "tags": {"a"}},
+    "unicode": {"content": "Đã hoàn thành công việc ✓"},
+    "none and floats": {"value": None, "progress": 66.67, "zero": 0.0},
+    "task list": build_task_list(50),
+    "thread tree": build_thread_tree(20, 5),
+}
+
+
+def main():
+    failures = 0
+    for name, payload in CASES.items():
+        expected = json.loads(encode_legacy(payload))
+        for label, encode in (("orjson", encode_orjson), ("jsonable_encoder+orjson", encode_orjson_after_encoder)):
+            actual = json.loads(encode(payload))
+            if actual != expected:
+                failures += 1
+                print(f"✗ {name} ({label})")
+                print(f"    expected: {json.dumps(expected, ensure_ascii=False)[:300]}")
+                print(f"    actual:   {json.dumps(actual, ensure_ascii=False)[:300]}")
+                break
+        else:
+            print(f"✓ {name}")
+    if failures:
+        print(f"\n{failures} case khác với JSONResponse mặc định")
+        sys.exit(1)
+    print("\nOutput orjson khớp với JSONResponse mặc định")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Kiểm tra query plan của các query chính trong router: fail nếu có sequential scan
+trên bảng lớn (nghĩa là thiếu index cho filter/order_by của endpoint).
+
+Chạy sau khi đã chạy migration + seed dữ liệu (python seed_data.py):
+    python check_query_plans.py
+
+PostgreSQL: chạy EXPLAIN (FORMAT JSON) với enable_seqscan = off, nên dù bảng ít dữ liệu
+planner vẫn chọn index nếu có; còn Seq Scan nghĩa là không có index dùng được.
+SQLite: chạy EXPLAIN QUERY PLAN và fail với các dòng "SCAN <bảng>" không dùng index.
+Exit code 1 nếu có query bị sequential scan.
+"""
+import sys
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select, text
+
+from database import engine
+from models import ActivityLog, Notification, SubTask, Task, TaskAssignee, TaskComment, Thread, Todo, WorkLog
+
+# Bảng lớn dần theo thời gian, không được phép seq scan
+HOT_TABLES = {
+    "tasks", "task_assignees", "subtasks", "threads", "task_comments",
+    "activity_logs", "work_logs", "todos", "notifications",
+}
+
+
+def _first_id(connection, table: str) -> int:
+    """Lấy id có thật trong DB đã seed để plan sát với thực tế (mặc định 1)"""
+    return connection.execute(text(f"SELECT MIN(id) FROM {table}")).scalar() or 1
+
+
+def build_queries(connection) -> dict:
+    """Query chính của từng endpoint list (giống filter + order_by trong router)"""
+    user_id = _first_id(connection, "users")
+    project_id = _first_id(connection, "projects")
+    task_id = _first_id(connection, "tasks")
+    now = datetime.utcnow()
+    return {
+        "GET /api/tasks (assigned task ids)": (
+            select(TaskAssignee.task_id).where(TaskAssignee.user_id == user_id).distinct()
+        ),
+        "GET /api/tasks": (
+            select(Task)
+            .where(Task.project_id == project_id, Task.status == "todo")
+            .order_by(Task.position, Task.created_at.desc())
+            .limit(100)
+        ),
+        "GET /api/tasks (selectinload subtasks)": select(SubTask).where(SubTask.task_id.in_([task_id, task_id + 1])),
+        "GET /api/tasks (selectinload assignees)": (
+            select(TaskAssignee).where(TaskAssignee.task_id.in_([task_id, task_id + 1]))
+        ),
+        "GET /api/threads": (
+            select(Thread)
+            .where(Thread.project_id == project_id, Thread.parent_id == None, Thread.is_deleted == False)
+            .order_by(Thread.created_at.asc())
+        ),
+        "GET /api/threads (replies)": (
+            select(Thread)
+            .where(Thread.project_id == project_id, Thread.parent_id.in_([1, 2]), Thread.is_deleted == False)
+            .order_by(Thread.created_at.asc())
+        ),
+        "GET /api/comments": (
+            select(TaskComment)
+            .where(TaskComment.task_id == task_id, TaskComment.is_deleted == False)
+            .order_by(TaskComment.created_at.asc())
+        ),
+        "GET /api/activities": (
+            select(ActivityLog)
+            .where(ActivityLog.project_id == project_id)
+            .order_by(ActivityLog.created_at.desc())
+            .limit(50)
+        ),
+        "GET /api/work-logs": (
+            select(WorkLog)
+            .where(WorkLog.owner_id == user_id)
+            .order_by(WorkLog.updated_at.desc().nullslast(), WorkLog.created_at.desc())
+        ),
+        "GET /api/todos": (
+            select(Todo)
+            .where(Todo.owner_id == user_id, Todo.planned_date >= now - timedelta(days=7), Todo.planned_date <= now)
+            .order_by(Todo.planned_date.asc())
+        ),
+        "GET /api/notifications": (
+            select(Notification)
+            .where(Notification.user_id == user_id)
+            .order_by(Notification.created_at.desc())
+            .limit(50)
+        ),
+        "GET /api/notifications/unread-count": (
+            select(func.count()).select_from(Notification)
+            .where(Notification.user_id == user_id, Notification.is_read == False)
+        ),
+    }
+
+
+def _walk_postgres_plan(node: dict, found: list):
+    if node.get("Node Type") == "Seq Scan" and node.get("Relation Name") in HOT_TABLES:
+        found.append(f"Seq Scan on {node['Relation Name']}")
+    for child in node.get("Plans", []):
+        _walk_postgres_plan(child, found)
+
+
+def seq_scans(connection, statement) -> list:
+    """Danh sách sequential scan trên HOT_TABLES trong plan của statement"""
+    sql = str(statement.compile(dialect=connection.dialect, compile_kwargs={"literal_binds": True}))
+    found = []
+    if connection.dialect.name == "postgresql":
+        plan = connection.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+        _walk_postgres_plan(plan[0]["Plan"], found)
+    else:
+        for row in connection.execute(text(f"EXPLAIN QUERY PLAN {sql}")):
+            detail = row[-1]
+            parts = detail.split()
+            if len(parts) >= 2 and parts[0] == "SCAN" and parts[1] in HOT_TABLES and "USING" not in detail:
+                found.append(detail)
+    return found
+
+
+def main():
+    failures = 0
+    with engine.connect() as connection:
+        if connection.dialect.name == "postgresql":
+            connection.execute(text("SET enable_seqscan = off"))
+        for name, statement in build_queries(connection).items():
+            scans = seq_scans(connection, statement)
+            if scans:
+                failures += 1
+                print(f"✗ {name}: {', '.join(scans)}")
+            else:
+                print(f"✓ {name}")
+    if failures:
+        print(f"\n{failures} query bị sequential scan, cần thêm index (xem migrate_composite_indexes.sql)")
+        sys.exit(1)
+    print("\nTất cả query đều dùng index")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Kiểm tra storage backend (routers/storage.py): put/exists/list/local_copy/delete và presigned URL
+(tải được, hỗ trợ Range, đúng Content-Disposition).
+
+Local (luôn chạy, trong thư mục tạm):
+    python check_storage.py
+
+S3-compatible: chạy thêm khi có S3_BUCKET, VD với MinIO local:
+    docker run -p 9000:9000 -e MINIO_ROOT_USER=minio -e MINIO_ROOT_PASSWORD=minio123 minio/minio server /data
+    S3_ENDPOINT_URL=http://localhost:9000 S3_BUCKET=pm-check S3_ACCESS_KEY_ID=minio \
+        S3_SECRET_ACCESS_KEY=minio123 python check_storage.py
+Bucket được tạo nếu chưa có. Exit code 1 nếu có bước lỗi.
+"""
+import os
+import sys
+import tempfile
+import urllib.request
+import uuid
+from pathlib import Path
+
+from routers.storage import S3_BUCKET, LocalStorage, S3Storage
+
+PAYLOAD = "Báo cáo tiến độ ✓\n".encode("utf-8") * 4096
+
+
+def _temp_file(content: bytes) -> Path:
+    fd, tmp_path = tempfile.mkstemp(prefix=".check-")
+    with os.fdopen(fd, "wb") as tmp_file:
+        tmp_file.write(content)
+    return Path(tmp_path)
+
+
+def _check(name: str, condition: bool, failures: list):
+    print(f"{'✓' if condition else '✗'} {name}")
+    if not condition:
+        failures.append(name)
+
+
+def check_backend(label: str, storage) -> list:
+    print(f"\n[{label}]")
+    failures = []
+    key = f"check/{uuid.uuid4().hex}/báo cáo.txt"
+    tmp_path = _temp_file(PAYLOAD)
+    storage.put_file(tmp_path, key, "text/plain; charset=utf-8")
+    _check("put_file consumes temp file", not tmp_path.exists(), failures)
+    _check("exists after put", storage.exists(key), failures)
+    _check("list_keys finds key", key in set(storage.list_keys(key.rsplit("/", 1)[0] + "/")), failures)
+    with storage.local_copy(key) as copy:
+        _check("local_copy round-trips content", copy.read_bytes() == PAYLOAD, failures)
+
+    url = storage.presigned_url(key, "báo cáo.txt")
+    if url is not None:
+        request = urllib.request.Request(url, headers={"Range": "bytes=0-99"})
+        with urllib.request.urlopen(request) as response:
+            body = response.read()
+            _check("presigned URL serves Range (206)", response.status == 206 and body == PAYLOAD[:100], failures)
+            disposition = response.headers.get("Content-Disposition", "")
+            _check("presigned URL sets Content-Disposition", "filename*=utf-8''" in disposition, failures)
+
+    storage.delete(key)
+    _check("missing after delete", not storage.exists(key), failures)
+    return failures
+
+
+def main():
+    failures = []
+    with tempfile.TemporaryDirectory() as root:
+        failures += check_backend("local", LocalStorage(Path(root)))
+
+    if S3_BUCKET:
+        storage = S3Storage()
+        existing = [bucket["Name"] for bucket in storage.client.list_buckets().get("Buckets", [])]
+        if S3_BUCKET not in existing:
+            storage.client.create_bucket(Bucket=S3_BUCKET)
+        failures += check_backend(f"s3 {os.getenv('S3_ENDPOINT_URL') or 'aws'}/{S3_BUCKET}", storage)
+    else:
+        print("\n(bỏ qua s3: chưa đặt S3_BUCKET)")
+
+    if failures:
+        print(f"\n{len(failures)} bước lỗi")
+        sys.exit(1)
+    print("\nStorage backend OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Nén response theo Accept-Encoding (brotli nếu client hỗ trợ và đã cài package brotli, không thì gzip)
+- API: CompressionMiddleware nén response JSON/text lớn hơn ngưỡng; response streaming
+  (SSE, file) đi thẳng, không bị buffer
+- Response khác 200 hoặc có Content-Range/Accept-Ranges (tải file theo Range) không bao giờ bị nén:
+  byte offset của Range tính trên nội dung gốc, nén lại thì file tải tiếp bị hỏng
+- Static: precompress_static() tạo sẵn file .br/.gz lúc startup, PrecompressedStaticFiles
+  trả file nén sẵn nên không tốn CPU nén trên mỗi request
+"""
+import gzip
+import os
+import tempfile
+
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import FileResponse
+
+try:
+    import brotli
+except ImportError:  # brotli là tùy chọn, thiếu thì chỉ dùng gzip
+    brotli = None
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+# Mức brotli cho response động (nén mỗi request) và cho static (nén một lần)
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+BROTLI_STATIC_QUALITY = int(os.getenv("BROTLI_STATIC_QUALITY", "11"))
+
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/javascript",
+    "text/",
+    "image/svg+xml",
+)
+STATIC_EXTENSIONS = (".js", ".css", ".html", ".svg", ".json", ".map", ".txt")
+
+
+def negotiate_encoding(accept_encoding: str):
+    """Chọn "br" hoặc "gzip" từ header Accept-Encoding (bỏ qua encoding có q=0)"""
+    accepted = set()
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(name.strip())
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str, static: bool = False) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_STATIC_QUALITY if static else BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=9 if static else GZIP_LEVEL)
+
+
+def _is_compressible(status: int, headers: Headers) -> bool:
+    if status != 200 or "content-range" in headers or "accept-ranges" in headers:
+        return False
+    content_type = headers.get("content-type", "")
+    return "content-encoding" not in headers and content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+class CompressionMiddleware:
+    """Middleware ASGI nén response một phần body (không streaming) lớn hơn COMPRESSION_MIN_SIZE"""
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        state = {"start": None, "passthrough": False}
+
+        async def send_compressed(message):
+            if state["passthrough"]:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                state["start"] = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            start = state["start"]
+            body = message.get("body", b"")
+            headers = MutableHeaders(scope=start)
+            if (
+                message.get("more_body", False)
+                or len(body) < self.minimum_size
+                or not _is_compressible(start["status"], headers)
+            ):
+                # Streaming (SSE, file), response nhỏ hoặc Range: gửi nguyên
+                state["passthrough"] = True
+                await send(start)
+                await send(message)
+                return
+
+            compressed = compress(body, encoding)
+            headers["content-encoding"] = encoding
+            headers["content-length"] = str(len(compressed))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
+
+
+def _write_atomic(path: str, data: bytes):
+    # Nhiều worker khởi động cùng lúc có thể cùng ghi: ghi file tạm rồi rename
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".precompress-")
+    try:
+        with os.fdopen(fd, "wb") as tmp_file:
+            tmp_file.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def precompress_static(directories) -> int:
+    """Tạo file .gz/.br cạnh mỗi file static còn thiếu hoặc cũ hơn bản gốc; trả về số file đã tạo"""
+    encodings = [("gzip", ".gz")] + ([("br", ".br")] if brotli is not None else [])
+    created = 0
+    for directory in directories:
+        for root, _, files in os.walk(directory):
+            for name in files:
+                if not name.endswith(STATIC_EXTENSIONS):
+                    continue
+                source = os.path.join(root, name)
+                source_mtime = os.path.getmtime(source)
+                data = None
+                for encoding, suffix in encodings:
+                    target = source + suffix
+                    if os.path.exists(target) and os.path.getmtime(target) >= source_mtime:
+                        continue
+                    if data is None:
+                        with open(source, "rb") as source_file:
+                            data = source_file.read()
+                    _write_atomic(target, compress(data, encoding, static=True))
+                    created += 1
+    return created
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles trả file .br/.gz nén sẵn (nếu có và client chấp nhận)"""
+
+    async def get_response(self, path: str, scope):
+        response = await super().get_response(path, scope)
+        if not isinstance(response, FileResponse):
+            return response
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        compressed_path = response.path + (".br" if encoding == "br" else ".gz")
+        if encoding is None or not os.path.isfile(compressed_path):
+            response.headers.add_vary_header("Accept-Encoding")
+            return response
+
+        compressed = self.file_response(compressed_path, os.stat(compressed_path), scope)
+        if isinstance(compressed, FileResponse):
+            # Giữ content-type của file gốc thay vì application/gzip
+            compressed.headers["content-type"] = response.headers["content-type"]
+            compressed.headers["content-encoding"] = encoding
+        compressed.headers.add_vary_header("Accept-Encoding")
+        return compressed
@@ -1,10 +1,18 @@
+import itertools
 import os
+import threading
 
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from fastapi import Request
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
+from db_metrics import InstrumentedAsyncQueuePool, InstrumentedQueuePool, instrument_engine, pool_status
+from sqlite_profile import SQLITE_PERFORMANCE_PROFILE, SQLITE_READ_POOL_SIZE, enable_sqlite_profile, supports_sqlite_profile
+
 load_dotenv()
 
 # Database URL: ưu tiên lấy từ biến môi trường (PostgreSQL trong production)
@@ -13,14 +21,199 @@ SQLALCHEMY_DATABASE_URL = os.getenv(
     "",
 )
 
-connect_args = {"check_same_thread": False} if SQLALCHEMY_DATABASE_URL.startswith("sqlite") else {}
+def _env_bool(name: str, default: bool) -> bool:
+    return os.getenv(name, str(default)).lower() in ("1", "true", "yes")
+
+# Cấu hình connection pool (PostgreSQL)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # Giây, -1 = không recycle
+DB_POOL_PRE_PING = _env_bool("DB_POOL_PRE_PING", True)
+
+# Tạo bảng còn thiếu khi app khởi động; production nên tắt và chạy `python setup_db.py` lúc deploy
+DB_CREATE_SCHEMA_ON_STARTUP = _env_bool("DB_CREATE_SCHEMA_ON_STARTUP", True)
+
+# Read replica (tùy chọn): danh sách URL cách nhau bởi dấu phẩy; để trống = đọc/ghi đều ở primary
+SQLALCHEMY_REPLICA_URLS = [
+    url.strip() for url in os.getenv("SQLALCHEMY_REPLICA_URLS", "").split(",") if url.strip()
+]
+# Replica trễ hơn ngưỡng này (giây) sẽ bị bỏ qua cho tới lần kiểm tra sau
+DB_REPLICA_MAX_LAG_SECONDS = float(os.getenv("DB_REPLICA_MAX_LAG_SECONDS", "5"))
+DB_REPLICA_CHECK_INTERVAL_SECONDS = float(os.getenv("DB_REPLICA_CHECK_INTERVAL_SECONDS", "5"))
+# Sau khi user ghi dữ liệu, các request đọc của user đó đi primary trong khoảng này (read-your-own-write)
+DB_READ_YOUR_WRITES_SECONDS = int(os.getenv("DB_READ_YOUR_WRITES_SECONDS", "10"))
+# Cookie đánh dấu "vừa ghi" và header để client chủ động yêu cầu đọc từ primary
+READ_PRIMARY_COOKIE = "read_primary"
+READ_PRIMARY_HEADER = "X-Read-Primary"
+
+is_sqlite = SQLALCHEMY_DATABASE_URL.startswith("sqlite")
+connect_args = {"check_same_thread": False} if is_sqlite else {}
+# SQLite file: WAL + pragma, pool ghi + pool connection đọc (xem sqlite_profile.py)
+use_sqlite_profile = is_sqlite and SQLITE_PERFORMANCE_PROFILE and supports_sqlite_profile(make_url(SQLALCHEMY_DATABASE_URL))
+
+def _pool_kwargs(poolclass, sqlite_pool_size: int = DB_POOL_SIZE) -> dict:
+    if is_sqlite:
+        if not use_sqlite_profile:
+            return {}
+        # Ghi được tuần tự hóa bằng BEGIN IMMEDIATE + busy_timeout, không phải bằng pool 1 connection
+        return {
+            "poolclass": poolclass,
+            "pool_size": sqlite_pool_size,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "pool_timeout": DB_POOL_TIMEOUT,
+        }
+    return {
+        "poolclass": poolclass,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+def _async_database_url(url: str) -> str:
+    """Đổi driver sync sang driver async: asyncpg cho PostgreSQL, aiosqlite cho SQLite"""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend == "postgresql":
+        return parsed.set(drivername="postgresql+asyncpg").render_as_string(hide_password=False)
+    if backend == "sqlite":
+        return parsed.set(drivername="sqlite+aiosqlite").render_as_string(hide_password=False)
+    return url
 
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
     connect_args=connect_args,
+    **_pool_kwargs(InstrumentedQueuePool),
 )
+pool_metrics = instrument_engine(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Engine async cho các router async def (không chiếm thread của threadpool)
+async_engine = create_async_engine(
+    _async_database_url(SQLALCHEMY_DATABASE_URL),
+    connect_args=connect_args,
+    **_pool_kwargs(InstrumentedAsyncQueuePool),
+)
+async_pool_metrics = instrument_engine(async_engine.sync_engine)
+# expire_on_commit=False: object vẫn đọc được sau commit mà không cần lazy load (không hỗ trợ trong async)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+# Với SQLite profile: engine/async_engine ở trên dùng để ghi, thêm engine chỉ đọc (query_only) cho GET
+sqlite_read_engine = None
+sqlite_async_read_engine = None
+if use_sqlite_profile:
+    enable_sqlite_profile(engine)
+    enable_sqlite_profile(async_engine.sync_engine)
+    sqlite_read_engine = create_engine(
+        SQLALCHEMY_DATABASE_URL,
+        connect_args=connect_args,
+        **_pool_kwargs(InstrumentedQueuePool, SQLITE_READ_POOL_SIZE),
+    )
+    sqlite_async_read_engine = create_async_engine(
+        _async_database_url(SQLALCHEMY_DATABASE_URL),
+        connect_args=connect_args,
+        **_pool_kwargs(InstrumentedAsyncQueuePool, SQLITE_READ_POOL_SIZE),
+    )
+    enable_sqlite_profile(sqlite_read_engine, read_only=True)
+    enable_sqlite_profile(sqlite_async_read_engine.sync_engine, read_only=True)
+    sqlite_read_pool_metrics = instrument_engine(sqlite_read_engine)
+    sqlite_async_read_pool_metrics = instrument_engine(sqlite_async_read_engine.sync_engine)
+
+
+
+class ReplicaSet:
+    """Các replica engine (sync + async) chọn round-robin, bỏ qua replica bị lag quá ngưỡng"""
+
+    def __init__(self, urls):
+        self._lock = threading.Lock()
+        self.replicas = []
+        for url in urls:
+            sync_engine = create_engine(url, connect_args=connect_args, **_pool_kwargs(InstrumentedQueuePool))
+            replica_async_engine = create_async_engine(
+                _async_database_url(url),
+                connect_args=connect_args,
+                **_pool_kwargs(InstrumentedAsyncQueuePool),
+            )
+            self.replicas.append({
+                "url": make_url(url).render_as_string(hide_password=True),
+                "engine": sync_engine,
+                "async_engine": replica_async_engine,
+                "metrics": instrument_engine(sync_engine),
+                "async_metrics": instrument_engine(replica_async_engine.sync_engine),
+                "healthy": True,
+                "lag_seconds": None,
+                "error": None,
+            })
+        self._counter = itertools.count()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def choose(self):
+        """Replica kế tiếp còn khỏe; None nếu không có (khi đó dùng primary)"""
+        if not self.replicas:
+            return None
+        with self._lock:
+            start = next(self._counter)
+        for offset in range(len(self.replicas)):
+            replica = self.replicas[(start + offset) % len(self.replicas)]
+            if replica["healthy"]:
+                return replica
+        return None
+
+    def _measure_lag(self, replica) -> float:
+        if replica["engine"].dialect.name != "postgresql":
+            return 0.0
+        with replica["engine"].connect() as connection:
+            # Replica đã replay hết WAL nhận được thì coi như không lag (primary có thể đang rảnh)
+            lag = connection.execute(text(
+                "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+                "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+            )).scalar()
+        return float(lag or 0)
+
+    def check_lag(self):
+        for replica in self.replicas:
+            try:
+                lag = self._measure_lag(replica)
+                replica.update(lag_seconds=round(lag, 3), error=None, healthy=lag <= DB_REPLICA_MAX_LAG_SECONDS)
+            except Exception as e:
+                replica.update(lag_seconds=None, error=str(e), healthy=False)
+            if not replica["healthy"]:
+                print(f"WARNING: Replica {replica['url']} skipped (lag={replica['lag_seconds']}, error={replica['error']})")
+
+    def _run(self):
+        while not self._stop_event.wait(DB_REPLICA_CHECK_INTERVAL_SECONDS):
+            self.check_lag()
+
+    def start_monitor(self):
+        if not self.replicas or (self._thread and self._thread.is_alive()):
+            return
+        self.check_lag()
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="replica-lag-monitor", daemon=True)
+        self._thread.start()
+
+    def stop_monitor(self):
+        self._stop_event.set()
+
+    def status(self) -> list:
+        return [
+            {
+                "url": replica["url"],
+                "healthy": replica["healthy"],
+                "lag_seconds": replica["lag_seconds"],
+                "error": replica["error"],
+                "sync": pool_status(replica["engine"], replica["metrics"]),
+                "async": pool_status(replica["async_engine"].sync_engine, replica["async_metrics"]),
+            }
+            for replica in self.replicas
+        ]
+
+
+replica_set = ReplicaSet(SQLALCHEMY_REPLICA_URLS)
+
 Base = declarative_base()
 
 def get_db():
@@ -31,9 +224,100 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    """Dependency để lấy AsyncSession (dùng trong router async def)"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def _wants_primary(request: Request) -> bool:
+    """Đọc từ primary nếu client yêu cầu (header) hoặc user vừa ghi dữ liệu (cookie)"""
+    if request.headers.get(READ_PRIMARY_HEADER, "").lower() in ("1", "true", "yes"):
+        return True
+    return READ_PRIMARY_COOKIE in request.cookies
+
+def _read_engine(request: Request, is_async: bool):
+    """Engine cho request đọc: replica (round-robin) > pool đọc SQLite > None (= primary)"""
+    if _wants_primary(request):
+        return None
+    replica = replica_set.choose()
+    if replica:
+        return replica["async_engine"] if is_async else replica["engine"]
+    return sqlite_async_read_engine if is_async else sqlite_read_engine
+
+def get_read_db(request: Request):
+    """Dependency cho endpoint GET: session trên replica (round-robin), fallback về primary"""
+    read_engine = _read_engine(request, is_async=False)
+    db = SessionLocal(bind=read_engine) if read_engine else SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_read_db(request: Request):
+    """Bản async của get_read_db"""
+    read_engine = _read_engine(request, is_async=True)
+    session = AsyncSessionLocal(bind=read_engine) if read_engine else AsyncSessionLocal()
+    async with session as db:
+        yield db
+
+class ReadYourWritesMiddleware:
+    """Sau request ghi thành công, set cookie ngắn hạn để các request đọc kế tiếp đi primary
+    (ASGI thuần để không buffer response streaming như SSE)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or not replica_set.replicas
+            or scope["method"] in ("GET", "HEAD", "OPTIONS")
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_cookie(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                cookie = f"{READ_PRIMARY_COOKIE}=1; Max-Age={DB_READ_YOUR_WRITES_SECONDS}; Path=/; HttpOnly; SameSite=Lax"
+                message["headers"] = list(message.get("headers", [])) + [(b"set-cookie", cookie.encode("latin-1"))]
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
+
+def get_pool_status() -> dict:
+    """Trạng thái connection pool + metrics (checkout wait, overflow, leak)"""
+    status = {
+        "sync": pool_status(engine, pool_metrics),
+        "async": pool_status(async_engine.sync_engine, async_pool_metrics),
+        "replicas": replica_set.status(),
+    }
+    if use_sqlite_profile:
+        status["sqlite_readers"] = {
+            "sync": pool_status(sqlite_read_engine, sqlite_read_pool_metrics),
+            "async": pool_status(sqlite_async_read_engine.sync_engine, sqlite_async_read_pool_metrics),
+        }
+    return status
+
+# Khóa advisory (PostgreSQL) để nhiều worker khởi động cùng lúc không chạy DDL song song
+SCHEMA_INIT_LOCK_ID = 7310021
+
 def init_db():
-    """Khởi tạo database và tạo tables"""
+    """Khởi tạo database và tạo tables (chỉ tạo bảng còn thiếu, an toàn khi chạy lại)"""
     # Import các models để SQLAlchemy biết schema trước khi tạo bảng
     import models  # noqa: F401
-    Base.metadata.create_all(bind=engine)
-
+    if engine.dialect.name != "postgresql":
+        Base.metadata.create_all(bind=engine)
+        return
+    with engine.connect() as connection:
+        # Worker đầu tiên tạo bảng; các worker khác chờ lock rồi create_all chỉ còn kiểm tra
+        connection.execute(text("SELECT pg_advisory_lock(:lock_id)"), {"lock_id": SCHEMA_INIT_LOCK_ID})
+        try:
+            Base.metadata.create_all(bind=connection)
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            # Advisory lock gắn với connection (không theo transaction) nên phải unlock trước khi trả về pool
+            connection.execute(text("SELECT pg_advisory_unlock(:lock_id)"), {"lock_id": SCHEMA_INIT_LOCK_ID})
+            connection.commit()
@@ -0,0 +1,172 @@
+"""
+Đo đạc connection pool của SQLAlchemy: thời gian chờ checkout (histogram),
+overflow, timeout và phát hiện connection bị giữ quá lâu (session leak)
+"""
+import os
+import threading
+import time
+import traceback
+from bisect import bisect_left
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+# Connection bị giữ lâu hơn ngưỡng này được coi là nghi leak
+DB_LEAK_THRESHOLD_SECONDS = float(os.getenv("DB_LEAK_THRESHOLD_SECONDS", "30"))
+# Ghi stack trace lúc checkout để biết code nào giữ connection (tốn chi phí, chỉ bật khi điều tra)
+DB_POOL_TRACK_STACKS = os.getenv("DB_POOL_TRACK_STACKS", "false").lower() in ("1", "true", "yes")
+
+WAIT_BUCKETS_MS = [1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+
+class PoolMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.wait_buckets = [0] * (len(WAIT_BUCKETS_MS) + 1)
+        self.wait_count = 0
+        self.wait_total_ms = 0.0
+        self.wait_max_ms = 0.0
+        self.checkouts = 0
+        self.checkins = 0
+        self.connects = 0
+        self.timeouts = 0
+        self.long_holds = 0
+        self.max_hold_ms = 0.0
+        # id(connection record) -> (checkout time, thread name, stack)
+        self._checked_out = {}
+
+    def record_wait(self, wait_ms: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            self.wait_buckets[bisect_left(WAIT_BUCKETS_MS, wait_ms)] += 1
+            self.wait_count += 1
+            self.wait_total_ms += wait_ms
+            self.wait_max_ms = max(self.wait_max_ms, wait_ms)
+
+    def on_connect(self):
+        with self._lock:
+            self.connects += 1
+
+    def on_checkout(self, key: int):
+        stack = "".join(traceback.format_stack(limit=12)[:-3]) if DB_POOL_TRACK_STACKS else None
+        with self._lock:
+            self.checkouts += 1
+            self._checked_out[key] = (time.monotonic(), threading.current_thread().name, stack)
+
+    def on_checkin(self, key: int):
+        with self._lock:
+            self.checkins += 1
+            entry = self._checked_out.pop(key, None)
+            if entry is None:
+                return
+            held = time.monotonic() - entry[0]
+            self.max_hold_ms = max(self.max_hold_ms, held * 1000)
+            if held >= DB_LEAK_THRESHOLD_SECONDS:
+                self.long_holds += 1
+                print(f"WARNING: DB connection held for {held:.1f}s (thread {entry[1]})")
+
+    def suspected_leaks(self) -> list:
+        now = time.monotonic()
+        with self._lock:
+            entries = list(self._checked_out.values())
+        leaks = []
+        for started, thread_name, stack in entries:
+            held = now - started
+            if held >= DB_LEAK_THRESHOLD_SECONDS:
+                leaks.append({"held_seconds": round(held, 1), "thread": thread_name, "stack": stack})
+        return sorted(leaks, key=lambda item: item["held_seconds"], reverse=True)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            histogram = {}
+            for index, count in enumerate(self.wait_buckets):
+                label = f"<={WAIT_BUCKETS_MS[index]}ms" if index < len(WAIT_BUCKETS_MS) else f">{WAIT_BUCKETS_MS[-1]}ms"
+                histogram[label] = count
+            return {
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "connects": self.connects,
+                "currently_checked_out": len(self._checked_out),
+                "timeouts": self.timeouts,
+                "wait_ms": {
+                    "count": self.wait_count,
+                    "mean": round(self.wait_total_ms / self.wait_count, 3) if self.wait_count else 0,
+                    "max": round(self.wait_max_ms, 3),
+                    "histogram": histogram,
+                },
+                "long_holds": self.long_holds,
+                "max_hold_ms": round(self.max_hold_ms, 1),
+                "leak_threshold_seconds": DB_LEAK_THRESHOLD_SECONDS,
+            }
+
+
+class _WaitTimingMixin:
+    """Đo thời gian chờ lấy connection (kể cả khi hết chỗ phải đợi pool_timeout)"""
+
+    metrics: PoolMetrics = None
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            if self.metrics is not None:
+                self.metrics.record_wait((time.perf_counter() - started) * 1000, timed_out=True)
+            raise
+        if self.metrics is not None:
+            self.metrics.record_wait((time.perf_counter() - started) * 1000)
+        return connection
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+class InstrumentedQueuePool(_WaitTimingMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_WaitTimingMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def instrument_engine(engine) -> PoolMetrics:
+    """Gắn PoolMetrics vào engine (với AsyncEngine thì truyền engine.sync_engine); trả về metrics để đọc sau"""
+    metrics = PoolMetrics()
+    if isinstance(engine.pool, _WaitTimingMixin):
+        engine.pool.metrics = metrics
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        metrics.on_connect()
+
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        metrics.on_checkout(id(connection_record))
+
+    @event.listens_for(engine, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        metrics.on_checkin(id(connection_record))
+
+    return metrics
+
+
+def pool_status(engine, metrics: PoolMetrics) -> dict:
+    """Trạng thái hiện tại của pool + metrics tích lũy"""
+    pool = engine.pool
+    status = {"pool_class": type(pool).__name__, "status": pool.status()}
+    if isinstance(pool, QueuePool):
+        status.update({
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            "max_overflow": pool._max_overflow,
+            "timeout": pool.timeout(),
+        })
+    status["metrics"] = metrics.snapshot()
+    status["suspected_leaks"] = metrics.suspected_leaks()
+    return status
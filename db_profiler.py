@@ -0,0 +1,173 @@
+"""
+Đo SQL theo từng request: số statement, tổng thời gian DB, phát hiện N+1
+(cùng một câu SQL lặp lại nhiều lần trong một request) và trả header
+Server-Timing (db, auth, serialize, app) để xem trên DevTools mà không cần profiler.
+
+Strict mode (DB_PROFILE_STRICT=true, dùng khi chạy test/dev): request vượt
+DB_QUERY_BUDGET statement trả về 500 để phát hiện route bị N+1 sớm.
+"""
+import asyncio
+import contextvars
+import functools
+import json
+import os
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DB_PROFILE_ENABLED = os.getenv("DB_PROFILE_ENABLED", "true").lower() in ("1", "true", "yes")
+# Một câu SQL lặp lại từ ngưỡng này trở lên trong cùng request bị log là nghi N+1
+DB_N_PLUS_ONE_THRESHOLD = int(os.getenv("DB_N_PLUS_ONE_THRESHOLD", "5"))
+# Số statement tối đa cho một request trong strict mode (0 = không giới hạn)
+DB_QUERY_BUDGET = int(os.getenv("DB_QUERY_BUDGET", "0"))
+DB_PROFILE_STRICT = os.getenv("DB_PROFILE_STRICT", "false").lower() in ("1", "true", "yes")
+
+
+class RequestProfile:
+    """Số liệu của một request; cùng object được chia sẻ giữa event loop và threadpool"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.query_count = 0
+        self.db_ms = 0.0
+        self.shapes = Counter()
+        self.timings = Counter()
+        self.endpoint_done = None
+
+    def repeated_shapes(self) -> list:
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= DB_N_PLUS_ONE_THRESHOLD]
+
+    def server_timing(self, now: float) -> str:
+        parts = [f'db;dur={self.db_ms:.1f};desc="{self.query_count} queries"']
+        for name, duration in self.timings.items():
+            parts.append(f"{name};dur={duration:.1f}")
+        if self.endpoint_done is not None:
+            parts.append(f"serialize;dur={(now - self.endpoint_done) * 1000:.1f}")
+        parts.append(f"app;dur={(now - self.started) * 1000:.1f}")
+        return ", ".join(parts)
+
+
+_current_profile: contextvars.ContextVar = contextvars.ContextVar("request_profile", default=None)
+
+
+@contextmanager
+def profile_timer(name: str):
+    """Cộng thời gian của khối code vào Server-Timing của request hiện tại (VD auth)"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile = _current_profile.get()
+        if profile is not None:
+            profile.timings[name] += (time.perf_counter() - started) * 1000
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_profile.get() is not None:
+        conn.info.setdefault("profile_query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current_profile.get()
+    starts = conn.info.get("profile_query_start")
+    if profile is None or not starts:
+        return
+    profile.db_ms += (time.perf_counter() - starts.pop()) * 1000
+    profile.query_count += 1
+    # Statement đã được bind tham số nên cùng câu SQL = cùng "shape"
+    profile.shapes[statement] += 1
+
+
+def _mark_endpoint_done():
+    profile = _current_profile.get()
+    if profile is not None:
+        profile.endpoint_done = time.perf_counter()
+
+
+def _wrap_endpoint(call):
+    # FastAPI quyết định await hay chạy trong threadpool dựa trên loại hàm, nên giữ nguyên loại
+    if asyncio.iscoroutinefunction(call):
+        @functools.wraps(call)
+        async def timed(*args, **kwargs):
+            try:
+                return await call(*args, **kwargs)
+            finally:
+                _mark_endpoint_done()
+    else:
+        @functools.wraps(call)
+        def timed(*args, **kwargs):
+            try:
+                return call(*args, **kwargs)
+            finally:
+                _mark_endpoint_done()
+    return timed
+
+
+def instrument_routes(app):
+    """Bọc endpoint của mọi APIRoute để biết lúc endpoint trả về (phần còn lại là serialize)"""
+    for route in app.routes:
+        if isinstance(route, APIRoute):
+            route.dependant.call = _wrap_endpoint(route.dependant.call)
+
+
+class QueryProfilerMiddleware:
+    """Middleware ASGI: gắn RequestProfile cho mỗi request, thêm Server-Timing,
+    log N+1 và chặn request vượt query budget khi bật strict mode"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not DB_PROFILE_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile()
+        token = _current_profile.set(profile)
+        state = {"blocked": False}
+
+        async def send_with_timing(message):
+            if state["blocked"]:
+                return
+            if message["type"] == "http.response.start":
+                route = getattr(scope.get("route"), "path", scope["path"])
+                _report_repeated_shapes(scope["method"], route, profile)
+                if DB_PROFILE_STRICT and DB_QUERY_BUDGET and profile.query_count > DB_QUERY_BUDGET:
+                    state["blocked"] = True
+                    await _send_budget_exceeded(send, scope["method"], route, profile)
+                    return
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"server-timing", profile.server_timing(time.perf_counter()).encode("latin-1"))
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_profile.reset(token)
+
+
+def _report_repeated_shapes(method: str, route: str, profile: RequestProfile):
+    for shape, count in profile.repeated_shapes():
+        print(f"WARNING: Possible N+1 on {method} {route}: {count}x {' '.join(shape.split())[:200]}")
+
+
+async def _send_budget_exceeded(send, method: str, route: str, profile: RequestProfile):
+    body = json.dumps({
+        "detail": f"Query budget exceeded: {profile.query_count} > {DB_QUERY_BUDGET} statements",
+        "route": f"{method} {route}",
+        "repeated": [{"count": count, "sql": " ".join(shape.split())[:200]} for shape, count in profile.repeated_shapes()],
+    }).encode("utf-8")
+    print(f"ERROR: {method} {route} ran {profile.query_count} statements (budget {DB_QUERY_BUDGET})")
+    await send({
+        "type": "http.response.start",
+        "status": 500,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
@@ -1,24 +1,104 @@
 from fastapi import FastAPI, Request, Depends, HTTPException
-from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.responses import HTMLResponse
-from database import init_db, get_db
+from database import init_db, get_db, replica_set, ReadYourWritesMiddleware, DB_CREATE_SCHEMA_ON_STARTUP
+from db_profiler import QueryProfilerMiddleware, instrument_routes
+from schema_registry import schema_capabilities
+from responses import AppJSONResponse
+from compression import CompressionMiddleware, precompress_static
+from assets import FingerprintedStaticFiles, asset_url, build_asset_manifest, page_response, render_pages
 from sqlalchemy.orm import Session
-from routers import projects, tasks, teams, auth, users, subtasks, threads, comments, activities, worklogs, notes, todos, notifications
+from routers import projects, tasks, teams, auth, users, subtasks, threads, comments, activities, worklogs, notes, todos, notifications, admin, attachments
 from models import WorkLog
+from routers.notifications_helper import start_notification_retention_job, stop_notification_retention_job
+from routers.attachment_store import BLOB_SUBDIR, start_attachment_gc_job, stop_attachment_gc_job
+from routers.token_revocation import start_revoked_token_purge_job, stop_revoked_token_purge_job
+from routers.avatars import backfill_thumbnails
+from routers.worklogs import load_worklog_attachments
+from routers.storage import UPLOAD_URL_PREFIX, redirect_to_storage, storage
 import uvicorn
 
-app = FastAPI(title="Project Management", version="1.0.0")
+app = FastAPI(title="Project Management", version="1.0.0", default_response_class=AppJSONResponse)
 
-# Khởi tạo database
-init_db()
+
+@app.on_event("startup")
+def setup_schema():
+    """Tạo bảng còn thiếu (nếu bật) và detect schema một lần cho các router dùng"""
+    if DB_CREATE_SCHEMA_ON_STARTUP:
+        init_db()
+    schema_capabilities.detect()
+
+
+@app.on_event("startup")
+def start_background_jobs():
+    """Khởi động các job chạy nền"""
+    start_notification_retention_job()
+    start_attachment_gc_job()
+    start_revoked_token_purge_job()
+    replica_set.start_monitor()
+    # Tạo bù thumbnail cho avatar upload trước đây (pool nền, không chặn startup)
+    backfill_thumbnails()
+
+
+@app.on_event("startup")
+def compress_static_assets():
+    """Nén sẵn JS/CSS (.br/.gz) một lần, các request sau chỉ trả file có sẵn"""
+    created = precompress_static(["static/css", "static/js"])
+    if created:
+        print(f"✓ Precompressed {created} static files")
+
+
+# Asset được fingerprint: (URL prefix, thư mục mount, thư mục con/file)
+ASSET_MOUNTS = [
+    ("/static", "static", ["css", "js"]),
+    ("/assets", "templates", ["icon", "kpi", "Logo.png"]),
+]
+STATIC_PAGES = ["index.html", "login.html"]
+
+
+@app.on_event("startup")
+def build_static_pages():
+    """Hash nội dung asset một lần mỗi lần deploy rồi render sẵn index/login với URL đã fingerprint"""
+    count = build_asset_manifest(ASSET_MOUNTS)
+    render_pages(templates, STATIC_PAGES)
+    print(f"✓ Fingerprinted {count} static assets")
+
+
+@app.on_event("shutdown")
+def stop_background_jobs():
+    stop_notification_retention_job()
+    stop_attachment_gc_job()
+    stop_revoked_token_purge_job()
+    replica_set.stop_monitor()
+
+# Đọc lại từ primary ngay sau khi ghi (khi có read replica)
+app.add_middleware(ReadYourWritesMiddleware)
+# Đếm SQL + thời gian DB mỗi request, header Server-Timing, cảnh báo N+1
+app.add_middleware(QueryProfilerMiddleware)
+# Nén gzip/brotli cho response API lớn (middleware ngoài cùng)
+app.add_middleware(CompressionMiddleware)
+
+# Blob attachment chỉ tải qua /api/attachments/{ref_id} (kiểm tra quyền); avatar và file cũ vẫn public
+# (đăng ký trước redirect S3 và mount /static để được match trước)
+@app.api_route(f"{UPLOAD_URL_PREFIX}/{BLOB_SUBDIR}/{{key:path}}", methods=["GET", "HEAD"], include_in_schema=False)
+async def hide_attachment_blobs(key: str):
+    raise HTTPException(status_code=404, detail="Not Found")
+
+
+# Storage S3: file upload không nằm trên disk của app node, /static/uploads/<key> chuyển tới bucket
+# (đăng ký trước mount /static để được match trước)
+if storage.name != "local":
+    app.add_api_route(
+        UPLOAD_URL_PREFIX + "/{key:path}", redirect_to_storage, methods=["GET", "HEAD"], include_in_schema=False
+    )
 
 # Mount static files
-app.mount("/static", StaticFiles(directory="static"), name="static")
-app.mount("/assets", StaticFiles(directory="templates"), name="assets")
+app.mount("/static", FingerprintedStaticFiles(directory="static"), name="static")
+app.mount("/assets", FingerprintedStaticFiles(directory="templates"), name="assets")
 
 # Templates
 templates = Jinja2Templates(directory="templates")
+templates.env.globals["asset_url"] = asset_url
 
 # Include routers
 app.include_router(auth.router, prefix="/api/auth", tags=["auth"])
@@ -34,17 +114,19 @@ app.include_router(worklogs.router, prefix="/api/work-logs", tags=["worklogs"])
 app.include_router(notes.router, prefix="/api/notes", tags=["notes"])
 app.include_router(notifications.router, prefix="/api/notifications", tags=["notifications"])
 app.include_router(todos.router, prefix="/api/todos", tags=["todos"])
+app.include_router(admin.router, prefix="/api/admin", tags=["admin"])
+app.include_router(attachments.router, prefix="/api/attachments", tags=["attachments"])
 
 @app.get("/", response_class=HTMLResponse)
 async def read_root(request: Request):
-    """Trang chủ"""
-    return templates.TemplateResponse("index.html", {"request": request})
+    """Trang chủ (render sẵn lúc startup)"""
+    return page_response(request, templates, "index.html")
 
 
 @app.get("/login", response_class=HTMLResponse)
 async def login_page(request: Request):
-    """Trang đăng nhập"""
-    return templates.TemplateResponse("login.html", {"request": request})
+    """Trang đăng nhập (render sẵn lúc startup)"""
+    return page_response(request, templates, "login.html")
 
 
 @app.get("/worklogs/{worklog_id}", response_class=HTMLResponse)
@@ -52,6 +134,7 @@ async def worklog_detail(worklog_id: int, request: Request, db: Session = Depend
     worklog = db.query(WorkLog).filter(WorkLog.id == worklog_id).first()
     if not worklog:
         raise HTTPException(status_code=404, detail="Work log not found")
+    load_worklog_attachments(db, [worklog])
     return templates.TemplateResponse(
         "worklog_detail.html",
         {
@@ -69,6 +152,9 @@ async def health_check():
     """Health check endpoint"""
     return {"status": "ok", "message": "Project Management API is running"}
 
+# Gọi sau khi đã khai báo hết route: đánh dấu lúc endpoint trả về để tính serialize trong Server-Timing
+instrument_routes(app)
+
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
 
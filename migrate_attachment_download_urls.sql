@@ -0,0 +1,46 @@
+-- Migration: attachment_url của comment/subtask trỏ tới URL tải có kiểm tra quyền
+-- Description: blob attachment không còn public qua /static/uploads/blobs/. Đổi attachment_url
+-- đang trỏ vào blob (/static/uploads/blobs/...) thành /api/attachments/{ref_id} của ref tương ứng.
+-- Chạy sau migrate_attachments.sql; chạy lại nhiều lần không sao.
+
+UPDATE task_comments
+SET attachment_url = (
+    SELECT '/api/attachments/' || r.id
+    FROM attachment_refs r
+    JOIN attachments a ON a.id = r.attachment_id
+    WHERE r.owner_type = 'comment'
+      AND r.owner_id = task_comments.id
+      AND '/static/uploads/' || a.storage_path = task_comments.attachment_url
+    ORDER BY r.id
+    LIMIT 1
+)
+WHERE attachment_url LIKE '/static/uploads/blobs/%'
+  AND EXISTS (
+    SELECT 1
+    FROM attachment_refs r
+    JOIN attachments a ON a.id = r.attachment_id
+    WHERE r.owner_type = 'comment'
+      AND r.owner_id = task_comments.id
+      AND '/static/uploads/' || a.storage_path = task_comments.attachment_url
+  );
+
+UPDATE subtasks
+SET attachment_url = (
+    SELECT '/api/attachments/' || r.id
+    FROM attachment_refs r
+    JOIN attachments a ON a.id = r.attachment_id
+    WHERE r.owner_type = 'subtask'
+      AND r.owner_id = subtasks.id
+      AND '/static/uploads/' || a.storage_path = subtasks.attachment_url
+    ORDER BY r.id
+    LIMIT 1
+)
+WHERE attachment_url LIKE '/static/uploads/blobs/%'
+  AND EXISTS (
+    SELECT 1
+    FROM attachment_refs r
+    JOIN attachments a ON a.id = r.attachment_id
+    WHERE r.owner_type = 'subtask'
+      AND r.owner_id = subtasks.id
+      AND '/static/uploads/' || a.storage_path = subtasks.attachment_url
+  );
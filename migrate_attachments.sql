@@ -0,0 +1,31 @@
+-- Migration: Kho attachment theo nội dung (content-addressed) + reference count
+-- Description: attachments giữ mỗi blob một lần theo SHA-256; attachment_refs liên kết blob
+-- với comment / subtask / work log. Blob không còn ref được job GC xóa sau thời gian chờ.
+
+CREATE TABLE IF NOT EXISTS attachments (
+    id SERIAL PRIMARY KEY,
+    sha256 VARCHAR(64) NOT NULL,
+    size BIGINT NOT NULL,
+    content_type VARCHAR,
+    storage_path VARCHAR NOT NULL,
+    ref_count INTEGER NOT NULL DEFAULT 0,
+    unreferenced_at TIMESTAMP WITH TIME ZONE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS ix_attachments_sha256 ON attachments (sha256);
+
+CREATE TABLE IF NOT EXISTS attachment_refs (
+    id SERIAL PRIMARY KEY,
+    attachment_id INTEGER NOT NULL REFERENCES attachments(id) ON DELETE CASCADE,
+    owner_type VARCHAR(20) NOT NULL,
+    owner_id INTEGER NOT NULL,
+    name VARCHAR,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS ix_attachment_refs_attachment_id ON attachment_refs (attachment_id);
+CREATE INDEX IF NOT EXISTS idx_attachment_refs_owner ON attachment_refs (owner_type, owner_id);
+
+-- Index cho job GC (chỉ các blob không còn ref)
+CREATE INDEX IF NOT EXISTS idx_attachments_unreferenced ON attachments (unreferenced_at) WHERE ref_count <= 0;
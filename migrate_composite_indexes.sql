@@ -0,0 +1,44 @@
+-- Migration: Composite indexes cho các query list thường dùng
+-- Description: Mỗi index khớp với filter + order_by của endpoint tương ứng
+-- CONCURRENTLY để không khóa ghi bảng khi tạo index trên DB đang chạy
+-- (không chạy file này trong một transaction, VD psql --single-transaction)
+
+-- GET /api/tasks?project_id=&status= (order by position)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tasks_project_status_position
+    ON tasks(project_id, status, position);
+
+-- GET /api/threads?project_id= (top-level messages + replies, replies lọc theo cả project_id)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_threads_project_parent_deleted_created
+    ON threads(project_id, parent_id, is_deleted, created_at);
+
+-- Subtasks được load theo task_id (selectinload trong GET /api/tasks)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_subtasks_task_id
+    ON subtasks(task_id);
+
+-- GET /api/comments?task_id=
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_task_comments_task_deleted_created
+    ON task_comments(task_id, is_deleted, created_at);
+
+-- GET /api/activities?project_id= (order by created_at desc)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_activity_logs_project_created
+    ON activity_logs(project_id, created_at);
+
+-- GET /api/work-logs (work log của user, order by updated_at)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_work_logs_owner_updated
+    ON work_logs(owner_id, updated_at);
+
+-- GET /api/todos?start_date=&end_date=
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_todos_owner_planned
+    ON todos(owner_id, planned_date);
+
+-- task_assignees: một user chỉ được assign một lần vào một task
+-- Step 1: Xóa các dòng trùng (giữ dòng có id nhỏ nhất)
+DELETE FROM task_assignees a
+USING task_assignees b
+WHERE a.task_id = b.task_id
+  AND a.user_id = b.user_id
+  AND a.id > b.id;
+
+-- Step 2: Unique index (bỏ qua nếu migrate_task_assignees.sql đã tạo constraint cùng tên)
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS task_assignees_task_id_user_id_key
+    ON task_assignees(task_id, user_id);
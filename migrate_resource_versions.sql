@@ -0,0 +1,16 @@
+-- Migration: Version counter cho ETag / 304 Not Modified
+-- Description: projects.version tăng khi task/subtask/thread/comment/activity của project thay đổi;
+-- resource_versions giữ bộ đếm toàn cục cho danh sách projects, users, project_types
+
+ALTER TABLE projects ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 0;
+
+CREATE TABLE IF NOT EXISTS resource_versions (
+    name VARCHAR(50) PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT INTO resource_versions (name, version) VALUES
+    ('projects', 0),
+    ('users', 0),
+    ('project_types', 0)
+ON CONFLICT (name) DO NOTHING;
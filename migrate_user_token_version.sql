@@ -0,0 +1,5 @@
+-- Migration: Add token_version to users
+-- Description: Token version được đưa vào JWT (claim "ver"), tăng khi đổi mật khẩu để vô hiệu các token cũ
+
+ALTER TABLE users
+ADD COLUMN IF NOT EXISTS token_version INTEGER NOT NULL DEFAULT 0;
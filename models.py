@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Enum, JSON
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, DateTime, ForeignKey, Text, Enum, JSON, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
@@ -52,6 +52,7 @@ class User(Base):
     department = Column(String, nullable=True)
     team = Column(String, nullable=True)
     is_active = Column(Boolean, default=True)
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")  # Tăng khi đổi mật khẩu để vô hiệu token cũ
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # Relationships
@@ -91,6 +92,8 @@ class Project(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     due_date = Column(DateTime(timezone=True), nullable=True)
+    # Tăng mỗi khi task/subtask/thread/comment/activity của project thay đổi (dùng làm ETag)
+    version = Column(Integer, nullable=False, default=0, server_default="0")
     
     # Relationships
     owner = relationship("User", back_populates="projects")
@@ -129,6 +132,11 @@ class TaskAssignee(Base):
     task = relationship("Task", back_populates="assignees")
     user = relationship("User", back_populates="task_assignees")
 
+    __table_args__ = (
+        UniqueConstraint("task_id", "user_id", name="task_assignees_task_id_user_id_key"),
+        Index("idx_task_assignees_user_id", "user_id"),
+    )
+
 class Task(Base):
     __tablename__ = "tasks"
     
@@ -152,6 +160,10 @@ class Task(Base):
     work_logs = relationship("WorkLog", back_populates="task", cascade="all, delete-orphan")
     notifications = relationship("Notification", back_populates="task", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index("idx_tasks_project_status_position", "project_id", "status", "position"),
+    )
+
 
 class SubTask(Base):
     __tablename__ = "subtasks"
@@ -174,6 +186,10 @@ class SubTask(Base):
         uselist=False
     )
 
+    __table_args__ = (
+        Index("idx_subtasks_task_id", "task_id"),
+    )
+
 
 class Thread(Base):
     __tablename__ = "threads"
@@ -195,6 +211,10 @@ class Thread(Base):
     notifications = relationship("Notification", back_populates="thread", cascade="all, delete-orphan")
     parent = relationship("Thread", remote_side=[id], backref="replies")
 
+    __table_args__ = (
+        Index("idx_threads_project_parent_deleted_created", "project_id", "parent_id", "is_deleted", "created_at"),
+    )
+
 
 class TaskComment(Base):
     __tablename__ = "task_comments"
@@ -213,6 +233,10 @@ class TaskComment(Base):
     task = relationship("Task", back_populates="comments")
     user = relationship("User", back_populates="task_comments")
 
+    __table_args__ = (
+        Index("idx_task_comments_task_deleted_created", "task_id", "is_deleted", "created_at"),
+    )
+
 
 class WorkLog(Base):
     __tablename__ = "work_logs"
@@ -239,6 +263,10 @@ class WorkLog(Base):
     )
     notes = relationship("Note", back_populates="work_log")
 
+    __table_args__ = (
+        Index("idx_work_logs_owner_updated", "owner_id", "updated_at"),
+    )
+
 
 class Note(Base):
     __tablename__ = "notes"
@@ -275,6 +303,10 @@ class Todo(Base):
 
     owner = relationship("User")
 
+    __table_args__ = (
+        Index("idx_todos_owner_planned", "owner_id", "planned_date"),
+    )
+
 
 class ActivityLog(Base):
     __tablename__ = "activity_logs"
@@ -293,6 +325,10 @@ class ActivityLog(Base):
     project = relationship("Project", back_populates="activity_logs")
     user = relationship("User", back_populates="activity_logs")
 
+    __table_args__ = (
+        Index("idx_activity_logs_project_created", "project_id", "created_at"),
+    )
+
 
 class Notification(Base):
     __tablename__ = "notifications"
@@ -318,3 +354,63 @@ class Notification(Base):
     project = relationship("Project", back_populates="notifications")
     task = relationship("Task", back_populates="notifications")
     thread = relationship("Thread", back_populates="notifications")
+
+    # Trùng tên với index trong migrate_notifications.sql để DB mới tạo bằng init_db() cũng có
+    __table_args__ = (
+        Index("idx_notifications_user_created", "user_id", "created_at"),
+    )
+
+
+class RevokedToken(Base):
+    __tablename__ = "revoked_tokens"
+
+    id = Column(Integer, primary_key=True, index=True)
+    token_hash = Column(String(64), unique=True, nullable=False, index=True)  # sha256 của JWT
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    expires_at = Column(DateTime, nullable=False)  # Thời điểm token hết hạn (UTC) - sau đó có thể xóa dòng này
+    revoked_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class ResourceVersion(Base):
+    """Bộ đếm version toàn cục cho các danh sách không thuộc project (users, project_types, projects)"""
+    __tablename__ = "resource_versions"
+
+    name = Column(String(50), primary_key=True)
+    version = Column(Integer, nullable=False, default=0, server_default="0")
+
+
+class Attachment(Base):
+    """Blob lưu theo nội dung (SHA-256), dùng chung giữa các comment/subtask/work log có cùng file"""
+    __tablename__ = "attachments"
+
+    id = Column(Integer, primary_key=True, index=True)
+    sha256 = Column(String(64), unique=True, nullable=False, index=True)
+    size = Column(BigInteger, nullable=False)
+    content_type = Column(String, nullable=True)
+    storage_path = Column(String, nullable=False)  # Key trong storage (routers/storage.py), VD blobs/ab/<sha>.pdf
+    ref_count = Column(Integer, nullable=False, default=0, server_default="0")
+    unreferenced_at = Column(DateTime(timezone=True), nullable=True)  # Thời điểm ref_count về 0 (GC xóa sau thời gian chờ)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # Trùng tên với index trong migrate_attachments.sql (partial index cho job GC)
+    __table_args__ = (
+        Index("idx_attachments_unreferenced", unreferenced_at, postgresql_where=ref_count <= 0),
+    )
+
+
+class AttachmentRef(Base):
+    """Liên kết một blob với comment / subtask / work log (kèm tên file gốc lúc upload)"""
+    __tablename__ = "attachment_refs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    attachment_id = Column(Integer, ForeignKey("attachments.id", ondelete="CASCADE"), nullable=False, index=True)
+    owner_type = Column(String(20), nullable=False)  # comment, subtask, worklog
+    owner_id = Column(Integer, nullable=False)
+    name = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    attachment = relationship("Attachment")
+
+    __table_args__ = (
+        Index("idx_attachment_refs_owner", "owner_type", "owner_id"),
+    )
@@ -0,0 +1,21 @@
+"""
+Response class mặc định của app: encode JSON bằng orjson (nhanh hơn json.dumps nhiều lần
+với list lớn như danh sách task, cây thread).
+orjson tự xử lý datetime/date (ISO 8601, giống datetime.isoformat()), Enum (lấy value)
+và dict lồng nhau; kiểu còn lại (Decimal, set, pydantic model...) đi qua jsonable_encoder.
+"""
+import orjson
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse
+
+# Key không phải str (VD dict theo user_id) được đổi thành str giống json.dumps
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def _orjson_default(obj):
+    return jsonable_encoder(obj)
+
+
+class AppJSONResponse(ORJSONResponse):
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, default=_orjson_default, option=ORJSON_OPTIONS)
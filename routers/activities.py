@@ -1,23 +1,20 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
 from typing import List, Optional
 from datetime import datetime
 
-from database import get_db
+from database import get_async_read_db
 from models import ActivityLog, Project, User
 from schemas import ActivityLogResponse, UserResponse
-from routers.auth import get_current_user
+from routers.auth import get_current_user_async
+from routers.avatars import avatar_variants
+from routers.sideload import sideload_response
 
 router = APIRouter()
 
 
-def _get_project_or_404(db: Session, project_id: int) -> Project:
-    project = db.query(Project).filter(Project.id == project_id).first()
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-    return project
-
-
 def _ensure_project_access(project: Project, user: User):
     """Kiểm tra user có quyền truy cập project không"""
     if project.owner_id != user.id:
@@ -42,27 +39,40 @@ def _enrich_activity(activity: ActivityLog) -> dict:
             "username": activity.user.username,
             "email": activity.user.email,
             "full_name": activity.user.full_name,
-            "avatar_url": activity.user.avatar_url
+            "avatar_url": activity.user.avatar_url,
+            "avatar_variants": avatar_variants(activity.user.avatar_url)
         }
     }
 
 
 @router.get("/", response_model=List[dict])
-def get_activities(
+async def get_activities(
     project_id: int,
     limit: int = 50,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    sideload_users: bool = False,
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: User = Depends(get_current_user_async),
 ):
-    """Lấy danh sách activities của project, sắp xếp theo thời gian mới nhất"""
-    project = _get_project_or_404(db, project_id)
+    """Lấy danh sách activities của project, sắp xếp theo thời gian mới nhất (async).
+    sideload_users=true: activity chỉ giữ user_id, user nằm trong map users ở top-level"""
+    project = await db.get(Project, project_id)
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
     _ensure_project_access(project, current_user)
     
-    activities = db.query(ActivityLog).filter(
-        ActivityLog.project_id == project_id
-    ).order_by(ActivityLog.created_at.desc()).limit(limit).all()
+    result = await db.execute(
+        select(ActivityLog)
+        .options(selectinload(ActivityLog.user))
+        .where(ActivityLog.project_id == project_id)
+        .order_by(ActivityLog.created_at.desc())
+        .limit(limit)
+    )
+    activities = result.scalars().all()
     
-    return [_enrich_activity(activity) for activity in activities]
+    rows = [_enrich_activity(activity) for activity in activities]
+    if sideload_users:
+        return sideload_response(rows)
+    return rows
 
 
 def log_activity(
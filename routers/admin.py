@@ -0,0 +1,12 @@
+from fastapi import APIRouter, Depends
+
+from database import get_pool_status
+from routers.auth import require_admin
+
+router = APIRouter()
+
+
+@router.get("/db-pool")
+def get_db_pool(current_user=Depends(require_admin)):
+    """Trạng thái connection pool: size, overflow, checkout wait histogram, connection nghi leak"""
+    return get_pool_status()
@@ -0,0 +1,465 @@
+"""
+Kho attachment theo nội dung (content-addressed) cho comment, subtask và work log
+- Blob lưu đúng một lần theo SHA-256 với key blobs/ab/abcdef...ext trong storage (local hoặc S3),
+  upload trùng nội dung dùng lại blob đã có
+- attachments: mỗi blob một dòng, ref_count = số attachment_refs đang trỏ tới
+- attachment_refs: liên kết blob với comment / subtask / work log (kèm tên file gốc), thêm file
+  vào work log chỉ là INSERT một dòng thay vì ghi lại cả cột JSON
+- Một owner có thể có nhiều file (upload batch); attachment_url của comment/subtask là file chính
+- Blob chỉ tải qua /api/attachments/{ref_id} (kiểm tra quyền, routers/attachments.py), không public
+  qua /static/uploads: url/download_url trong API và attachment_url đều là URL đó
+- Xóa comment/subtask/work log (kể cả xóa theo cascade và xóa mềm comment) hoặc đổi attachment_url
+  giảm ref_count trong cùng transaction (after_flush)
+- Blob có ref_count = 0 quá ATTACHMENT_GC_GRACE_SECONDS bị job nền xóa cả file lẫn dòng
+- File blob không có dòng attachments (request lỗi/rollback sau khi đã đưa file vào storage) cũ hơn
+  thời gian chờ cũng bị job nền xóa
+"""
+import asyncio
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from fastapi import HTTPException, UploadFile
+from sqlalchemy import case, delete, event, func, inspect as sa_inspect, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from database import SessionLocal
+from models import Attachment, AttachmentRef, SubTask, TaskComment, WorkLog
+from schema_registry import schema_capabilities
+from routers.storage import key_from_url, storage
+from routers.uploads import UPLOAD_MAX_BATCH_FILES, discard_temp, stream_to_temp
+
+ATTACHMENT_GC_GRACE_SECONDS = int(os.getenv("ATTACHMENT_GC_GRACE_SECONDS", "3600"))
+ATTACHMENT_GC_INTERVAL_SECONDS = int(os.getenv("ATTACHMENT_GC_INTERVAL_SECONDS", "3600"))
+
+BLOB_SUBDIR = "blobs"
+DOWNLOAD_URL_PREFIX = "/api/attachments"
+OWNER_COMMENT = "comment"
+OWNER_SUBTASK = "subtask"
+OWNER_WORKLOG = "worklog"
+
+_OWNER_TYPES = {TaskComment: OWNER_COMMENT, SubTask: OWNER_SUBTASK, WorkLog: OWNER_WORKLOG}
+_EXTENSION_PATTERN = re.compile(r"^\.[a-z0-9]{1,10}$")
+
+
+def attachment_store_available() -> bool:
+    return schema_capabilities.has_table("attachments") and schema_capabilities.has_table("attachment_refs")
+
+
+def download_url(ref: AttachmentRef) -> str:
+    """URL tải có xác thực, hỗ trợ Range (routers/attachments.py)"""
+    return f"{DOWNLOAD_URL_PREFIX}/{ref.id}"
+
+
+def _attachment_target(url: Optional[str]):
+    """attachment_url -> ("ref", id) | ("blob", key trong storage, dữ liệu cũ) | None (link ngoài)"""
+    if url and url.startswith(DOWNLOAD_URL_PREFIX + "/"):
+        ref_id = url[len(DOWNLOAD_URL_PREFIX) + 1:]
+        return ("ref", int(ref_id)) if ref_id.isdigit() else None
+    key = key_from_url(url)
+    return ("blob", key) if key else None
+
+
+def ref_entry(ref: AttachmentRef) -> dict:
+    """Shape giống entry trong cột JSON WorkLog.attachments cũ (name/url/size/type) + id"""
+    attachment = ref.attachment
+    return {
+        "id": ref.id,
+        "attachment_id": attachment.id,
+        "name": ref.name,
+        "url": download_url(ref),
+        "download_url": download_url(ref),
+        "size": attachment.size,
+        "type": attachment.content_type,
+        "sha256": attachment.sha256,
+    }
+
+
+def _blob_path(sha256: str, filename: Optional[str]) -> str:
+    # Giữ extension để StaticFiles trả đúng content-type
+    extension = os.path.splitext(filename or "")[1].lower()
+    if not _EXTENSION_PATTERN.match(extension):
+        extension = ""
+    return f"{BLOB_SUBDIR}/{sha256[:2]}/{sha256}{extension}"
+
+
+def _staging_dir() -> Path:
+    # Local: file tạm nằm trong thư mục blobs để đưa vào kho bằng rename
+    return storage.staging_dir(f"{BLOB_SUBDIR}/.staging") or Path(tempfile.gettempdir())
+
+
+def _find_attachment(db: Session, sha256: str) -> Optional[Attachment]:
+    # Khóa dòng: job GC không xóa được blob đang được gắn thêm ref
+    return db.query(Attachment).filter(Attachment.sha256 == sha256).with_for_update().first()
+
+
+@dataclass(frozen=True)
+class StagedUpload:
+    """File đã stream xong vào file tạm trong kho blob, chưa gắn vào DB"""
+    tmp_path: Path
+    size: int
+    sha256: str
+    filename: Optional[str]
+    content_type: Optional[str]
+
+
+async def stage_upload(file: UploadFile, kind: str) -> StagedUpload:
+    """Stream file vào file tạm (không đụng DB, chạy song song được cho nhiều file)"""
+    tmp_path, size, sha256 = await stream_to_temp(file, kind, _staging_dir())
+    return StagedUpload(tmp_path, size, sha256, file.filename, file.content_type)
+
+
+# Số lần thử gắn ref khi blob bị GC xóa giữa lúc đưa vào storage và lúc khóa dòng
+_ATTACH_ATTEMPTS = 3
+
+
+async def _place_blob(db: Session, staged: StagedUpload) -> str:
+    """Đưa file tạm vào storage nếu chưa có dòng attachments; trả về key. Chỉ đọc DB, chưa ghi gì
+
+    Blob đã có dòng: giữ file tạm tới khi _attach_placed khóa được dòng (GC có thể xóa dòng + file
+    ở giữa, khi đó file tạm được đưa lại vào storage). Blob mới chưa có dòng thì GC không đụng tới.
+    """
+    attachment = db.query(Attachment).filter(Attachment.sha256 == staged.sha256).first()
+    if attachment is None:
+        storage_path = _blob_path(staged.sha256, staged.filename)
+        await storage.put_file_async(staged.tmp_path, storage_path, staged.content_type)
+        return storage_path
+    if not await storage.exists_async(attachment.storage_path):
+        # Blob mất trong storage: ghi lại từ một bản sao (file tạm vẫn giữ tới lúc khóa được dòng)
+        copy_path = staged.tmp_path.with_name(staged.tmp_path.name + ".copy")
+        await run_in_threadpool(shutil.copyfile, staged.tmp_path, copy_path)
+        try:
+            await storage.put_file_async(copy_path, attachment.storage_path, attachment.content_type)
+        finally:
+            await discard_temp(copy_path)
+    return attachment.storage_path
+
+
+def _attach_placed(
+    db: Session, staged: StagedUpload, storage_path: str, owner_type: str, owner_id: int
+) -> Optional[AttachmentRef]:
+    """Phần ghi DB (dòng attachments + ref), không có await: write transaction không bị giữ qua I/O
+
+    Trả về None nếu GC đã xóa blob (dòng + file) sau _place_blob: caller đưa lại file tạm vào
+    storage rồi gọi lại.
+    """
+    attachment = _find_attachment(db, staged.sha256)
+    if attachment is None:
+        if staged.tmp_path.exists():
+            # Dòng đã bị GC xóa (cùng file) sau _place_blob: caller đưa lại file tạm
+            return None
+        try:
+            with db.begin_nested():
+                attachment = Attachment(
+                    sha256=staged.sha256, size=staged.size, content_type=staged.content_type,
+                    storage_path=storage_path,
+                )
+                db.add(attachment)
+        except IntegrityError:
+            # Request khác vừa tạo cùng blob (file đã ghi trùng nội dung, không sao)
+            attachment = _find_attachment(db, staged.sha256)
+            if attachment is None:
+                return None
+
+    existing = db.query(AttachmentRef).filter(
+        AttachmentRef.attachment_id == attachment.id,
+        AttachmentRef.owner_type == owner_type,
+        AttachmentRef.owner_id == owner_id,
+    ).first()
+    if existing:
+        return existing
+
+    # UPDATE lấy write lock (SQLite không có FOR UPDATE): 0 dòng = GC vừa commit xóa blob
+    bumped = db.execute(
+        update(Attachment)
+        .where(Attachment.id == attachment.id)
+        .values(ref_count=Attachment.ref_count + 1, unreferenced_at=None)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not bumped:
+        db.expunge(attachment)
+        return None
+    ref = AttachmentRef(attachment=attachment, owner_type=owner_type, owner_id=owner_id, name=staged.filename)
+    db.add(ref)
+    db.flush()
+    db.refresh(attachment)
+    return ref
+
+
+async def _attach_with_retry(
+    db: Session, staged: StagedUpload, storage_path: Optional[str], owner_type: str, owner_id: int
+) -> AttachmentRef:
+    for _ in range(_ATTACH_ATTEMPTS):
+        if storage_path is None:
+            if not staged.tmp_path.exists():
+                break
+            storage_path = await _place_blob(db, staged)
+        ref = _attach_placed(db, staged, storage_path, owner_type, owner_id)
+        if ref is not None:
+            return ref
+        storage_path = None
+    raise HTTPException(status_code=409, detail="Attachment was removed while uploading, please retry")
+
+
+async def attach_staged(db: Session, staged: StagedUpload, owner_type: str, owner_id: int) -> AttachmentRef:
+    """Đưa file tạm vào kho blob (dedup theo SHA-256) và gắn ref cho owner; caller commit"""
+    try:
+        return await _attach_with_retry(db, staged, None, owner_type, owner_id)
+    finally:
+        # File tạm chỉ bị xóa sau khi đã gắn ref (hoặc lỗi)
+        await discard_temp(staged.tmp_path)
+
+
+async def store_attachment(db: Session, file: UploadFile, kind: str, owner_type: str, owner_id: int) -> AttachmentRef:
+    """Stream một file vào kho blob và gắn ref cho owner; caller commit"""
+    return await attach_staged(db, await stage_upload(file, kind), owner_type, owner_id)
+
+
+async def store_attachments(
+    db: Session, files: List[UploadFile], kind: str, owner_type: str, owner_id: int
+) -> List[AttachmentRef]:
+    """Nhiều file một lần: stream song song, rồi gắn ref tuần tự trên cùng session; caller commit một lần
+
+    Một file lỗi (VD vượt dung lượng) thì cả batch thất bại và mọi file tạm bị xóa.
+    """
+    if len(files) > UPLOAD_MAX_BATCH_FILES:
+        raise HTTPException(status_code=400, detail=f"Too many files (max {UPLOAD_MAX_BATCH_FILES} per request)")
+    results = await asyncio.gather(*(stage_upload(file, kind) for file in files), return_exceptions=True)
+    staged = [result for result in results if isinstance(result, StagedUpload)]
+    errors = [result for result in results if not isinstance(result, StagedUpload)]
+    try:
+        if errors:
+            raise errors[0]
+        # Đưa mọi blob vào storage trước, rồi mới ghi DB một lượt: không await nào (upload S3, ...)
+        # nằm giữa lần ghi đầu tiên và commit, write transaction không bị giữ qua I/O
+        placed = [await _place_blob(db, item) for item in staged]
+        refs = []
+        for item, storage_path in zip(staged, placed):
+            # Session không dùng song song được: phần DB chạy lần lượt
+            ref = _attach_placed(db, item, storage_path, owner_type, owner_id)
+            if ref is None:
+                # Hiếm: GC xóa blob giữa hai bước, đưa lại file tạm (lần này await trong transaction ghi)
+                ref = await _attach_with_retry(db, item, None, owner_type, owner_id)
+            refs.append(ref)
+        return refs
+    finally:
+        for item in staged:
+            await discard_temp(item.tmp_path)
+
+
+def remove_reference(db: Session, owner_type: str, owner_id: int, ref_id: int) -> bool:
+    """Gỡ một file khỏi owner (VD xóa một attachment của work log); caller commit"""
+    return release_references(db.connection(), owner_type, [owner_id], ref_ids=[ref_id]) > 0
+
+
+def release_references(
+    connection,
+    owner_type: str,
+    owner_ids: Iterable[int],
+    storage_path: Optional[str] = None,
+    ref_ids: Optional[Iterable[int]] = None,
+    keep_ref_id: Optional[int] = None,
+) -> int:
+    """Xóa ref của các owner (hoặc chỉ ref_ids / ref tới blob storage_path, trừ keep_ref_id) và giảm ref_count của blob tương ứng; trả về số ref đã xóa"""
+    conditions = [AttachmentRef.owner_type == owner_type, AttachmentRef.owner_id.in_(list(owner_ids))]
+    if ref_ids is not None:
+        conditions.append(AttachmentRef.id.in_(list(ref_ids)))
+    if keep_ref_id is not None:
+        conditions.append(AttachmentRef.id != keep_ref_id)
+    if storage_path:
+        conditions.append(AttachmentRef.attachment_id.in_(
+            select(Attachment.id).where(Attachment.storage_path == storage_path)
+        ))
+    counts = connection.execute(
+        select(AttachmentRef.attachment_id, func.count()).where(*conditions).group_by(AttachmentRef.attachment_id)
+    ).all()
+    if not counts:
+        return 0
+    connection.execute(delete(AttachmentRef).where(*conditions))
+    now = datetime.utcnow()
+    for attachment_id, count in counts:
+        connection.execute(
+            update(Attachment)
+            .where(Attachment.id == attachment_id)
+            .values(
+                ref_count=Attachment.ref_count - count,
+                unreferenced_at=case((Attachment.ref_count - count <= 0, now), else_=Attachment.unreferenced_at),
+            )
+        )
+    return sum(count for _, count in counts)
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _release_removed_owners(session, flush_context):
+    released = {}
+    replaced = []
+    for obj in session.deleted:
+        owner_type = _OWNER_TYPES.get(type(obj))
+        if owner_type:
+            released.setdefault(owner_type, set()).add(obj.id)
+    for obj in session.dirty:
+        if not isinstance(obj, (TaskComment, SubTask)):
+            continue
+        attrs = sa_inspect(obj).attrs
+        if isinstance(obj, TaskComment) and obj.is_deleted and attrs.is_deleted.history.has_changes():
+            released.setdefault(OWNER_COMMENT, set()).add(obj.id)
+        elif attrs.attachment_url.history.has_changes():
+            # Đổi file chính: chỉ bỏ ref của file cũ, các file khác của owner (upload batch) giữ nguyên
+            new_target = _attachment_target(obj.attachment_url)
+            for old_url in attrs.attachment_url.history.deleted:
+                old_target = _attachment_target(old_url)
+                if old_target and old_target != new_target:
+                    replaced.append((_OWNER_TYPES[type(obj)], obj.id, old_target, new_target))
+
+    if not (released or replaced) or not attachment_store_available():
+        return
+    connection = session.connection()
+    for owner_type, owner_ids in released.items():
+        release_references(connection, owner_type, owner_ids)
+    for owner_type, owner_id, (kind, value), new_target in replaced:
+        if kind == "ref":
+            release_references(connection, owner_type, [owner_id], ref_ids=[value])
+        else:
+            # URL blob cũ (trước migrate_attachment_download_urls.sql) đổi sang URL tải của chính blob đó
+            keep_ref_id = new_target[1] if new_target and new_target[0] == "ref" else None
+            release_references(connection, owner_type, [owner_id], storage_path=value, keep_ref_id=keep_ref_id)
+
+
+def load_attachment_entries(db: Session, owner_type: str, owner_ids: Iterable[int]) -> Dict[int, list]:
+    """owner_id -> danh sách entry attachment (một query cho cả danh sách owner)"""
+    owner_ids = list(owner_ids)
+    if not owner_ids or not attachment_store_available():
+        return {}
+    refs = db.execute(
+        select(AttachmentRef, Attachment)
+        .join(Attachment, Attachment.id == AttachmentRef.attachment_id)
+        .where(AttachmentRef.owner_type == owner_type, AttachmentRef.owner_id.in_(owner_ids))
+        .order_by(AttachmentRef.created_at, AttachmentRef.id)
+    ).all()
+    entries = {}
+    for ref, _ in refs:
+        entries.setdefault(ref.owner_id, []).append(ref_entry(ref))
+    return entries
+
+
+def collect_garbage(db: Session, grace_seconds: int = ATTACHMENT_GC_GRACE_SECONDS, batch_size: int = 100) -> int:
+    """Xóa blob (file + dòng) không còn ref quá grace_seconds; trả về số blob đã xóa
+
+    DELETE dòng (chỉ khi vẫn còn ref_count <= 0) chạy trước khi xóa file, trong cùng transaction: dòng
+    bị khóa (PostgreSQL) / DB giữ write lock (SQLite) cho tới commit, upload cùng nội dung chạy song
+    song chờ commit rồi thấy blob đã mất và đưa lại file của nó, không trỏ vào file vừa bị xóa.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=grace_seconds)
+    deleted_total = 0
+    while True:
+        candidates = (
+            db.query(Attachment.id, Attachment.storage_path)
+            .filter(Attachment.ref_count <= 0, Attachment.unreferenced_at < cutoff)
+            .order_by(Attachment.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        if not candidates:
+            break
+        deleted = 0
+        for attachment_id, storage_path in candidates:
+            # Upload khác có thể vừa gắn ref sau lúc chọn candidate (SQLite không khóa dòng)
+            removed = db.execute(
+                delete(Attachment)
+                .where(Attachment.id == attachment_id, Attachment.ref_count <= 0)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if removed:
+                storage.delete(storage_path)
+                deleted += 1
+        db.commit()
+        deleted_total += deleted
+        if len(candidates) < batch_size:
+            break
+    return deleted_total
+
+
+def collect_orphan_blobs(db: Session, grace_seconds: int = ATTACHMENT_GC_GRACE_SECONDS, batch_size: int = 500) -> int:
+    """Xóa file trong blobs/ không có dòng attachments, cũ hơn grace_seconds; trả về số file đã xóa
+
+    Blob được đưa vào storage trước khi INSERT dòng (không giữ write transaction qua await), nên request
+    lỗi hoặc rollback giữa chừng để lại file không có dòng. Thời gian chờ đủ dài để không đụng vào blob
+    của upload đang chạy chưa commit.
+    """
+    cutoff = time.time() - grace_seconds
+    deleted_total = 0
+    batch = []
+
+    def _flush_batch():
+        known = {
+            row[0] for row in
+            db.query(Attachment.storage_path).filter(Attachment.storage_path.in_(batch)).all()
+        }
+        db.rollback()  # chỉ đọc, không giữ transaction giữa các batch
+        removed = 0
+        for key in batch:
+            if key not in known:
+                storage.delete(key)
+                removed += 1
+        batch.clear()
+        return removed
+
+    for key, modified_at in storage.list_objects(BLOB_SUBDIR + "/"):
+        if modified_at >= cutoff:
+            continue
+        batch.append(key)
+        if len(batch) >= batch_size:
+            deleted_total += _flush_batch()
+    if batch:
+        deleted_total += _flush_batch()
+    return deleted_total
+
+
+_gc_stop_event = threading.Event()
+_gc_thread: Optional[threading.Thread] = None
+
+
+def _gc_loop():
+    while not _gc_stop_event.is_set():
+        if attachment_store_available():
+            db = SessionLocal()
+            try:
+                deleted = collect_garbage(db)
+                if deleted:
+                    print(f"Attachment GC: deleted {deleted} unreferenced blobs")
+                orphans = collect_orphan_blobs(db)
+                if orphans:
+                    print(f"Attachment GC: deleted {orphans} orphan blob files")
+            except Exception as e:
+                db.rollback()
+                print(f"ERROR: Attachment GC job failed: {e}")
+            finally:
+                db.close()
+        _gc_stop_event.wait(ATTACHMENT_GC_INTERVAL_SECONDS)
+
+
+def start_attachment_gc_job():
+    """Chạy GC blob không còn ref trong background thread (gọi khi app startup)"""
+    global _gc_thread
+    if ATTACHMENT_GC_INTERVAL_SECONDS <= 0:
+        return
+    if _gc_thread and _gc_thread.is_alive():
+        return
+    _gc_stop_event.clear()
+    _gc_thread = threading.Thread(target=_gc_loop, name="attachment-gc", daemon=True)
+    _gc_thread.start()
+
+
+def stop_attachment_gc_job():
+    """Dừng job GC (gọi khi app shutdown)"""
+    _gc_stop_event.set()
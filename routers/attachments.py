@@ -0,0 +1,206 @@
+"""
+Tải attachment có xác thực: GET /api/attachments/{ref_id}
+- Quyền theo owner của file, giống các endpoint đọc tương ứng: comment (ai xem được task),
+  subtask (project owner hoặc assignee của task), work log (chủ work log hoặc admin)
+- Hỗ trợ Range/If-Range (một khoảng byte): tải tiếp sau khi rớt mạng thay vì tải lại từ đầu
+- ETag = SHA-256 của blob (nội dung không bao giờ đổi), If-None-Match trả 304
+- Storage S3 (routers/storage.py): trả 307 tới presigned URL, client tải thẳng từ bucket
+- Token qua header Authorization hoặc ?token= (link <a>/<img> không gửi được header, giống SSE)
+- ATTACHMENT_ACCEL_REDIRECT_PREFIX (VD /_protected_uploads/): app chỉ kiểm tra quyền rồi trả
+  X-Accel-Redirect, nginx gửi file bằng sendfile (tự xử lý Range), byte file không đi qua Python
+"""
+import os
+from email.utils import formatdate
+from typing import Optional, Tuple
+
+import anyio
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import FileResponse, RedirectResponse, Response
+from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy.orm import Session, joinedload
+
+from database import get_db
+from db_profiler import profile_timer
+from models import AttachmentRef, SubTask, TaskComment, User, UserRole, WorkLog
+from routers.auth import get_user_from_token
+from routers.queries import get_task_with_assignees
+from routers.storage import content_disposition, storage
+from routers.attachment_store import OWNER_COMMENT, OWNER_SUBTASK, OWNER_WORKLOG, attachment_store_available
+
+ATTACHMENT_ACCEL_REDIRECT_PREFIX = os.getenv("ATTACHMENT_ACCEL_REDIRECT_PREFIX", "")
+
+router = APIRouter()
+
+_optional_bearer = OAuth2PasswordBearer(tokenUrl="api/auth/login", auto_error=False)
+
+
+def _download_user(
+    token: Optional[str] = None,
+    bearer_token: Optional[str] = Depends(_optional_bearer),
+    db: Session = Depends(get_db),
+):
+    """User từ header Bearer, hoặc ?token= khi tải qua link trong trang"""
+    if not (bearer_token or token):
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    with profile_timer("auth"):
+        return get_user_from_token(bearer_token or token, db)
+
+
+def _ensure_comment_access(db: Session, comment_id: int, user: User):
+    comment = db.query(TaskComment).filter(TaskComment.id == comment_id).first()
+    if not comment or comment.is_deleted:
+        raise HTTPException(status_code=404, detail="Attachment not found")
+    # Comment là read-only với mọi user đăng nhập (giống GET /api/comments)
+
+
+def _ensure_subtask_access(db: Session, subtask_id: int, user: User):
+    subtask = db.query(SubTask).filter(SubTask.id == subtask_id).first()
+    task = get_task_with_assignees(db, subtask.task_id) if subtask else None
+    if not task:
+        raise HTTPException(status_code=404, detail="Attachment not found")
+    if task.project.owner_id != user.id and user.id not in [ta.user_id for ta in task.assignees]:
+        raise HTTPException(status_code=403, detail="You do not have permission for this task")
+
+
+def _ensure_worklog_access(db: Session, worklog_id: int, user: User):
+    worklog = db.query(WorkLog).filter(WorkLog.id == worklog_id).first()
+    if not worklog:
+        raise HTTPException(status_code=404, detail="Attachment not found")
+    if worklog.owner_id != user.id and user.role != UserRole.ADMIN.value:
+        raise HTTPException(status_code=403, detail="Permission denied for this work log")
+
+
+_ACCESS_CHECKS = {
+    OWNER_COMMENT: _ensure_comment_access,
+    OWNER_SUBTASK: _ensure_subtask_access,
+    OWNER_WORKLOG: _ensure_worklog_access,
+}
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """'bytes=a-b' | 'bytes=a-' | 'bytes=-n' -> (start, end) (end tính cả); None = bỏ qua Range, trả cả file"""
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        # Nhiều khoảng (multipart/byteranges): RFC cho phép trả cả file
+        return None
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        else:
+            suffix = int(last)
+            if suffix <= 0:
+                raise ValueError
+            start, end = max(size - suffix, 0), size - 1
+    except ValueError:
+        return None
+    if start < 0 or start > end or start >= size:
+        raise HTTPException(
+            status_code=416, detail="Range not satisfiable", headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, end
+
+
+def _if_range_matches(if_range: Optional[str], etag: str, last_modified: str) -> bool:
+    # If-Range chỉ so khớp tuyệt đối (strong ETag hoặc đúng chuỗi Last-Modified)
+    return if_range is None or if_range.strip() in (etag, last_modified)
+
+
+class _PartialFileResponse(FileResponse):
+    """206 Partial Content: chỉ đọc và gửi khoảng byte [start, end] của file"""
+
+    def __init__(self, path: str, start: int, end: int, **kwargs):
+        self.start = start
+        self.end = end
+        super().__init__(path, status_code=206, **kwargs)
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if self.send_header_only:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        else:
+            remaining = self.end - self.start + 1
+            async with await anyio.open_file(self.path, mode="rb") as file:
+                await file.seek(self.start)
+                while remaining > 0:
+                    chunk = await file.read(min(self.chunk_size, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                # File ngắn hơn dự kiến: vẫn phải đóng response
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+        if self.background is not None:
+            await self.background()
+
+
+@router.api_route("/{ref_id}", methods=["GET", "HEAD"])
+def download_attachment(
+    ref_id: int,
+    request: Request,
+    download: bool = True,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(_download_user),
+):
+    """Tải file đính kèm (download=false: hiển thị inline, VD xem ảnh/PDF trong trình duyệt)"""
+    if not attachment_store_available():
+        raise HTTPException(status_code=404, detail="Attachment not found")
+    ref = (
+        db.query(AttachmentRef)
+        .options(joinedload(AttachmentRef.attachment))
+        .filter(AttachmentRef.id == ref_id)
+        .first()
+    )
+    check_access = _ACCESS_CHECKS.get(ref.owner_type) if ref else None
+    if not check_access:
+        raise HTTPException(status_code=404, detail="Attachment not found")
+    check_access(db, ref.owner_id, current_user)
+
+    attachment = ref.attachment
+    etag = f'"{attachment.sha256}"'
+    disposition = "attachment" if download else "inline"
+    filename = ref.name or os.path.basename(attachment.storage_path)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache", "Accept-Ranges": "bytes"}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag in [value.strip() for value in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    presigned_url = storage.presigned_url(attachment.storage_path, filename, disposition)
+    if presigned_url:
+        # Storage S3: client tải thẳng từ bucket (bucket tự xử lý Range/If-Range)
+        return RedirectResponse(presigned_url, status_code=307, headers={"Cache-Control": "private, no-store"})
+
+    if ATTACHMENT_ACCEL_REDIRECT_PREFIX:
+        # nginx (internal location trỏ tới UPLOAD_ROOT) gửi file bằng sendfile, kể cả Range
+        headers["Content-Disposition"] = content_disposition(disposition, filename)
+        headers["X-Accel-Redirect"] = ATTACHMENT_ACCEL_REDIRECT_PREFIX.rstrip("/") + "/" + attachment.storage_path
+        return Response(media_type=attachment.content_type, headers=headers)
+
+    path = storage.local_path(attachment.storage_path)
+    try:
+        stat_result = os.stat(path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Attachment file is missing")
+    size = stat_result.st_size
+    last_modified = formatdate(stat_result.st_mtime, usegmt=True)
+    response_options = dict(
+        media_type=attachment.content_type,
+        filename=filename,
+        content_disposition_type=disposition,
+        stat_result=stat_result,
+        method=request.method,
+    )
+
+    range_header = request.headers.get("range")
+    byte_range = _parse_range(range_header, size) if range_header and size else None
+    if byte_range and _if_range_matches(request.headers.get("if-range"), etag, last_modified):
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(end - start + 1)
+        return _PartialFileResponse(str(path), start, end, headers=headers, **response_options)
+    return FileResponse(str(path), headers=headers, **response_options)
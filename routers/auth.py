@@ -1,12 +1,21 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Form
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from passlib.context import CryptContext
+from sqlalchemy.ext.asyncio import AsyncSession
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
-from database import get_db
+from database import get_db, get_async_db
+from db_profiler import profile_timer
 from models import User, UserRole
 from schemas import UserCreate, UserResponse
+from routers.auth_cache import UserSnapshot, token_user_cache
+from routers.queries import get_user_by_username
+from routers.token_revocation import token_revocation_list, hash_token
+from routers.password_hashing import (
+    verify_and_update_password_async,
+    get_password_hash_async,
+)
 import os
 
 router = APIRouter()
@@ -17,17 +26,8 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30  # Default: 30 phút
 REMEMBER_ME_EXPIRE_DAYS = 365  # Remember me: 1 năm
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
 
-def verify_password(plain_password, hashed_password):
-    """Xác thực password"""
-    return pwd_context.verify(plain_password, hashed_password)
-
-def get_password_hash(password):
-    """Hash password"""
-    return pwd_context.hash(password)
-
 def create_access_token(data: dict, expires_delta: timedelta = None):
     """Tạo JWT token"""
     to_encode = data.copy()
@@ -39,9 +39,23 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-@router.post("/register", response_model=UserResponse)
-def register(user: UserCreate, db: Session = Depends(get_db)):
-    """Đăng ký user mới"""
+def create_user_token(user: User, expires_delta: timedelta = None):
+    """Tạo JWT cho user với claims: username, user id, role và token version"""
+    return create_access_token(
+        data={
+            "sub": user.username,
+            "uid": user.id,
+            "role": user.role,
+            "ver": user.token_version or 0,
+        },
+        expires_delta=expires_delta
+    )
+
+def invalidate_user_cache(user_id: int):
+    """Gọi sau khi user được cập nhật/đổi mật khẩu để snapshot cũ không còn được dùng"""
+    token_user_cache.invalidate_user(user_id)
+
+def _ensure_user_available(db: Session, user: UserCreate):
     # Kiểm tra username đã tồn tại
     db_user = db.query(User).filter(User.username == user.username).first()
     if db_user:
@@ -51,9 +65,8 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
     db_user = db.query(User).filter(User.email == user.email).first()
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
-    
-    # Tạo user mới
-    hashed_password = get_password_hash(user.password)
+
+def _create_user(db: Session, user: UserCreate, hashed_password: str) -> User:
     db_user = User(
         username=user.username,
         email=user.email,
@@ -65,8 +78,28 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
     db.refresh(db_user)
     return db_user
 
+def _get_user_by_username(db: Session, username: str):
+    return get_user_by_username(db, username)
+
+def _save_rehashed_password(db: Session, user: User, new_hash: str):
+    user.hashed_password = new_hash
+    db.commit()
+
+@router.post("/register", response_model=UserResponse)
+async def register(user: UserCreate, db: Session = Depends(get_db)):
+    """Đăng ký user mới
+
+    Handler async: query DB chạy trong threadpool, bcrypt chạy trong pool riêng
+    (routers.password_hashing) nên không giữ thread của FastAPI trong lúc hash.
+    """
+    await run_in_threadpool(_ensure_user_available, db, user)
+    
+    # Tạo user mới
+    hashed_password = await get_password_hash_async(user.password)
+    return await run_in_threadpool(_create_user, db, user, hashed_password)
+
 @router.post("/login")
-def login(
+async def login(
     form_data: OAuth2PasswordRequestForm = Depends(), 
     db: Session = Depends(get_db),
     remember_me: bool = Form(False)
@@ -76,13 +109,20 @@ def login(
     Args:
         remember_me: Nếu True, token sẽ có hiệu lực 1 năm. Nếu False, token hết hạn sau 30 phút.
     """
-    user = db.query(User).filter(User.username == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    user = await run_in_threadpool(_get_user_by_username, db, form_data.username)
+    is_valid, new_hash = (False, None)
+    if user:
+        is_valid, new_hash = await verify_and_update_password_async(form_data.password, user.hashed_password)
+    if not is_valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+    # Hash cũ có cost khác BCRYPT_ROUNDS -> lưu hash mới
+    if new_hash:
+        await run_in_threadpool(_save_rehashed_password, db, user, new_hash)
     
     # Nếu remember_me = True, token hết hạn sau 1 năm, nếu không thì 30 phút
     if remember_me:
@@ -90,18 +130,41 @@ def login(
     else:
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     
-    access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
-    )
+    access_token = create_user_token(user, expires_delta=access_token_expires)
     return {"access_token": access_token, "token_type": "bearer"}
 
 def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
     """Lấy user hiện tại từ token"""
+    with profile_timer("auth"):
+        return get_user_from_token(token, db)
+
+async def get_current_user_async(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
+    """Như get_current_user nhưng cho router async def: không dùng thread của threadpool
+
+    Logic xác thực là code sync, chạy qua run_sync trên connection async (greenlet).
+    """
+    with profile_timer("auth"):
+        return await db.run_sync(lambda session: get_user_from_token(token, session))
+
+def get_user_from_token(token: str, db: Session):
+    """Giải mã JWT và trả về UserSnapshot - dùng chung cho header Bearer và token qua query (SSE)
+
+    Snapshot được cache theo token nên phần lớn request không query bảng users.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+    # Kiểm tra trong bộ nhớ (Bloom filter), chỉ query DB khi filter báo trùng
+    if token_revocation_list.is_revoked(db, hash_token(token)):
+        raise credentials_exception
+
+    cached = token_user_cache.get(token)
+    if cached is not None:
+        return cached
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
@@ -110,13 +173,51 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     except JWTError:
         raise credentials_exception
     
-    user = db.query(User).filter(User.username == username).first()
+    user_id = payload.get("uid")
+    if user_id is not None:
+        user = db.get(User, user_id)
+    else:
+        # Token cũ (trước khi có claim uid)
+        user = get_user_by_username(db, username)
     if user is None:
         raise credentials_exception
-    return user
+
+    # Token version tăng khi đổi mật khẩu -> các token phát hành trước đó mất hiệu lực
+    if payload.get("ver", 0) != (user.token_version or 0):
+        raise credentials_exception
+
+    snapshot = UserSnapshot.from_user(user)
+    token_user_cache.set(token, snapshot, payload.get("exp"))
+    return snapshot
+
+@router.post("/logout")
+def logout(
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db),
+    current_user: UserSnapshot = Depends(get_current_user),
+):
+    """Đăng xuất: thu hồi token hiện tại"""
+    exp = jwt.get_unverified_claims(token).get("exp")
+    expires_at = datetime.utcfromtimestamp(exp) if exp else datetime.utcnow() + timedelta(days=REMEMBER_ME_EXPIRE_DAYS)
+    token_revocation_list.revoke(db, hash_token(token), current_user.id, expires_at)
+    db.commit()
+    token_user_cache.invalidate_token(token)
+    return {"message": "Logged out"}
+
+@router.post("/logout-all")
+def logout_all(
+    db: Session = Depends(get_db),
+    current_user: UserSnapshot = Depends(get_current_user),
+):
+    """Đăng xuất khỏi mọi thiết bị: tăng token version nên mọi token đã phát hành đều mất hiệu lực"""
+    db_user = db.get(User, current_user.id)
+    db_user.token_version = (db_user.token_version or 0) + 1
+    db.commit()
+    invalidate_user_cache(db_user.id)
+    return {"message": "Logged out from all devices"}
 
 @router.get("/me", response_model=UserResponse)
-def read_users_me(current_user: User = Depends(get_current_user)):
+def read_users_me(current_user: UserSnapshot = Depends(get_current_user)):
     """Lấy thông tin user hiện tại"""
     return current_user
 
@@ -0,0 +1,115 @@
+"""
+Cache token -> user snapshot để phần lớn request không phải query bảng users
+LRU giới hạn số entry, mỗi entry hết hạn sau TTL (hoặc khi token hết hạn, tùy cái nào sớm hơn)
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+AUTH_CACHE_TTL_SECONDS = int(os.getenv("AUTH_CACHE_TTL_SECONDS", "60"))
+AUTH_CACHE_MAX_SIZE = int(os.getenv("AUTH_CACHE_MAX_SIZE", "1024"))
+
+
+@dataclass(frozen=True)
+class UserSnapshot:
+    """Bản chụp read-only các cột của User (không có hashed_password)
+
+    Handlers chỉ đọc id/username/full_name/role..., handler nào cần sửa user thì
+    tự load lại bằng db.get(User, current_user.id).
+    """
+    id: int
+    username: str
+    email: Optional[str]
+    full_name: Optional[str]
+    avatar_url: Optional[str]
+    role: Optional[str]
+    department: Optional[str]
+    team: Optional[str]
+    is_active: bool
+    created_at: Optional[datetime]
+    token_version: int
+
+    @classmethod
+    def from_user(cls, user) -> "UserSnapshot":
+        return cls(
+            id=user.id,
+            username=user.username,
+            email=user.email,
+            full_name=user.full_name,
+            avatar_url=user.avatar_url,
+            role=user.role,
+            department=user.department,
+            team=user.team,
+            is_active=user.is_active,
+            created_at=user.created_at,
+            token_version=user.token_version or 0,
+        )
+
+
+class TokenUserCache:
+    def __init__(self, max_size: int = AUTH_CACHE_MAX_SIZE, ttl_seconds: int = AUTH_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str) -> Optional[UserSnapshot]:
+        if self.max_size <= 0 or self.ttl_seconds <= 0:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, snapshot = entry
+            if expires_at <= now:
+                del self._entries[token]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return snapshot
+
+    def set(self, token: str, snapshot: UserSnapshot, token_exp: Optional[float] = None):
+        """Lưu snapshot; token_exp là unix timestamp hết hạn của JWT"""
+        if self.max_size <= 0 or self.ttl_seconds <= 0:
+            return
+        ttl = self.ttl_seconds
+        if token_exp is not None:
+            ttl = min(ttl, token_exp - time.time())
+            if ttl <= 0:
+                return
+        with self._lock:
+            self._entries[token] = (time.monotonic() + ttl, snapshot)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, user_id: int):
+        """Xóa mọi token đã cache của user (khi user bị sửa/đổi mật khẩu)"""
+        with self._lock:
+            stale = [token for token, (_, snapshot) in self._entries.items() if snapshot.id == user_id]
+            for token in stale:
+                del self._entries[token]
+
+    def invalidate_token(self, token: str):
+        with self._lock:
+            self._entries.pop(token, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._entries), "max_size": self.max_size, "hits": self.hits, "misses": self.misses}
+
+
+token_user_cache = TokenUserCache()
@@ -0,0 +1,133 @@
+"""
+Thumbnail avatar (32/64/128 px) tạo trong pool nền sau khi upload, không nằm trên request path
+- Ảnh gốc: /static/uploads/avatars/user_1_<hex>.png
+- Thumbnail: /static/uploads/avatars/user_1_<hex>_64.png (cắt vuông giữa ảnh, cùng định dạng gốc)
+- Thumbnail được ghi vào file tạm rồi đưa vào storage (local/S3); trong lúc chưa có, UI fallback về ảnh gốc
+- Pillow là tùy chọn: thiếu thì không tạo thumbnail, avatar_variants trỏ về ảnh gốc
+Startup quét các avatar trong storage để tạo bù thumbnail cho ảnh upload trước khi có tính năng này.
+"""
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional, Set
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow là tùy chọn
+    Image = None
+
+from routers.storage import key_from_url, storage
+
+AVATAR_SUBDIR = "avatars"
+AVATAR_URL_PREFIX = storage.url(AVATAR_SUBDIR) + "/"
+AVATAR_THUMBNAIL_SIZES = tuple(
+    int(size) for size in os.getenv("AVATAR_THUMBNAIL_SIZES", "32,64,128").split(",") if size.strip()
+)
+AVATAR_THUMBNAIL_WORKERS = int(os.getenv("AVATAR_THUMBNAIL_WORKERS", "2"))
+
+_FORMATS = {".png": "PNG", ".jpg": "JPEG", ".jpeg": "JPEG"}
+_CONTENT_TYPES = {"PNG": "image/png", "JPEG": "image/jpeg"}
+
+# Pillow nhả GIL khi decode/resize nên thread pool là đủ; pool riêng để không chiếm threadpool của FastAPI
+_executor = ThreadPoolExecutor(max_workers=AVATAR_THUMBNAIL_WORKERS, thread_name_prefix="avatar-thumbnail")
+
+
+def _thumbnail_key(key: str, size: int) -> str:
+    stem, extension = os.path.splitext(key)
+    return f"{stem}_{size}{extension}"
+
+
+def _is_thumbnail(key: str) -> bool:
+    stem = os.path.splitext(key)[0]
+    return any(stem.endswith(f"_{size}") for size in AVATAR_THUMBNAIL_SIZES)
+
+
+def avatar_variants(avatar_url: Optional[str]) -> Optional[Dict[str, str]]:
+    """URL thumbnail theo kích thước; avatar ngoài thư mục upload (URL tự nhập) dùng luôn ảnh gốc"""
+    if not avatar_url:
+        return None
+    if Image is None or not avatar_url.startswith(AVATAR_URL_PREFIX):
+        return {str(size): avatar_url for size in AVATAR_THUMBNAIL_SIZES}
+    stem, extension = os.path.splitext(avatar_url)
+    return {str(size): f"{stem}_{size}{extension}" for size in AVATAR_THUMBNAIL_SIZES}
+
+
+def _store_thumbnail(image, key: str, image_format: str):
+    fd, tmp_path = tempfile.mkstemp(dir=storage.staging_dir(key), prefix=".thumb-")
+    try:
+        with os.fdopen(fd, "wb") as tmp_file:
+            if image_format == "JPEG":
+                image.convert("RGB").save(tmp_file, image_format, quality=85, optimize=True)
+            else:
+                image.save(tmp_file, image_format, optimize=True)
+        storage.put_file(Path(tmp_path), key, _CONTENT_TYPES[image_format])
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def generate_thumbnails(key: str, existing: Optional[Set[str]] = None) -> int:
+    """Tạo các thumbnail còn thiếu cho một avatar (blocking, chạy trong pool); trả về số file đã tạo
+
+    existing: các key đã có trong storage (backfill truyền vào để không hỏi storage từng file)
+    """
+    image_format = _FORMATS.get(os.path.splitext(key)[1].lower())
+    if Image is None or image_format is None:
+        return 0
+    if existing is None:
+        missing = [size for size in AVATAR_THUMBNAIL_SIZES if not storage.exists(_thumbnail_key(key, size))]
+    else:
+        missing = [size for size in AVATAR_THUMBNAIL_SIZES if _thumbnail_key(key, size) not in existing]
+    if not missing or (existing is None and not storage.exists(key)):
+        return 0
+    with storage.local_copy(key) as original, Image.open(original) as source:
+        # Xoay theo EXIF (ảnh chụp điện thoại) rồi cắt vuông giữa ảnh
+        image = ImageOps.exif_transpose(source)
+        for size in sorted(missing, reverse=True):
+            thumbnail = ImageOps.fit(image, (size, size), method=Image.Resampling.LANCZOS)
+            _store_thumbnail(thumbnail, _thumbnail_key(key, size), image_format)
+    return len(missing)
+
+
+def _log_failure(future):
+    error = future.exception()
+    if error:
+        print(f"ERROR: Avatar thumbnail generation failed: {error}")
+
+
+def schedule_thumbnails(key: str):
+    """Đưa việc tạo thumbnail vào pool nền (request upload trả về ngay)"""
+    if Image is None:
+        return
+    _executor.submit(generate_thumbnails, key).add_done_callback(_log_failure)
+
+
+def delete_avatar_files(avatar_url: Optional[str]):
+    """Xóa ảnh gốc và các thumbnail của avatar cũ"""
+    if not avatar_url or not avatar_url.startswith(AVATAR_URL_PREFIX):
+        return
+    key = key_from_url(avatar_url)
+    for item in [key] + [_thumbnail_key(key, size) for size in AVATAR_THUMBNAIL_SIZES]:
+        storage.delete(item)
+
+
+def _backfill():
+    keys = set(storage.list_keys(AVATAR_SUBDIR + "/"))
+    created = 0
+    for key in sorted(keys):
+        if not _is_thumbnail(key):
+            try:
+                created += generate_thumbnails(key, keys)
+            except Exception as e:
+                print(f"ERROR: Avatar thumbnail for {key} failed: {e}")
+    if created:
+        print(f"✓ Generated {created} avatar thumbnails")
+
+
+def backfill_thumbnails():
+    """Tạo bù thumbnail cho avatar đã upload trước đó (chạy nền, gọi khi app startup)"""
+    if Image is None:
+        return
+    _executor.submit(_backfill).add_done_callback(_log_failure)
@@ -2,27 +2,24 @@ from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime
-import os
-import shutil
 
 from database import get_db
-from models import TaskComment, Task, User, TaskAssignee, Project
+from models import TaskComment, Task, User
 from schemas import TaskCommentCreate, TaskCommentUpdate, TaskCommentResponse, UserResponse
 from routers.auth import get_current_user
 from routers.activities import log_activity
-from sqlalchemy.orm import joinedload
+from routers.queries import get_task_with_members
+from routers.avatars import avatar_variants
+from routers.sideload import sideload_response
+from routers.attachment_store import (
+    OWNER_COMMENT, download_url, load_attachment_entries, store_attachment, store_attachments,
+)
 
 router = APIRouter()
 
-UPLOAD_DIR = "static/uploads/comments"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-
 
 def _get_task_or_404(db: Session, task_id: int) -> Task:
-    task = db.query(Task).options(
-        joinedload(Task.assignees).joinedload(TaskAssignee.user),
-        joinedload(Task.project).joinedload(Project.team_members)
-    ).filter(Task.id == task_id).first()
+    task = get_task_with_members(db, task_id)
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     return task
@@ -59,14 +56,15 @@ def _ensure_task_access(task: Task, user: User):
     return
 
 
-def _enrich_comment(comment: TaskComment) -> dict:
-    """Enrich comment với thông tin user"""
+def _enrich_comment(comment: TaskComment, attachments: Optional[list] = None) -> dict:
+    """Enrich comment với thông tin user (attachments: file trong attachment_refs, nếu đã load)"""
     return {
         "id": comment.id,
         "task_id": comment.task_id,
         "user_id": comment.user_id,
         "content": comment.content if not comment.is_deleted else "[Comment đã bị xóa]",
         "attachment_url": comment.attachment_url,
+        "attachments": attachments if attachments is not None else [],
         "is_edited": comment.is_edited,
         "is_deleted": comment.is_deleted,
         "created_at": comment.created_at,
@@ -76,7 +74,8 @@ def _enrich_comment(comment: TaskComment) -> dict:
             "username": comment.user.username,
             "email": comment.user.email,
             "full_name": comment.user.full_name,
-            "avatar_url": comment.user.avatar_url
+            "avatar_url": comment.user.avatar_url,
+            "avatar_variants": avatar_variants(comment.user.avatar_url)
         }
     }
 
@@ -84,10 +83,11 @@ def _enrich_comment(comment: TaskComment) -> dict:
 @router.get("/", response_model=List[dict])
 def get_comments(
     task_id: int,
+    sideload_users: bool = False,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    """Lấy tất cả comments của một task"""
+    """Lấy tất cả comments của một task (sideload_users=true: user nằm trong map users ở top-level)"""
     task = _get_task_or_404(db, task_id)
     _ensure_task_access(task, current_user)
     
@@ -96,7 +96,11 @@ def get_comments(
         TaskComment.is_deleted == False
     ).order_by(TaskComment.created_at.asc()).all()
     
-    return [_enrich_comment(comment) for comment in comments]
+    entries = load_attachment_entries(db, OWNER_COMMENT, [comment.id for comment in comments])
+    rows = [_enrich_comment(comment, entries.get(comment.id, [])) for comment in comments]
+    if sideload_users:
+        return sideload_response(rows)
+    return rows
 
 
 def _ensure_task_write_permission(task: Task, user: User):
@@ -244,19 +248,40 @@ async def upload_comment_attachment(
     if db_comment.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="You can only upload attachment for your own comments")
     
-    # Lưu file
-    file_ext = os.path.splitext(file.filename)[1]
-    filename = f"comment_{comment_id}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}{file_ext}"
-    filepath = os.path.join(UPLOAD_DIR, filename)
-    
-    with open(filepath, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    # Lưu file vào kho blob (dedup theo nội dung), ref tới file cũ được gỡ khi flush
+    ref = await store_attachment(db, file, "comment", OWNER_COMMENT, comment_id)
     
     # Update comment với attachment URL
-    attachment_url = f"/static/uploads/comments/{filename}"
-    db_comment.attachment_url = attachment_url
+    db_comment.attachment_url = download_url(ref)
     db.commit()
     db.refresh(db_comment)
     
-    return _enrich_comment(db_comment)
+    entries = load_attachment_entries(db, OWNER_COMMENT, [comment_id])
+    return _enrich_comment(db_comment, entries.get(comment_id, []))
+
+
+@router.post("/{comment_id}/attachments/batch")
+async def upload_comment_attachments(
+    comment_id: int,
+    files: List[UploadFile] = File(...),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Upload nhiều file cho comment trong một request (stream song song, một transaction)"""
+    db_comment = db.query(TaskComment).filter(TaskComment.id == comment_id).first()
+    if not db_comment:
+        raise HTTPException(status_code=404, detail="Comment not found")
+    
+    if db_comment.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="You can only upload attachment for your own comments")
+    
+    refs = await store_attachments(db, files, "comment", OWNER_COMMENT, comment_id)
+    # File đầu tiên làm attachment_url cho client chỉ đọc một file
+    if refs and not db_comment.attachment_url:
+        db_comment.attachment_url = download_url(refs[0])
+    db.commit()
+    db.refresh(db_comment)
+    
+    entries = load_attachment_entries(db, OWNER_COMMENT, [comment_id])
+    return _enrich_comment(db_comment, entries.get(comment_id, []))
 
@@ -0,0 +1,60 @@
+"""
+Sparse fieldsets cho các endpoint danh sách: ?fields=id,title,status,due_date
+- Tên field lấy theo response schema (TaskResponse, ProjectResponse...), field lạ trả 400
+- Danh sách chỉ gồm cột: SELECT đúng các cột được yêu cầu (Core select, không dựng ORM object)
+- Danh sách có object lồng nhau (task): load_only + chỉ eager load relationship khi được yêu cầu
+Response đi thẳng qua AppJSONResponse, bỏ qua response_model vì shape đã bị rút gọn.
+Không truyền fields thì endpoint trả response đầy đủ như cũ.
+"""
+from typing import Dict, Iterable, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import inspect as sa_inspect, select
+from sqlalchemy.orm import load_only
+
+from responses import AppJSONResponse
+
+
+def parse_fields(fields: Optional[str], schema) -> Optional[Tuple[str, ...]]:
+    """Tách ?fields= thành tuple tên field theo thứ tự của schema; None nếu không lọc"""
+    if not fields:
+        return None
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    if not requested:
+        return None
+    unknown = requested - set(schema.model_fields)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    return tuple(name for name in schema.model_fields if name in requested)
+
+
+def _column_names(model) -> set:
+    return set(sa_inspect(model).columns.keys())
+
+
+def column_entities(model, fields: Iterable[str]) -> list:
+    """Các cột được yêu cầu, label theo tên field (dùng cho select() hoặc Query.with_entities())"""
+    columns = _column_names(model)
+    return [getattr(model, name).label(name) for name in fields if name in columns]
+
+
+def select_columns(model, fields: Iterable[str]):
+    """Core select chỉ gồm các cột được yêu cầu (kết quả đọc bằng .mappings())"""
+    return select(*column_entities(model, fields))
+
+
+def load_only_columns(model, fields: Iterable[str], *required: str):
+    """Option load_only cho các cột được yêu cầu và các cột code cần dùng nội bộ"""
+    columns = _column_names(model)
+    names = [name for name in dict.fromkeys((*fields, *required)) if name in columns]
+    return load_only(*[getattr(model, name) for name in names])
+
+
+def sparse_row(obj, fields: Iterable[str], computed: Optional[Dict] = None) -> dict:
+    """Dict chỉ gồm field được yêu cầu; field tính toán (list lồng nhau, progress...) lấy từ computed"""
+    computed = computed or {}
+    return {name: computed[name] if name in computed else getattr(obj, name) for name in fields}
+
+
+def sparse_response(rows) -> AppJSONResponse:
+    return AppJSONResponse([dict(row) for row in rows])
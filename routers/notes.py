@@ -7,6 +7,7 @@ from database import get_db
 from models import Note, UserRole
 from schemas import NoteCreate, NoteUpdate, NoteResponse
 from routers.auth import get_current_user
+from routers.fields import column_entities, parse_fields, sparse_response
 
 
 router = APIRouter()
@@ -29,9 +30,11 @@ def list_notes(
     project_id: Optional[int] = None,
     task_id: Optional[int] = None,
     work_log_id: Optional[int] = None,
+    fields: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user=Depends(get_current_user),
 ):
+    requested = parse_fields(fields, NoteResponse)
     query = db.query(Note)
     if current_user.role != UserRole.ADMIN.value:
         query = query.filter(Note.owner_id == current_user.id)
@@ -41,7 +44,11 @@ def list_notes(
         query = query.filter(Note.task_id == task_id)
     if work_log_id:
         query = query.filter(Note.work_log_id == work_log_id)
-    return query.order_by(Note.note_date.desc().nullslast(), Note.updated_at.desc().nullslast()).all()
+    query = query.order_by(Note.note_date.desc().nullslast(), Note.updated_at.desc().nullslast())
+    if requested is not None:
+        # Chỉ SELECT các cột được yêu cầu (bỏ content khi không cần)
+        return sparse_response(row._mapping for row in query.with_entities(*column_entities(Note, requested)))
+    return query.all()
 
 
 @router.post("/", response_model=NoteResponse)
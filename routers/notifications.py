@@ -1,48 +1,118 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, joinedload
-from typing import List
+from typing import List, Optional
 from datetime import datetime, date, timedelta
+import asyncio
+import json
+import os
 
-from database import get_db
+from database import get_db, get_async_read_db, SessionLocal
 from models import Notification, User, Task, TaskAssignee
-from schemas import NotificationResponse
-from routers.auth import get_current_user
-from routers.notifications_helper import notify_deadline_reminder
+from schemas import NotificationResponse, NotificationBulkRequest
+from routers.auth import get_current_user, get_current_user_async, get_user_from_token
+from routers.notifications_broker import notification_broker, format_sse
+from routers.queries import unread_count_statement
+from routers.notifications_helper import (
+    notify_deadline_reminder,
+    purge_read_notifications,
+    count_unread,
+    publish_unread_count,
+    NOTIFICATION_RETENTION_DAYS,
+)
 
 router = APIRouter()
 
+NOTIFICATION_STREAM_KEEPALIVE_SECONDS = int(os.getenv("NOTIFICATION_STREAM_KEEPALIVE_SECONDS", "15"))
+
 
 @router.get("/", response_model=List[NotificationResponse])
-def get_notifications(
+async def get_notifications(
     skip: int = 0,
     limit: int = 50,
     unread_only: bool = False,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: User = Depends(get_current_user_async),
 ):
-    """Lấy danh sách notifications của user hiện tại"""
-    query = db.query(Notification).filter(Notification.user_id == current_user.id)
+    """Lấy danh sách notifications của user hiện tại (async)"""
+    query = select(Notification).where(Notification.user_id == current_user.id)
     
     if unread_only:
-        query = query.filter(Notification.is_read == False)
+        query = query.where(Notification.is_read == False)
     
-    notifications = query.order_by(Notification.created_at.desc()).offset(skip).limit(limit).all()
-    return notifications
+    result = await db.execute(query.order_by(Notification.created_at.desc()).offset(skip).limit(limit))
+    return result.scalars().all()
 
 
 @router.get("/unread-count", response_model=dict)
-def get_unread_count(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+async def get_unread_count(
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: User = Depends(get_current_user_async),
 ):
-    """Lấy số lượng notifications chưa đọc"""
-    count = db.query(Notification).filter(
-        Notification.user_id == current_user.id,
-        Notification.is_read == False
-    ).count()
+    """Lấy số lượng notifications chưa đọc (async)"""
+    count = await db.scalar(unread_count_statement(current_user.id))
     return {"count": count}
 
 
+def _open_stream(token: str):
+    """Xác thực token và lấy unread count ban đầu bằng session ngắn hạn"""
+    db = SessionLocal()
+    try:
+        user = get_user_from_token(token, db)
+        return user.id, count_unread(db, user.id)
+    finally:
+        db.close()
+
+
+@router.get("/stream")
+async def stream_notifications(request: Request, token: Optional[str] = None):
+    """
+    SSE stream đẩy notifications mới và unread count cho user hiện tại
+    EventSource không gửi được header Authorization nên nhận token qua query ?token=
+    """
+    if not token:
+        authorization = request.headers.get("Authorization", "")
+        if authorization.lower().startswith("bearer "):
+            token = authorization[7:]
+    if not token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    # Không giữ DB session trong suốt thời gian stream
+    user_id, unread_count = await run_in_threadpool(_open_stream, token)
+
+    async def event_stream():
+        subscriber = notification_broker.subscribe(user_id)
+        try:
+            yield "retry: 5000\n\n"
+            yield format_sse("unread_count", json.dumps({"count": unread_count}))
+            while True:
+                if await request.is_disconnected():
+                    break
+                try:
+                    event, data = await asyncio.wait_for(
+                        subscriber.queue.get(), timeout=NOTIFICATION_STREAM_KEEPALIVE_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_sse(event, data)
+        finally:
+            notification_broker.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.put("/{notification_id}/read")
 def mark_as_read(
     notification_id: int,
@@ -61,6 +131,7 @@ def mark_as_read(
     notification.is_read = True
     notification.read_at = datetime.utcnow()
     db.commit()
+    publish_unread_count(db, current_user.id)
     
     return {"message": "Notification marked as read"}
 
@@ -79,10 +150,76 @@ def mark_all_as_read(
         "read_at": datetime.utcnow()
     })
     db.commit()
+    publish_unread_count(db, current_user.id)
     
     return {"message": "All notifications marked as read"}
 
 
+@router.put("/read-bulk")
+def mark_bulk_as_read(
+    payload: NotificationBulkRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Đánh dấu đã đọc một danh sách notifications (một câu UPDATE)"""
+    if not payload.ids:
+        return {"message": "No notifications to update", "updated": 0}
+
+    updated = db.query(Notification).filter(
+        Notification.user_id == current_user.id,
+        Notification.id.in_(payload.ids),
+        Notification.is_read == False
+    ).update({
+        "is_read": True,
+        "read_at": datetime.utcnow()
+    }, synchronize_session=False)
+    db.commit()
+    publish_unread_count(db, current_user.id)
+
+    return {"message": "Notifications marked as read", "updated": updated}
+
+
+@router.post("/delete-bulk")
+def delete_bulk(
+    payload: NotificationBulkRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Xóa một danh sách notifications của user hiện tại (một câu DELETE)"""
+    if not payload.ids:
+        return {"message": "No notifications to delete", "deleted": 0}
+
+    deleted = db.query(Notification).filter(
+        Notification.user_id == current_user.id,
+        Notification.id.in_(payload.ids)
+    ).delete(synchronize_session=False)
+    db.commit()
+    publish_unread_count(db, current_user.id)
+
+    return {"message": "Notifications deleted", "deleted": deleted}
+
+
+@router.post("/purge-read")
+def purge_read(
+    older_than_days: int = NOTIFICATION_RETENTION_DAYS,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Xóa notifications đã đọc cũ hơn older_than_days ngày
+    Job retention chạy nền định kỳ, endpoint này để admin chạy thủ công
+    """
+    from models import UserRole
+
+    if current_user.role != UserRole.ADMIN.value:
+        raise HTTPException(status_code=403, detail="Only admin can purge notifications")
+    if older_than_days < 1:
+        raise HTTPException(status_code=400, detail="older_than_days must be at least 1")
+
+    deleted = purge_read_notifications(db, older_than_days)
+    return {"message": f"Purged read notifications older than {older_than_days} days", "deleted": deleted}
+
+
 @router.post("/check-deadlines")
 def check_deadlines(
     db: Session = Depends(get_db),
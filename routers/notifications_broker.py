@@ -0,0 +1,87 @@
+"""
+Broker in-process để đẩy notifications realtime tới các SSE subscriber
+Mỗi subscriber (một tab đang mở) có một queue giới hạn kích thước riêng
+"""
+import asyncio
+import json
+import os
+import threading
+from datetime import date, datetime
+from typing import Dict, Set, Tuple
+
+NOTIFICATION_STREAM_QUEUE_SIZE = int(os.getenv("NOTIFICATION_STREAM_QUEUE_SIZE", "100"))
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+class NotificationSubscriber:
+    """Một kết nối SSE của user, gắn với event loop đã tạo ra nó"""
+
+    def __init__(self, user_id: int, loop: asyncio.AbstractEventLoop, max_queue_size: int):
+        self.user_id = user_id
+        self.loop = loop
+        self.queue: "asyncio.Queue[Tuple[str, str]]" = asyncio.Queue(maxsize=max_queue_size)
+
+    def offer(self, event: str, data: str):
+        """Đưa event vào queue (chạy trên event loop của subscriber)"""
+        try:
+            self.queue.put_nowait((event, data))
+        except asyncio.QueueFull:
+            # Client đọc không kịp: bỏ các event cũ và yêu cầu client tự tải lại
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(("resync", "{}"))
+
+
+class NotificationBroker:
+    """Quản lý subscribers theo user_id; publish được gọi từ bất kỳ thread nào"""
+
+    def __init__(self, max_queue_size: int = NOTIFICATION_STREAM_QUEUE_SIZE):
+        self.max_queue_size = max_queue_size
+        self._lock = threading.Lock()
+        self._subscribers: Dict[int, Set[NotificationSubscriber]] = {}
+
+    def subscribe(self, user_id: int) -> NotificationSubscriber:
+        """Đăng ký subscriber mới - phải gọi từ trong event loop"""
+        subscriber = NotificationSubscriber(user_id, asyncio.get_running_loop(), self.max_queue_size)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: NotificationSubscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(subscriber.user_id)
+            if subscribers:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[subscriber.user_id]
+
+    def has_subscribers(self, user_id: int) -> bool:
+        with self._lock:
+            return bool(self._subscribers.get(user_id))
+
+    def publish(self, user_id: int, event: str, payload: dict):
+        """Gửi event tới tất cả subscribers của user"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        if not subscribers:
+            return
+        data = json.dumps(payload, default=_json_default, ensure_ascii=False)
+        for subscriber in subscribers:
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.offer, event, data)
+            except RuntimeError:
+                # Event loop đã đóng (worker đang shutdown)
+                self.unsubscribe(subscriber)
+
+
+notification_broker = NotificationBroker()
+
+
+def format_sse(event: str, data: str) -> str:
+    """Format một message theo chuẩn Server-Sent Events"""
+    return f"event: {event}\ndata: {data}\n\n"
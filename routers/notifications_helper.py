@@ -1,10 +1,21 @@
 """
 Helper functions để tạo notifications tự động khi có events
 """
+from sqlalchemy import event, inspect as sa_inspect
 from sqlalchemy.orm import Session
-from models import Notification, Task, User, TaskAssignee, Project
+from database import SessionLocal
+from models import Notification, Task, User, TaskAssignee
+from routers.notifications_broker import notification_broker
+from routers.queries import get_project_by_id, unread_count_statement
 from typing import List, Optional
-from datetime import datetime
+from datetime import datetime, timedelta
+import os
+import threading
+
+# Retention: xóa notifications đã đọc cũ hơn N ngày
+NOTIFICATION_RETENTION_DAYS = int(os.getenv("NOTIFICATION_RETENTION_DAYS", "90"))
+NOTIFICATION_PURGE_BATCH_SIZE = int(os.getenv("NOTIFICATION_PURGE_BATCH_SIZE", "1000"))
+NOTIFICATION_PURGE_INTERVAL_SECONDS = int(os.getenv("NOTIFICATION_PURGE_INTERVAL_SECONDS", "3600"))
 
 
 def create_notification(
@@ -33,6 +44,76 @@ def create_notification(
     return notification
 
 
+def count_unread(db: Session, user_id: int) -> int:
+    """Đếm số notifications chưa đọc của user"""
+    return db.scalar(unread_count_statement(user_id))
+
+
+def publish_unread_count(db: Session, user_id: int):
+    """Đẩy unread count mới tới các tab đang mở stream (sau khi đánh dấu đọc/xóa)"""
+    if notification_broker.has_subscribers(user_id):
+        notification_broker.publish(user_id, "unread_count", {"count": count_unread(db, user_id)})
+
+
+_PENDING_EVENTS_KEY = "pending_notification_events"
+_PENDING_COUNTS_KEY = "pending_notification_unread_counts"
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _collect_new_notifications(session, flush_context):
+    """Ghi lại notifications vừa được INSERT (kèm unread count) để publish sau khi commit thành công"""
+    user_ids = set()
+    for obj in session.new:
+        if not isinstance(obj, Notification):
+            continue
+        # Đọc từ state đã load để không phát sinh query trong lúc flush
+        state = sa_inspect(obj).dict
+        session.info.setdefault(_PENDING_EVENTS_KEY, []).append({
+            "id": state.get("id"),
+            "user_id": state.get("user_id"),
+            "type": state.get("type"),
+            "title": state.get("title"),
+            "message": state.get("message"),
+            "project_id": state.get("project_id"),
+            "task_id": state.get("task_id"),
+            "thread_id": state.get("thread_id"),
+            "is_read": False,
+            "read_at": None,
+            "created_at": state.get("created_at") or datetime.utcnow(),
+        })
+        user_ids.add(state.get("user_id"))
+
+    # Đếm ngay trên connection của transaction (đã thấy các dòng vừa INSERT), chỉ cho user đang mở
+    # stream; after_commit không được mở session/connection thứ hai
+    subscribed = [user_id for user_id in user_ids if notification_broker.has_subscribers(user_id)]
+    if subscribed:
+        connection = session.connection()
+        counts = session.info.setdefault(_PENDING_COUNTS_KEY, {})
+        for user_id in subscribed:
+            counts[user_id] = connection.scalar(unread_count_statement(user_id))
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _publish_committed_notifications(session):
+    pending = session.info.pop(_PENDING_EVENTS_KEY, None)
+    unread_counts = session.info.pop(_PENDING_COUNTS_KEY, {})
+    if not pending:
+        return
+
+    for item in pending:
+        if item["user_id"] in unread_counts:
+            notification_broker.publish(item["user_id"], "notification", {
+                "notification": item,
+                "unread_count": unread_counts[item["user_id"]],
+            })
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_pending_notifications(session):
+    session.info.pop(_PENDING_EVENTS_KEY, None)
+    session.info.pop(_PENDING_COUNTS_KEY, None)
+
+
 def notify_task_assigned(
     db: Session,
     task: Task,
@@ -93,7 +174,7 @@ def notify_mentioned_in_thread(
     thread_content: str
 ):
     """Tạo notification khi user được mention trong thread"""
-    project = db.query(Project).filter(Project.id == project_id).first()
+    project = get_project_by_id(db, project_id)
     if not project:
         return
     
@@ -136,3 +217,84 @@ def notify_deadline_reminder(
         )
     db.commit()
 
+
+def purge_read_notifications(
+    db: Session,
+    older_than_days: int = NOTIFICATION_RETENTION_DAYS,
+    batch_size: int = NOTIFICATION_PURGE_BATCH_SIZE
+) -> int:
+    """Xóa notifications đã đọc cũ hơn older_than_days ngày, theo từng batch.
+
+    Duyệt theo từng user để query chọn id đi qua index
+    idx_notifications_user_created (user_id, created_at), mỗi batch commit riêng
+    để không giữ lock lâu trên bảng notifications.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    user_ids = [row[0] for row in db.query(User.id).all()]
+
+    deleted_total = 0
+    for user_id in user_ids:
+        while True:
+            batch_ids = [
+                row[0] for row in
+                db.query(Notification.id)
+                .filter(
+                    Notification.user_id == user_id,
+                    Notification.created_at < cutoff,
+                    Notification.is_read == True
+                )
+                .order_by(Notification.created_at)
+                .limit(batch_size)
+                .all()
+            ]
+            if not batch_ids:
+                break
+
+            deleted = db.query(Notification).filter(
+                Notification.id.in_(batch_ids)
+            ).delete(synchronize_session=False)
+            db.commit()
+            deleted_total += deleted
+
+            if len(batch_ids) < batch_size:
+                break
+
+    return deleted_total
+
+
+_retention_stop_event = threading.Event()
+_retention_thread: Optional[threading.Thread] = None
+
+
+def _retention_loop():
+    while not _retention_stop_event.is_set():
+        db = SessionLocal()
+        try:
+            deleted = purge_read_notifications(db)
+            if deleted:
+                print(f"Notification retention: deleted {deleted} read notifications older than {NOTIFICATION_RETENTION_DAYS} days")
+        except Exception as e:
+            db.rollback()
+            print(f"ERROR: Notification retention job failed: {e}")
+        finally:
+            db.close()
+        _retention_stop_event.wait(NOTIFICATION_PURGE_INTERVAL_SECONDS)
+
+
+def start_notification_retention_job():
+    """Chạy job retention trong background thread (gọi khi app startup)"""
+    global _retention_thread
+    if NOTIFICATION_RETENTION_DAYS <= 0 or NOTIFICATION_PURGE_INTERVAL_SECONDS <= 0:
+        return
+    if _retention_thread and _retention_thread.is_alive():
+        return
+    _retention_stop_event.clear()
+    _retention_thread = threading.Thread(
+        target=_retention_loop, name="notification-retention", daemon=True
+    )
+    _retention_thread.start()
+
+
+def stop_notification_retention_job():
+    """Dừng job retention (gọi khi app shutdown)"""
+    _retention_stop_event.set()
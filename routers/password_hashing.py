@@ -0,0 +1,91 @@
+"""
+Pool riêng cho bcrypt để login/register dồn dập không chiếm hết threadpool dùng chung của FastAPI
+Số worker và độ dài hàng đợi có giới hạn; khi quá tải trả 503 ngay thay vì xếp hàng
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "32"))
+
+# min/max rounds = BCRYPT_ROUNDS để needs_update() báo hash cũ có cost khác -> rehash khi login
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+# bcrypt nhả GIL khi hash nên thread pool là đủ
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+_in_flight_lock = threading.Lock()
+_in_flight = 0
+_rejected = 0
+
+
+def _overloaded_exception():
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Server is busy, please try again",
+        headers={"Retry-After": "1"},
+    )
+
+
+def _release(_future):
+    global _in_flight
+    with _in_flight_lock:
+        _in_flight -= 1
+
+
+def _submit(fn, *args) -> Future:
+    """Đưa job vào pool nếu còn chỗ (đang chạy + đang chờ), nếu không raise 503"""
+    global _in_flight, _rejected
+    with _in_flight_lock:
+        if _in_flight >= PASSWORD_HASH_WORKERS + PASSWORD_HASH_MAX_QUEUE:
+            _rejected += 1
+            raise _overloaded_exception()
+        _in_flight += 1
+    try:
+        future = _executor.submit(fn, *args)
+    except Exception:
+        _release(None)
+        raise
+    future.add_done_callback(_release)
+    return future
+
+
+def verify_password(plain_password, hashed_password) -> bool:
+    """Xác thực password (blocking - dùng trong handler sync)"""
+    return _submit(pwd_context.verify, plain_password, hashed_password).result()
+
+
+def get_password_hash(password) -> str:
+    """Hash password (blocking - dùng trong handler sync)"""
+    return _submit(pwd_context.hash, password).result()
+
+
+async def verify_and_update_password_async(plain_password, hashed_password):
+    """Xác thực password trong pool; trả về (hợp lệ, hash mới nếu cần rehash theo BCRYPT_ROUNDS)"""
+    return await asyncio.wrap_future(_submit(pwd_context.verify_and_update, plain_password, hashed_password))
+
+
+async def get_password_hash_async(password) -> str:
+    return await asyncio.wrap_future(_submit(pwd_context.hash, password))
+
+
+def stats() -> dict:
+    with _in_flight_lock:
+        return {
+            "workers": PASSWORD_HASH_WORKERS,
+            "max_queue": PASSWORD_HASH_MAX_QUEUE,
+            "in_flight": _in_flight,
+            "rejected": _rejected,
+            "bcrypt_rounds": BCRYPT_ROUNDS,
+        }
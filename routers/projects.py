@@ -1,11 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
-from database import get_db
+from database import get_db, get_read_db
 from models import Project, ProjectType
 from schemas import ProjectCreate, ProjectUpdate, ProjectResponse
 from routers.auth import get_current_user
+from routers.fields import parse_fields, select_columns, sparse_response
+from routers.queries import get_project_by_id
+from routers.versioning import PROJECTS, PROJECT_TYPES, check_etag, resource_etag, with_etag
 from typing import List
 from pydantic import BaseModel
 
@@ -22,19 +25,28 @@ class ProjectTypeResponse(BaseModel):
 
 @router.get("/", response_model=List[ProjectResponse])
 def get_projects(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
+    fields: Optional[str] = None,
+    db: Session = Depends(get_read_db),
     current_user=Depends(get_current_user),
 ):
-    """Lấy danh sách tất cả projects"""
+    """Lấy danh sách tất cả projects (304 nếu không có project nào thay đổi, ?fields= để chỉ lấy một số cột)"""
+    requested = parse_fields(fields, ProjectResponse)
+    not_modified = check_etag(request, response, resource_etag(request, db, current_user.id, PROJECTS))
+    if not_modified:
+        return not_modified
+    if requested is not None:
+        return with_etag(response, sparse_response(db.execute(select_columns(Project, requested).offset(skip).limit(limit)).mappings()))
     projects = db.query(Project).offset(skip).limit(limit).all()
     return projects
 
 @router.get("/{project_id}", response_model=ProjectResponse)
-def get_project(project_id: int, db: Session = Depends(get_db)):
+def get_project(project_id: int, db: Session = Depends(get_read_db)):
     """Lấy thông tin một project"""
-    project = db.query(Project).filter(Project.id == project_id).first()
+    project = get_project_by_id(db, project_id)
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     return project
@@ -60,7 +72,7 @@ def update_project(
     current_user=Depends(get_current_user),
 ):
     """Cập nhật project"""
-    db_project = db.query(Project).filter(Project.id == project_id).first()
+    db_project = get_project_by_id(db, project_id)
     if not db_project:
         raise HTTPException(status_code=404, detail="Project not found")
     if db_project.owner_id != current_user.id:
@@ -81,7 +93,7 @@ def delete_project(
     current_user=Depends(get_current_user),
 ):
     """Xóa project"""
-    db_project = db.query(Project).filter(Project.id == project_id).first()
+    db_project = get_project_by_id(db, project_id)
     if not db_project:
         raise HTTPException(status_code=404, detail="Project not found")
     if db_project.owner_id != current_user.id:
@@ -94,10 +106,15 @@ def delete_project(
 
 @router.get("/types/list", response_model=List[ProjectTypeResponse])
 def get_project_types(
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_read_db),
     current_user=Depends(get_current_user),
 ):
-    """Lấy danh sách project types"""
+    """Lấy danh sách project types (304 nếu không thay đổi)"""
+    not_modified = check_etag(request, response, resource_etag(request, db, current_user.id, PROJECT_TYPES))
+    if not_modified:
+        return not_modified
     project_types = db.query(ProjectType).order_by(ProjectType.id).all()
     return project_types
 
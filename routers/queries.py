@@ -0,0 +1,58 @@
+"""
+Các query chạy nhiều nhất (mỗi request/nhiều lần mỗi request), viết bằng lambda_stmt:
+SQLAlchemy cache cả statement theo vị trí lambda nên các lần gọi sau bỏ qua bước
+dựng select() + tính cache key, chỉ bind lại tham số (task_id, user_id...).
+Biến dùng trong lambda phải là giá trị đơn giản (int/str), không phải object ORM.
+"""
+from sqlalchemy import func, lambda_stmt, select
+from sqlalchemy.orm import Session, joinedload
+
+from models import Notification, Project, Task, TaskAssignee, User
+
+
+def get_user_by_username(db: Session, username: str):
+    stmt = lambda_stmt(lambda: select(User).where(User.username == username))
+    return db.execute(stmt).scalars().first()
+
+
+def get_project_by_id(db: Session, project_id: int):
+    """Project theo id: Session.get dùng identity map trước, SQL của nó đã được cache sẵn"""
+    return db.get(Project, project_id)
+
+
+def get_task_by_id(db: Session, task_id: int):
+    stmt = lambda_stmt(lambda: select(Task).where(Task.id == task_id))
+    return db.execute(stmt).scalars().first()
+
+
+def get_task_with_assignees(db: Session, task_id: int):
+    """Task + assignees + project, đủ để kiểm tra quyền sửa (owner hoặc assignee)"""
+    stmt = lambda_stmt(
+        lambda: select(Task)
+        .options(joinedload(Task.assignees), joinedload(Task.project))
+        .where(Task.id == task_id)
+    )
+    return db.execute(stmt).unique().scalars().first()
+
+
+def get_task_with_members(db: Session, task_id: int):
+    """Task + assignees (kèm user) + project (kèm team members), dùng cho quyền xem/comment"""
+    stmt = lambda_stmt(
+        lambda: select(Task)
+        .options(
+            joinedload(Task.assignees).joinedload(TaskAssignee.user),
+            joinedload(Task.project).joinedload(Project.team_members),
+        )
+        .where(Task.id == task_id)
+    )
+    return db.execute(stmt).unique().scalars().first()
+
+
+def unread_count_statement(user_id: int):
+    """Statement đếm notifications chưa đọc (dùng được cho cả Session và AsyncSession)"""
+    return lambda_stmt(
+        lambda: select(func.count()).select_from(Notification).where(
+            Notification.user_id == user_id,
+            Notification.is_read == False
+        )
+    )
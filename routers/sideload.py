@@ -0,0 +1,30 @@
+"""
+Side-load user cho các response danh sách (thread, comment, activity, task)
+Mặc định mỗi dòng chép nguyên object user (thread 2k message từ 10 người = 2k bản user trùng nhau).
+Với ?sideload_users=true, dòng chỉ giữ user_id (task: assignee_ids), mỗi user xuất hiện một lần
+trong map "users" ở top-level:
+    {"items": [...], "users": {"3": {...}, "7": {...}}}
+Opt-in để client cũ vẫn nhận shape list như trước.
+"""
+from responses import AppJSONResponse
+
+
+def _extract_users(row: dict, users: dict):
+    user = row.pop("user", None)
+    if user:
+        users.setdefault(user["id"], user)
+    if "assignees" in row:
+        assignees = row.pop("assignees") or []
+        for assignee in assignees:
+            users.setdefault(assignee["id"], assignee)
+        row["assignee_ids"] = [assignee["id"] for assignee in assignees]
+    for reply in row.get("replies") or []:
+        _extract_users(reply, users)
+
+
+def sideload_response(rows: list) -> AppJSONResponse:
+    """Tách object user khỏi từng dòng (kể cả replies lồng nhau) vào map users dùng chung"""
+    users = {}
+    for row in rows:
+        _extract_users(row, users)
+    return AppJSONResponse({"items": rows, "users": users})
@@ -0,0 +1,210 @@
+"""
+Storage backend cho file upload (attachment, avatar)
+- STORAGE_BACKEND=local (mặc định): file nằm trong static/uploads, phục vụ qua mount /static
+- STORAGE_BACKEND=s3: bucket S3-compatible (AWS S3, MinIO, ...), cần boto3; nhiều app node dùng chung
+- Key là đường dẫn tương đối (VD blobs/ab/<sha>.pdf, avatars/user_1_<hex>.png). URL lưu trong DB luôn là
+  /static/uploads/<key> với cả hai backend, nên đổi backend chỉ cần copy file, không phải sửa dữ liệu
+- Backend s3: /static/uploads/<key> trả 307 tới presigned URL; /api/attachments/{id} cũng vậy sau khi
+  kiểm tra quyền. Byte file đi thẳng giữa bucket và client, không qua app server
+File upload luôn được stream vào file tạm local trước (giới hạn dung lượng + SHA-256), put_file đưa
+file tạm vào storage: local là rename (atomic), s3 là upload rồi xóa file tạm.
+"""
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional, Tuple
+from urllib.parse import quote
+
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import RedirectResponse
+
+try:
+    import boto3
+    from botocore.config import Config as BotoConfig
+    from botocore.exceptions import ClientError
+except ImportError:  # boto3 chỉ cần cho STORAGE_BACKEND=s3
+    boto3 = None
+
+UPLOAD_ROOT = Path("static/uploads")
+UPLOAD_URL_PREFIX = "/static/uploads"
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local").lower()
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL", "")  # MinIO: http://localhost:9000, AWS: để trống
+S3_BUCKET = os.getenv("S3_BUCKET", "")
+S3_REGION = os.getenv("S3_REGION", "us-east-1")
+S3_ACCESS_KEY_ID = os.getenv("S3_ACCESS_KEY_ID", "")
+S3_SECRET_ACCESS_KEY = os.getenv("S3_SECRET_ACCESS_KEY", "")
+S3_KEY_PREFIX = os.getenv("S3_KEY_PREFIX", "")
+S3_ADDRESSING_STYLE = os.getenv("S3_ADDRESSING_STYLE", "path")  # MinIO cần path-style
+S3_PRESIGN_EXPIRES_SECONDS = int(os.getenv("S3_PRESIGN_EXPIRES_SECONDS", "900"))
+
+
+def content_disposition(disposition: str, filename: str) -> str:
+    # Giống FileResponse: tên có ký tự ngoài ASCII (tiếng Việt) dùng filename*
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"{disposition}; filename*=utf-8''{quoted}"
+    return f'{disposition}; filename="{filename}"'
+
+
+class _Storage:
+    """Các thao tác đồng bộ (dùng được trong thread nền) + bản async chạy trong threadpool"""
+    name = ""
+
+    async def put_file_async(self, tmp_path: Path, key: str, content_type: Optional[str] = None):
+        await run_in_threadpool(self.put_file, tmp_path, key, content_type)
+
+    async def exists_async(self, key: str) -> bool:
+        return await run_in_threadpool(self.exists, key)
+
+    def url(self, key: str) -> str:
+        return f"{UPLOAD_URL_PREFIX}/{key}"
+
+    def list_keys(self, prefix: str) -> Iterator[str]:
+        for key, _ in self.list_objects(prefix):
+            yield key
+
+
+class LocalStorage(_Storage):
+    """File trong thư mục local (một app node, hoặc nhiều node dùng chung volume)"""
+    name = "local"
+
+    def __init__(self, root: Path):
+        self.root = root
+
+    def local_path(self, key: str) -> Optional[Path]:
+        return self.root / key
+
+    def staging_dir(self, key: str) -> Optional[Path]:
+        # File tạm cùng thư mục đích: put_file là rename atomic
+        directory = (self.root / key).parent
+        directory.mkdir(parents=True, exist_ok=True)
+        return directory
+
+    def put_file(self, tmp_path: Path, key: str, content_type: Optional[str] = None):
+        destination = self.root / key
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        shutil.move(str(tmp_path), str(destination))
+
+    def exists(self, key: str) -> bool:
+        return (self.root / key).exists()
+
+    def delete(self, key: str):
+        (self.root / key).unlink(missing_ok=True)
+
+    def list_objects(self, prefix: str) -> Iterator[Tuple[str, float]]:
+        start = self.root / prefix
+        if not start.exists():
+            return
+        for path in start.rglob("*"):
+            if path.is_file() and not path.name.startswith("."):
+                yield path.relative_to(self.root).as_posix(), path.stat().st_mtime
+
+    @contextmanager
+    def local_copy(self, key: str) -> Iterator[Path]:
+        yield self.root / key
+
+    def presigned_url(self, key: str, filename: Optional[str] = None, disposition: str = "attachment") -> Optional[str]:
+        # App tự phục vụ file local (StaticFiles / FileResponse)
+        return None
+
+
+class S3Storage(_Storage):
+    """Bucket S3-compatible; download đi qua presigned URL"""
+    name = "s3"
+
+    def __init__(self):
+        if boto3 is None:
+            raise RuntimeError("STORAGE_BACKEND=s3 requires boto3 (pip install boto3)")
+        if not S3_BUCKET:
+            raise RuntimeError("STORAGE_BACKEND=s3 requires S3_BUCKET")
+        self.bucket = S3_BUCKET
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=S3_ENDPOINT_URL or None,
+            region_name=S3_REGION,
+            aws_access_key_id=S3_ACCESS_KEY_ID or None,
+            aws_secret_access_key=S3_SECRET_ACCESS_KEY or None,
+            config=BotoConfig(signature_version="s3v4", s3={"addressing_style": S3_ADDRESSING_STYLE}),
+        )
+
+    def _object_key(self, key: str) -> str:
+        return S3_KEY_PREFIX + key
+
+    def local_path(self, key: str) -> Optional[Path]:
+        return None
+
+    def staging_dir(self, key: str) -> Optional[Path]:
+        return None  # thư mục tạm của hệ thống
+
+    def put_file(self, tmp_path: Path, key: str, content_type: Optional[str] = None):
+        extra_args = {"ContentType": content_type} if content_type else {}
+        try:
+            # upload_file tự chia multipart cho file lớn
+            self.client.upload_file(str(tmp_path), self.bucket, self._object_key(key), ExtraArgs=extra_args)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=self._object_key(key))
+
+    def list_objects(self, prefix: str) -> Iterator[Tuple[str, float]]:
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self._object_key(prefix)):
+            for item in page.get("Contents", []):
+                yield item["Key"][len(S3_KEY_PREFIX):], item["LastModified"].timestamp()
+
+    @contextmanager
+    def local_copy(self, key: str) -> Iterator[Path]:
+        fd, tmp_path = tempfile.mkstemp(prefix=".storage-")
+        os.close(fd)
+        try:
+            self.client.download_file(self.bucket, self._object_key(key), tmp_path)
+            yield Path(tmp_path)
+        finally:
+            os.remove(tmp_path)
+
+    def presigned_url(self, key: str, filename: Optional[str] = None, disposition: str = "attachment") -> Optional[str]:
+        params = {"Bucket": self.bucket, "Key": self._object_key(key)}
+        if filename:
+            params["ResponseContentDisposition"] = content_disposition(disposition, filename)
+        return self.client.generate_presigned_url("get_object", Params=params, ExpiresIn=S3_PRESIGN_EXPIRES_SECONDS)
+
+
+def create_storage(backend: str = STORAGE_BACKEND) -> _Storage:
+    if backend == "local":
+        return LocalStorage(UPLOAD_ROOT)
+    if backend == "s3":
+        return S3Storage()
+    raise RuntimeError(f"Unknown STORAGE_BACKEND: {backend}")
+
+
+storage = create_storage()
+
+
+def key_from_url(url: Optional[str]) -> Optional[str]:
+    """/static/uploads/<key> -> key (URL ngoài kho upload trả về None)"""
+    prefix = UPLOAD_URL_PREFIX + "/"
+    if url and url.startswith(prefix):
+        return url[len(prefix):]
+    return None
+
+
+def redirect_to_storage(key: str):
+    """GET /static/uploads/<key> khi dùng s3: chuyển tới presigned URL (ảnh, avatar, link cũ)"""
+    response = RedirectResponse(storage.presigned_url(key), status_code=307)
+    # Cache redirect ngắn hơn hạn của URL ký sẵn
+    response.headers["Cache-Control"] = f"private, max-age={S3_PRESIGN_EXPIRES_SECONDS // 2}"
+    return response
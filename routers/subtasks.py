@@ -1,27 +1,23 @@
-import os
-import uuid
-from pathlib import Path
-
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
 from sqlalchemy.orm import Session
 from typing import List
 
 from database import get_db
-from models import SubTask, Task, User, WorkLog, UserRole, TaskAssignee
+from models import SubTask, Task, WorkLog, UserRole, TaskAssignee
 from schemas import SubTaskCreate, SubTaskUpdate, SubTaskResponse
 from routers.auth import get_current_user
 from routers.activities import log_activity
-from sqlalchemy.orm import joinedload
+from routers.queries import get_task_with_assignees
+from routers.attachment_store import (
+    OWNER_SUBTASK, download_url, load_attachment_entries, store_attachment, store_attachments,
+)
 
 
 router = APIRouter()
 
-UPLOAD_DIR = Path("static/uploads")
-UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
-
 
 def _get_task_or_404(db: Session, task_id: int) -> Task:
-    task = db.query(Task).options(joinedload(Task.assignees), joinedload(Task.project)).filter(Task.id == task_id).first()
+    task = get_task_with_assignees(db, task_id)
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     return task
@@ -34,6 +30,14 @@ def _get_subtask_or_404(db: Session, subtask_id: int) -> SubTask:
     return subtask
 
 
+def _load_subtask_attachments(db: Session, subtasks: List[SubTask]) -> List[SubTask]:
+    """Gán attachment_list cho cả danh sách subtask (một query)"""
+    entries = load_attachment_entries(db, OWNER_SUBTASK, [subtask.id for subtask in subtasks])
+    for subtask in subtasks:
+        subtask.attachment_list = entries.get(subtask.id, [])
+    return subtasks
+
+
 def _ensure_task_permission(task: Task, current_user):
     # Kiểm tra quyền: project owner hoặc assignee
     if task.project.owner_id != current_user.id:
@@ -52,7 +56,7 @@ def _ensure_worklog_permission(worklog: WorkLog, current_user):
 def list_subtasks(task_id: int, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
     task = _get_task_or_404(db, task_id)
     _ensure_task_permission(task, current_user)
-    return task.subtasks
+    return _load_subtask_attachments(db, list(task.subtasks))
 
 
 @router.post("/", response_model=SubTaskResponse)
@@ -111,11 +115,10 @@ def update_subtask(subtask_id: int, payload: SubTaskUpdate, db: Session = Depend
     # Log activity: subtask completed
     if "is_done" in update_data and update_data["is_done"] and not old_is_done:
         task = db.query(Task).filter(Task.id == db_subtask.task_id).first()
-        current_user_obj = db.query(User).filter(User.id == current_user.id).first()
         log_activity(
             db, task.project_id, current_user.id,
             "subtask_completed", "subtask", db_subtask.id,
-            f"{current_user_obj.full_name or current_user_obj.username} đã hoàn thành subtask '{db_subtask.title}' của task '{task.title}'",
+            f"{current_user.full_name or current_user.username} đã hoàn thành subtask '{db_subtask.title}' của task '{task.title}'",
             {"task_id": task.id, "task_title": task.title, "subtask_id": db_subtask.id, "subtask_title": db_subtask.title}
         )
     
@@ -144,15 +147,30 @@ async def upload_subtask_attachment(
     task = _get_task_or_404(db, db_subtask.task_id)
     _ensure_task_permission(task, current_user)
 
-    extension = os.path.splitext(file.filename)[1] or ".dat"
-    filename = f"subtask_{subtask_id}_{uuid.uuid4().hex}{extension}"
-    destination = UPLOAD_DIR / filename
+    ref = await store_attachment(db, file, "subtask", OWNER_SUBTASK, subtask_id)
+
+    db_subtask.attachment_url = download_url(ref)
+    db.commit()
+    db.refresh(db_subtask)
+    return _load_subtask_attachments(db, [db_subtask])[0]
+
 
-    with destination.open("wb") as buffer:
-        buffer.write(await file.read())
+@router.post("/{subtask_id}/attachments/batch", response_model=SubTaskResponse)
+async def upload_subtask_attachments(
+    subtask_id: int,
+    files: List[UploadFile] = File(...),
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    """Upload nhiều file trong một request; file đầu tiên thành attachment_url nếu subtask chưa có file"""
+    db_subtask = _get_subtask_or_404(db, subtask_id)
+    task = _get_task_or_404(db, db_subtask.task_id)
+    _ensure_task_permission(task, current_user)
 
-    db_subtask.attachment_url = f"/static/uploads/{filename}"
+    refs = await store_attachments(db, files, "subtask", OWNER_SUBTASK, subtask_id)
+    if refs and not db_subtask.attachment_url:
+        db_subtask.attachment_url = download_url(refs[0])
     db.commit()
     db.refresh(db_subtask)
-    return db_subtask
+    return _load_subtask_attachments(db, [db_subtask])[0]
 
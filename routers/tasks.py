@@ -1,19 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session, joinedload
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload, noload, selectinload
 from typing import List, Optional
 
-from database import get_db, engine
-from models import Task, Project, User, TaskStatus, TaskAssignee
-from schemas import TaskCreate, TaskUpdate, TaskResponse, TaskMove, UserResponse
-from routers.auth import get_current_user
+from database import get_db, get_read_db, get_async_read_db
+from models import Task, Project, User, TaskStatus, TaskAssignee, SubTask
+from schemas import TaskCreate, TaskUpdate, TaskResponse, TaskMove, UserResponse, SubTaskResponse
+from schema_registry import schema_capabilities
+from routers.auth import get_current_user, get_current_user_async
+from routers.fields import load_only_columns, parse_fields, sparse_response, sparse_row
 from routers.activities import log_activity
+from routers.queries import get_project_by_id, get_task_by_id
+from routers.sideload import sideload_response
+from routers.versioning import check_etag, make_etag, project_version_statement, versioning_available, with_etag
 from routers.notifications_helper import notify_task_assigned, notify_task_updated
 
 router = APIRouter()
 
 
 def _get_task_or_404(db: Session, task_id: int) -> Task:
-    task = db.query(Task).filter(Task.id == task_id).first()
+    task = get_task_by_id(db, task_id)
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     return task
@@ -39,13 +46,17 @@ def _ensure_task_access(task: Task, user: User):
     raise HTTPException(status_code=403, detail="You do not have permission for this task")
 
 
-def _enrich_task(task: Task):
+def _set_progress(task: Task):
     total = len(task.subtasks)
     completed = len([s for s in task.subtasks if s.is_done])
     progress = (completed / total * 100) if total else (100.0 if task.status == TaskStatus.DONE.value else 0.0)
     task.total_subtasks = total
     task.completed_subtasks = completed
     task.progress_percent = round(progress, 2)
+
+
+def _enrich_task(task: Task):
+    _set_progress(task)
     
     # Thêm thông tin assignees dưới dạng list UserResponse
     # KHÔNG gán vào task.assignees (relationship) mà tạo attribute mới
@@ -72,80 +83,131 @@ def _enrich_task(task: Task):
     return task
 
 
+_PROGRESS_FIELDS = {"progress_percent", "completed_subtasks", "total_subtasks"}
+
+
+def _sparse_task_options(fields) -> list:
+    """Chỉ load cột và relationship mà ?fields= yêu cầu"""
+    requested = set(fields)
+    needs_progress = bool(requested & _PROGRESS_FIELDS)
+    # id luôn được load để load_only không rỗng khi chỉ yêu cầu field lồng nhau
+    options = [load_only_columns(Task, fields, "id", *(["status"] if needs_progress else []))]
+    if "subtasks" in requested:
+        options.append(selectinload(Task.subtasks))
+    elif needs_progress:
+        options.append(selectinload(Task.subtasks).load_only(SubTask.is_done))
+    if schema_capabilities.has_table("task_assignees"):
+        if "assignees" in requested:
+            options.append(selectinload(Task.assignees).selectinload(TaskAssignee.user))
+        elif "assignee_ids" in requested:
+            options.append(selectinload(Task.assignees).load_only(TaskAssignee.user_id))
+    return options
+
+
+def _sparse_task(task: Task, fields) -> dict:
+    requested = set(fields)
+    computed = {}
+    if requested & _PROGRESS_FIELDS:
+        _set_progress(task)
+    if "subtasks" in requested:
+        computed["subtasks"] = [SubTaskResponse.model_validate(s).model_dump() for s in task.subtasks]
+    has_assignees = schema_capabilities.has_table("task_assignees")
+    if "assignees" in requested:
+        computed["assignees"] = [
+            UserResponse.model_validate(ta.user).model_dump()
+            for ta in (task.assignees if has_assignees else [])
+            if ta.user
+        ]
+    if "assignee_ids" in requested:
+        computed["assignee_ids"] = [ta.user_id for ta in task.assignees] if has_assignees else []
+    return sparse_row(task, fields, computed)
+
+
 @router.get("/", response_model=List[TaskResponse])
-def get_tasks(
+async def get_tasks(
+    request: Request,
+    response: Response,
     project_id: Optional[int] = None,
     status: Optional[str] = None,
     skip: int = 0,
     limit: int = 100,
     assigned_only: bool = True,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    fields: Optional[str] = None,
+    sideload_users: bool = False,
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: User = Depends(get_current_user_async),
 ):
-    """Lấy danh sách tasks với filter"""
-    query = db.query(Task)
+    """Lấy danh sách tasks với filter (async - không chiếm thread của threadpool).
+    ?fields=id,title,status,due_date chỉ trả các field đó (calendar, widget deadline).
+    sideload_users=true: task chỉ giữ assignee_ids, user nằm trong map users ở top-level"""
+    requested = parse_fields(fields, TaskResponse)
+    # Lọc theo project: ETag theo version của project, reload khi không có gì đổi chỉ tốn một query nhỏ
+    if project_id and versioning_available():
+        versions = (await db.execute(project_version_statement(project_id))).first()
+        if versions is not None:
+            not_modified = check_etag(request, response, make_etag(request, current_user.id, "tasks", *versions))
+            if not_modified:
+                return not_modified
+
+    query = select(Task)
 
     if project_id:
-        query = query.filter(Task.project_id == project_id)
+        query = query.where(Task.project_id == project_id)
         if not assigned_only:
-            project = db.query(Project).filter(Project.id == project_id).first()
+            project = await db.get(Project, project_id)
             if not project:
                 raise HTTPException(status_code=404, detail="Project not found")
     if assigned_only:
         # Filter tasks where user is assigned via task_assignees
-        assignee_task_ids = [
-            row[0] for row in 
-            db.query(TaskAssignee.task_id)
-            .filter(TaskAssignee.user_id == current_user.id)
+        result = await db.execute(
+            select(TaskAssignee.task_id)
+            .where(TaskAssignee.user_id == current_user.id)
             .distinct()
-            .all()
-        ]
+        )
+        assignee_task_ids = result.scalars().all()
         
         if assignee_task_ids:
-            query = query.filter(Task.id.in_(assignee_task_ids))
+            query = query.where(Task.id.in_(assignee_task_ids))
         else:
             # Nếu không có task nào được assign, trả về empty list
-            query = query.filter(Task.id == -1)  # Không match task nào
+            query = query.where(Task.id == -1)  # Không match task nào
     if status:
-        query = query.filter(Task.status == status)
+        query = query.where(Task.status == status)
 
-    # Eager load relationships
-    # Kiểm tra xem bảng task_assignees có tồn tại không
-    from sqlalchemy import inspect
-    inspector = inspect(engine)
-    has_task_assignees_table = 'task_assignees' in inspector.get_table_names()
-    
-    if has_task_assignees_table:
-        tasks = (
-            query.options(
-                joinedload(Task.assignees).joinedload(TaskAssignee.user),
-                joinedload(Task.subtasks),
-                joinedload(Task.project)
-            )
-            .order_by(Task.position, Task.created_at.desc())
-            .offset(skip)
-            .limit(limit)
-            .all()
-        )
+    if requested is not None:
+        options = _sparse_task_options(requested)
     else:
-        # Fallback nếu bảng chưa tồn tại
-        tasks = (
-            query.options(
-                joinedload(Task.subtasks),
-                joinedload(Task.project)
-            )
-            .order_by(Task.position, Task.created_at.desc())
-            .offset(skip)
-            .limit(limit)
-            .all()
-        )
-    return [_enrich_task(task) for task in tasks]
+        # Eager load relationships (async session không lazy load được)
+        options = [selectinload(Task.subtasks), joinedload(Task.project)]
+        # Schema được detect một lần lúc startup (schema_registry), không reflect trên mỗi request
+        if schema_capabilities.has_table("task_assignees"):
+            options.append(selectinload(Task.assignees).selectinload(TaskAssignee.user))
+        else:
+            # Fallback nếu bảng chưa tồn tại
+            options.append(noload(Task.assignees))
+
+    result = await db.execute(
+        query.options(*options)
+        .order_by(Task.position, Task.created_at.desc())
+        .offset(skip)
+        .limit(limit)
+    )
+    tasks = result.scalars().all()
+    if requested is not None:
+        rows = [_sparse_task(task, requested) for task in tasks]
+    elif sideload_users:
+        rows = [TaskResponse.model_validate(_enrich_task(task)).model_dump() for task in tasks]
+    else:
+        return [_enrich_task(task) for task in tasks]
+    if sideload_users:
+        return with_etag(response, sideload_response(rows))
+    return with_etag(response, sparse_response(rows))
 
 
 @router.get("/{task_id}", response_model=TaskResponse)
 def get_task(
     task_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_user),
 ):
     """Lấy thông tin một task"""
@@ -175,7 +237,7 @@ def create_task(
     current_user: User = Depends(get_current_user),
 ):
     """Tạo task mới"""
-    project = db.query(Project).filter(Project.id == task.project_id).first()
+    project = get_project_by_id(db, task.project_id)
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     _ensure_project_owner(project, current_user)
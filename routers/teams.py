@@ -2,15 +2,16 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from typing import List
 from database import get_db
-from models import TeamMember, Project, User
+from models import TeamMember, User
 from schemas import TeamMemberCreate, TeamMemberResponse
+from routers.queries import get_project_by_id
 
 router = APIRouter()
 
 @router.get("/project/{project_id}", response_model=List[TeamMemberResponse])
 def get_team_members(project_id: int, db: Session = Depends(get_db)):
     """Lấy danh sách team members của một project"""
-    project = db.query(Project).filter(Project.id == project_id).first()
+    project = get_project_by_id(db, project_id)
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     
@@ -21,7 +22,7 @@ def get_team_members(project_id: int, db: Session = Depends(get_db)):
 def add_team_member(member: TeamMemberCreate, db: Session = Depends(get_db)):
     """Thêm member vào project"""
     # Kiểm tra project tồn tại
-    project = db.query(Project).filter(Project.id == member.project_id).first()
+    project = get_project_by_id(db, member.project_id)
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     
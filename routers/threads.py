@@ -1,14 +1,19 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
 from typing import List, Optional
 from datetime import datetime
 import re
 
-from database import get_db
+from database import get_db, get_async_read_db
 from models import Thread, Project, User
 from schemas import ThreadCreate, ThreadUpdate, ThreadResponse, UserResponse
-from routers.auth import get_current_user
+from routers.auth import get_current_user, get_current_user_async
 from routers.notifications_helper import notify_mentioned_in_thread
+from routers.queries import get_project_by_id
+from routers.avatars import avatar_variants
+from routers.sideload import sideload_response
 
 router = APIRouter()
 
@@ -68,7 +73,7 @@ def parse_mentions(content: str, project_id: int, db: Session) -> List[int]:
         return []
     
     # Lấy danh sách users trong project (có thể mở rộng để lấy từ team members)
-    project = db.query(Project).filter(Project.id == project_id).first()
+    project = get_project_by_id(db, project_id)
     if not project:
         print(f"DEBUG parse_mentions: Project {project_id} not found")
         return []
@@ -129,9 +134,9 @@ def _ensure_project_access(project: Project, user: User):
         pass
 
 
-def _enrich_thread(thread: Thread, db: Session) -> dict:
-    """Enrich thread với thông tin user và replies"""
-    thread_dict = {
+def _thread_to_dict(thread: Thread) -> dict:
+    """Chuyển thread sang dict kèm thông tin user (chưa có replies)"""
+    return {
         "id": thread.id,
         "project_id": thread.project_id,
         "user_id": thread.user_id,
@@ -147,9 +152,15 @@ def _enrich_thread(thread: Thread, db: Session) -> dict:
             "username": thread.user.username,
             "email": thread.user.email,
             "full_name": thread.user.full_name,
-            "avatar_url": thread.user.avatar_url
+            "avatar_url": thread.user.avatar_url,
+            "avatar_variants": avatar_variants(thread.user.avatar_url)
         }
     }
+
+
+def _enrich_thread(thread: Thread, db: Session) -> dict:
+    """Enrich thread với thông tin user và replies"""
+    thread_dict = _thread_to_dict(thread)
     
     # Lấy replies (chỉ top-level messages có replies)
     if thread.parent_id is None:
@@ -165,30 +176,61 @@ def _enrich_thread(thread: Thread, db: Session) -> dict:
 
 
 @router.get("/", response_model=List[dict])
-def get_threads(
+async def get_threads(
     project_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    sideload_users: bool = False,
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: User = Depends(get_current_user_async),
 ):
-    """Lấy danh sách threads của một project"""
-    project = db.query(Project).filter(Project.id == project_id).first()
+    """Lấy danh sách threads của một project (async).
+    sideload_users=true: message chỉ giữ user_id, user nằm trong map users ở top-level"""
+    project = await db.get(Project, project_id)
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     
     _ensure_project_access(project, current_user)
     
     # Lấy tất cả top-level messages (không có parent_id)
-    threads = db.query(Thread).filter(
-        Thread.project_id == project_id,
-        Thread.parent_id == None,
-        Thread.is_deleted == False
-    ).order_by(Thread.created_at.asc()).all()
+    result = await db.execute(
+        select(Thread)
+        .options(selectinload(Thread.user))
+        .where(
+            Thread.project_id == project_id,
+            Thread.parent_id == None,
+            Thread.is_deleted == False
+        )
+        .order_by(Thread.created_at.asc())
+    )
+    threads = result.scalars().all()
+
+    # Lấy replies của tất cả threads trong một query (thay vì mỗi thread một query)
+    replies_by_parent = {}
+    if threads:
+        result = await db.execute(
+            select(Thread)
+            .options(selectinload(Thread.user))
+            .where(
+                Thread.project_id == project_id,
+                Thread.parent_id.in_([thread.id for thread in threads]),
+                Thread.is_deleted == False
+            )
+            .order_by(Thread.created_at.asc())
+        )
+        for reply in result.scalars().all():
+            replies_by_parent.setdefault(reply.parent_id, []).append(reply)
     
     # Enrich với user info và replies
     result = []
     for thread in threads:
-        result.append(_enrich_thread(thread, db))
+        thread_dict = _thread_to_dict(thread)
+        thread_dict["replies"] = [
+            {**_thread_to_dict(reply), "replies": []}
+            for reply in replies_by_parent.get(thread.id, [])
+        ]
+        result.append(thread_dict)
     
+    if sideload_users:
+        return sideload_response(result)
     return result
 
 
@@ -199,7 +241,7 @@ def create_thread(
     current_user: User = Depends(get_current_user),
 ):
     """Tạo thread mới"""
-    project = db.query(Project).filter(Project.id == thread.project_id).first()
+    project = get_project_by_id(db, thread.project_id)
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     
@@ -334,7 +376,7 @@ def delete_thread(
     """Xóa thread (soft delete) - người gửi hoặc project owner"""
     db_thread = _get_thread_or_404(db, thread_id)
     
-    project = db.query(Project).filter(Project.id == db_thread.project_id).first()
+    project = get_project_by_id(db, db_thread.project_id)
     is_owner = project and project.owner_id == current_user.id
     is_author = db_thread.user_id == current_user.id
     
@@ -0,0 +1,274 @@
+"""
+Danh sách token bị thu hồi (logout), lưu ở bảng revoked_tokens
+Mỗi worker giữ một Bloom filter + tập exact trong bộ nhớ để kiểm tra token
+trên mỗi request mà không phải query DB; chỉ khi Bloom filter báo "có thể đã
+thu hồi" mà không chắc chắn thì mới query DB.
+Kiểm tra/refresh trên request chỉ đọc DB; dòng đã hết hạn được xóa bởi job nền
+(start_revoked_token_purge_job).
+"""
+import hashlib
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import RevokedToken
+
+REVOCATION_BLOOM_CAPACITY = int(os.getenv("REVOCATION_BLOOM_CAPACITY", "100000"))
+REVOCATION_BLOOM_ERROR_RATE = float(os.getenv("REVOCATION_BLOOM_ERROR_RATE", "0.001"))
+REVOCATION_EXACT_SET_SIZE = int(os.getenv("REVOCATION_EXACT_SET_SIZE", "10000"))
+# Các worker khác thấy token vừa bị thu hồi sau tối đa khoảng thời gian này
+REVOCATION_SYNC_SECONDS = int(os.getenv("REVOCATION_SYNC_SECONDS", "30"))
+# Định kỳ build lại filter từ DB để bỏ các token đã hết hạn
+REVOCATION_REBUILD_SECONDS = int(os.getenv("REVOCATION_REBUILD_SECONDS", "3600"))
+# Job nền xóa dòng revoked_tokens đã hết hạn (0 = tắt)
+REVOCATION_PURGE_INTERVAL_SECONDS = int(os.getenv("REVOCATION_PURGE_INTERVAL_SECONDS", "3600"))
+
+
+def hash_token(token: str) -> str:
+    """Khóa thu hồi của token: sha256 của chuỗi JWT (dùng được cho cả token cũ)"""
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+class BloomFilter:
+    """Bloom filter đơn giản trên bytearray, dùng double hashing từ một digest blake2b"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        capacity = max(capacity, 1)
+        self.capacity = capacity
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, key: str):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class _BoundedSet:
+    """Set giới hạn kích thước, bỏ phần tử cũ nhất khi đầy"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._items: "OrderedDict[str, None]" = OrderedDict()
+
+    def add(self, key: str):
+        self._items[key] = None
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def discard(self, key: str):
+        self._items.pop(key, None)
+
+    def clear(self):
+        self._items.clear()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+
+class TokenRevocationList:
+    """Lock chỉ bảo vệ cấu trúc trong bộ nhớ, không bao giờ giữ lock khi query DB
+    (hàm này cũng được gọi qua AsyncSession.run_sync trên event loop)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._filter = BloomFilter(REVOCATION_BLOOM_CAPACITY, REVOCATION_BLOOM_ERROR_RATE)
+        self._revoked = _BoundedSet(REVOCATION_EXACT_SET_SIZE)
+        # Các token đã query DB và xác nhận là false positive của Bloom filter
+        self._not_revoked = _BoundedSet(REVOCATION_EXACT_SET_SIZE)
+        self._last_seen_id = 0
+        self._last_sync = 0.0
+        self._last_rebuild = 0.0
+        self._refreshing = False
+        # Token thu hồi trong lúc đang rebuild, cần thêm lại vào filter mới
+        self._revoked_during_refresh = []
+        self.db_lookups = 0
+
+    def _add_local(self, token_hash: str):
+        self._filter.add(token_hash)
+        self._revoked.add(token_hash)
+        self._not_revoked.discard(token_hash)
+        if self._refreshing:
+            self._revoked_during_refresh.append(token_hash)
+
+    def _rebuild(self, db: Session):
+        """Build lại filter từ các token chưa hết hạn (chỉ đọc: session có thể là của request/replica)"""
+        now = datetime.utcnow()
+        rows = (
+            db.query(RevokedToken.id, RevokedToken.token_hash)
+            .filter(or_(RevokedToken.expires_at.is_(None), RevokedToken.expires_at >= now))
+            .order_by(RevokedToken.id)
+            .all()
+        )
+        new_filter = BloomFilter(max(REVOCATION_BLOOM_CAPACITY, len(rows) * 2), REVOCATION_BLOOM_ERROR_RATE)
+        new_revoked = _BoundedSet(REVOCATION_EXACT_SET_SIZE)
+        last_seen_id = 0
+        for row_id, token_hash in rows:
+            new_filter.add(token_hash)
+            new_revoked.add(token_hash)
+            last_seen_id = row_id
+
+        with self._lock:
+            for token_hash in self._revoked_during_refresh:
+                new_filter.add(token_hash)
+                new_revoked.add(token_hash)
+            self._filter = new_filter
+            self._revoked = new_revoked
+            self._not_revoked.clear()
+            self._last_seen_id = max(self._last_seen_id, last_seen_id)
+            self._last_rebuild = time.monotonic()
+
+    def _sync(self, db: Session, last_seen_id: int):
+        """Nạp các token bị thu hồi bởi worker khác kể từ lần sync trước"""
+        rows = (
+            db.query(RevokedToken.id, RevokedToken.token_hash)
+            .filter(RevokedToken.id > last_seen_id)
+            .order_by(RevokedToken.id)
+            .all()
+        )
+        with self._lock:
+            for row_id, token_hash in rows:
+                self._add_local(token_hash)
+                self._last_seen_id = max(self._last_seen_id, row_id)
+            overfull = self._filter.count > self._filter.capacity
+        if overfull:
+            # Filter đã đầy quá thiết kế, tỉ lệ false positive tăng -> build lại lớn hơn
+            self._rebuild(db)
+
+    def _maybe_refresh(self, db: Session):
+        now = time.monotonic()
+        with self._lock:
+            if self._refreshing:
+                return
+            need_rebuild = now - self._last_rebuild >= REVOCATION_REBUILD_SECONDS
+            need_sync = now - self._last_sync >= REVOCATION_SYNC_SECONDS
+            if not (need_rebuild or need_sync):
+                return
+            self._refreshing = True
+            self._revoked_during_refresh = []
+            last_seen_id = self._last_seen_id
+        try:
+            if need_rebuild:
+                self._rebuild(db)
+            else:
+                self._sync(db, last_seen_id)
+        except Exception as e:
+            # Không để lỗi refresh (VD chưa chạy migration) chặn mọi request; thử lại ở lần sync sau
+            db.rollback()
+            print(f"ERROR: Refreshing token revocation list failed: {e}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+                self._revoked_during_refresh = []
+                self._last_sync = now
+
+    def is_revoked(self, db: Session, token_hash: str) -> bool:
+        self._maybe_refresh(db)
+        with self._lock:
+            if token_hash not in self._filter:
+                return False
+            if token_hash in self._revoked:
+                return True
+            if token_hash in self._not_revoked:
+                return False
+            self.db_lookups += 1
+
+        # Bloom filter hit nhưng không chắc chắn: kiểm tra DB
+        revoked = db.query(RevokedToken.id).filter(RevokedToken.token_hash == token_hash).first() is not None
+        with self._lock:
+            if revoked:
+                self._revoked.add(token_hash)
+            else:
+                self._not_revoked.add(token_hash)
+        return revoked
+
+    def revoke(self, db: Session, token_hash: str, user_id: int, expires_at: Optional[datetime]):
+        """Thu hồi một token (caller commit)"""
+        exists = db.query(RevokedToken.id).filter(RevokedToken.token_hash == token_hash).first()
+        if not exists:
+            db.add(RevokedToken(token_hash=token_hash, user_id=user_id, expires_at=expires_at))
+        with self._lock:
+            self._add_local(token_hash)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "bloom_bits": self._filter.num_bits,
+                "bloom_hashes": self._filter.num_hashes,
+                "bloom_items": self._filter.count,
+                "exact_set_size": len(self._revoked),
+                "db_lookups": self.db_lookups,
+            }
+
+
+token_revocation_list = TokenRevocationList()
+
+
+def purge_expired_revoked_tokens(db: Session) -> int:
+    """Xóa các dòng revoked_tokens đã hết hạn (token đó tự bị từ chối vì exp); trả về số dòng đã xóa"""
+    deleted = db.query(RevokedToken).filter(
+        RevokedToken.expires_at < datetime.utcnow()
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+
+_purge_stop_event = threading.Event()
+_purge_thread: Optional[threading.Thread] = None
+
+
+def _purge_loop():
+    while not _purge_stop_event.is_set():
+        db = SessionLocal()
+        try:
+            deleted = purge_expired_revoked_tokens(db)
+            if deleted:
+                print(f"Token revocation: purged {deleted} expired revoked tokens")
+        except Exception as e:
+            db.rollback()
+            print(f"ERROR: Revoked token purge job failed: {e}")
+        finally:
+            db.close()
+        _purge_stop_event.wait(REVOCATION_PURGE_INTERVAL_SECONDS)
+
+
+def start_revoked_token_purge_job():
+    """Chạy job xóa token thu hồi đã hết hạn trong background thread (gọi khi app startup)"""
+    global _purge_thread
+    if REVOCATION_PURGE_INTERVAL_SECONDS <= 0:
+        return
+    if _purge_thread and _purge_thread.is_alive():
+        return
+    _purge_stop_event.clear()
+    _purge_thread = threading.Thread(target=_purge_loop, name="revoked-token-purge", daemon=True)
+    _purge_thread.start()
+
+
+def stop_revoked_token_purge_job():
+    """Dừng job (gọi khi app shutdown)"""
+    _purge_stop_event.set()
@@ -0,0 +1,105 @@
+"""
+Upload service dùng chung cho attachment (comment, subtask, work log) và avatar
+- Đọc file theo chunk và ghi bằng aiofiles: không load cả file vào RAM, không chặn event loop
+- Giới hạn dung lượng theo loại upload, kiểm tra ngay trong lúc stream (vượt quá thì dừng và trả 413)
+- Tính SHA-256 song song với lúc ghi (dùng cho dedup / kiểm tra toàn vẹn)
+- Ghi vào file tạm rồi mới đưa vào storage (routers/storage.py): không bao giờ để lại file ghi dở ở URL public
+"""
+import hashlib
+import os
+import tempfile
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Tuple
+
+import aiofiles
+import aiofiles.os
+from fastapi import HTTPException, UploadFile
+
+from routers.storage import storage
+
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+
+_MB = 1024 * 1024
+# Dung lượng tối đa (MB) theo loại upload
+UPLOAD_LIMITS = {
+    "avatar": int(os.getenv("UPLOAD_MAX_AVATAR_MB", "5")) * _MB,
+    "comment": int(os.getenv("UPLOAD_MAX_COMMENT_MB", "25")) * _MB,
+    "subtask": int(os.getenv("UPLOAD_MAX_SUBTASK_MB", "50")) * _MB,
+    "worklog": int(os.getenv("UPLOAD_MAX_WORKLOG_MB", "200")) * _MB,
+}
+# Số file tối đa trong một request upload batch
+UPLOAD_MAX_BATCH_FILES = int(os.getenv("UPLOAD_MAX_BATCH_FILES", "20"))
+
+
+@dataclass(frozen=True)
+class StoredUpload:
+    """File đã ghi xong: key trong storage, URL public và metadata"""
+    key: str
+    url: str
+    size: int
+    sha256: str
+    original_name: str
+    content_type: Optional[str]
+
+
+def _too_large(limit: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"File too large (max {limit // _MB} MB)")
+
+
+async def stream_to_temp(file: UploadFile, kind: str, directory: Path) -> Tuple[Path, int, str]:
+    """Stream file upload vào file tạm trong directory; trả về (đường dẫn tạm, size, sha256)"""
+    limit = UPLOAD_LIMITS[kind]
+    # Starlette đã biết size khi body multipart được spool xong: từ chối sớm không cần đọc
+    if file.size is not None and file.size > limit:
+        raise _too_large(limit)
+
+    await aiofiles.os.makedirs(directory, exist_ok=True)
+    tmp_path = directory / f".upload-{uuid.uuid4().hex}.tmp"
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(tmp_path, "wb") as buffer:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > limit:
+                    raise _too_large(limit)
+                digest.update(chunk)
+                await buffer.write(chunk)
+    except BaseException:
+        # Lỗi, vượt giới hạn hoặc client hủy request: xóa file tạm
+        await discard_temp(tmp_path)
+        raise
+    finally:
+        await file.close()
+    return tmp_path, size, digest.hexdigest()
+
+
+async def discard_temp(tmp_path: Path):
+    if await aiofiles.os.path.exists(tmp_path):
+        await aiofiles.os.remove(tmp_path)
+
+
+async def save_upload(file: UploadFile, kind: str, subdir: str, filename: str) -> StoredUpload:
+    """Stream file upload vào storage với key subdir/filename (subdir rỗng = thư mục gốc uploads)"""
+    key = f"{subdir}/{filename}" if subdir else filename
+    staging_dir = storage.staging_dir(key) or Path(tempfile.gettempdir())
+    tmp_path, size, sha256 = await stream_to_temp(file, kind, staging_dir)
+    try:
+        await storage.put_file_async(tmp_path, key, file.content_type)
+    except BaseException:
+        await discard_temp(tmp_path)
+        raise
+
+    return StoredUpload(
+        key=key,
+        url=storage.url(key),
+        size=size,
+        sha256=sha256,
+        original_name=file.filename or filename,
+        content_type=file.content_type,
+    )
@@ -1,30 +1,48 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Request, Response
 from sqlalchemy.orm import Session
-from typing import List
+from jose import jwt
+from datetime import datetime
+from typing import List, Optional
 import os
 import uuid
-from pathlib import Path
 
-from database import get_db
+from database import get_db, get_read_db
 from models import User
 from schemas import UserResponse, UserUpdate, UserMeUpdate, ChangePasswordRequest
-from routers.auth import get_current_user, require_admin, verify_password, get_password_hash
+from routers.fields import parse_fields, select_columns, sparse_response
+from routers.password_hashing import verify_password, get_password_hash
+from routers.avatars import delete_avatar_files, schedule_thumbnails
+from routers.uploads import save_upload
+from routers.versioning import USERS, check_etag, resource_etag, with_etag
+from routers.auth import (
+    get_current_user,
+    require_admin,
+    create_user_token,
+    invalidate_user_cache,
+    oauth2_scheme,
+)
 
 
 router = APIRouter()
 
-UPLOAD_DIR = Path("static/uploads/avatars")
-UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
-
 
 @router.get("/", response_model=List[UserResponse])
 def list_users(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
+    fields: Optional[str] = None,
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_user),
 ):
-    """Lấy danh sách users để phân công/hiển thị."""
+    """Lấy danh sách users để phân công/hiển thị (304 nếu không có user nào thay đổi, ?fields= để chỉ lấy một số cột)."""
+    requested = parse_fields(fields, UserResponse)
+    not_modified = check_etag(request, response, resource_etag(request, db, current_user.id, USERS))
+    if not_modified:
+        return not_modified
+    if requested is not None:
+        return with_etag(response, sparse_response(db.execute(select_columns(User, requested).offset(skip).limit(limit)).mappings()))
     users = db.query(User).offset(skip).limit(limit).all()
     return users
 
@@ -36,7 +54,7 @@ def update_me(
     current_user: User = Depends(get_current_user),
 ):
     """Người dùng tự cập nhật thông tin cá nhân"""
-    db_user = db.query(User).filter(User.id == current_user.id).first()
+    db_user = db.get(User, current_user.id)
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -60,17 +78,23 @@ def update_me(
 
     db.commit()
     db.refresh(db_user)
+    invalidate_user_cache(db_user.id)
     return db_user
 
 
 @router.post("/me/change-password")
 def change_password(
     password_data: ChangePasswordRequest,
+    token: str = Depends(oauth2_scheme),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    """Đổi mật khẩu cho user hiện tại"""
-    db_user = db.query(User).filter(User.id == current_user.id).first()
+    """Đổi mật khẩu cho user hiện tại
+
+    Token version được tăng nên mọi token cũ mất hiệu lực; trả về token mới
+    (cùng thời hạn với token hiện tại) để phiên đang dùng không bị logout.
+    """
+    db_user = db.get(User, current_user.id)
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -88,15 +112,25 @@ def change_password(
     
     # Cập nhật mật khẩu mới
     db_user.hashed_password = get_password_hash(password_data.new_password)
+    db_user.token_version = (db_user.token_version or 0) + 1
     db.commit()
+    invalidate_user_cache(db_user.id)
+
+    # Token hiện tại đã được xác thực ở get_current_user, chỉ cần đọc lại thời hạn
+    expires_at = datetime.utcfromtimestamp(jwt.get_unverified_claims(token)["exp"])
+    access_token = create_user_token(db_user, expires_delta=expires_at - datetime.utcnow())
     
-    return {"message": "Password changed successfully"}
+    return {
+        "message": "Password changed successfully",
+        "access_token": access_token,
+        "token_type": "bearer",
+    }
 
 
 @router.get("/{user_id}", response_model=UserResponse)
 def get_user(
     user_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_user),
 ):
     """Lấy thông tin chi tiết một user."""
@@ -137,6 +171,7 @@ def update_user(
     
     db.commit()
     db.refresh(db_user)
+    invalidate_user_cache(db_user.id)
     return db_user
 
 
@@ -161,22 +196,20 @@ async def upload_user_avatar(
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    # Xóa avatar cũ nếu có
-    if db_user.avatar_url:
-        old_path = Path("static") / db_user.avatar_url.replace("/static/", "")
-        if old_path.exists():
-            old_path.unlink()
-    
-    # Lưu file mới
+    # Lưu file mới trước (file quá lớn thì avatar cũ vẫn giữ nguyên)
     extension = os.path.splitext(filename)[1] or ".png"
     new_filename = f"user_{user_id}_{uuid.uuid4().hex}{extension}"
-    destination = UPLOAD_DIR / new_filename
+    stored = await save_upload(file, "avatar", "avatars", new_filename)
+    
+    # Thumbnail 32/64/128 tạo trong pool nền, request trả về ngay
+    schedule_thumbnails(stored.key)
     
-    with destination.open("wb") as buffer:
-        buffer.write(await file.read())
+    # Xóa avatar cũ (kèm thumbnail) nếu có
+    delete_avatar_files(db_user.avatar_url)
     
-    db_user.avatar_url = f"/static/uploads/avatars/{new_filename}"
+    db_user.avatar_url = stored.url
     db.commit()
     db.refresh(db_user)
+    invalidate_user_cache(db_user.id)
     return db_user
 
@@ -0,0 +1,131 @@
+"""
+Version counter cho ETag / 304 Not Modified
+- projects.version: tăng khi task, subtask, assignee, thread, comment hoặc activity của project thay đổi
+- resource_versions: bộ đếm toàn cục cho danh sách projects, users, project_types
+Counter được tăng trong cùng transaction với thay đổi (after_flush), nên ETag không bao giờ
+mới hơn dữ liệu. Client gửi If-None-Match, nếu counter chưa đổi chỉ tốn một query nhỏ và trả 304.
+"""
+import hashlib
+from typing import Optional
+
+from fastapi import Request, Response
+from sqlalchemy import event, insert, inspect as sa_inspect, select, update
+
+from database import SessionLocal
+from schema_registry import schema_capabilities
+from models import ActivityLog, Project, ProjectType, ResourceVersion, SubTask, Task, TaskAssignee, TaskComment, Thread, User
+
+PROJECTS = "projects"
+USERS = "users"
+PROJECT_TYPES = "project_types"
+
+# Model có project_id trực tiếp / model chỉ có task_id (lấy project qua task)
+_PROJECT_SCOPED = (Task, Thread, ActivityLog)
+_TASK_SCOPED = (SubTask, TaskComment, TaskAssignee)
+_GLOBAL_COUNTERS = {Project: PROJECTS, User: USERS, ProjectType: PROJECT_TYPES}
+
+
+def _changed_objects(session):
+    yield from session.new
+    # dirty gồm cả object chỉ bị gán lại cùng giá trị, bỏ qua các object đó
+    yield from (obj for obj in session.dirty if session.is_modified(obj))
+    yield from session.deleted
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _bump_versions(session, flush_context):
+    project_ids = set()
+    task_ids = set()
+    counters = set()
+    for obj in _changed_objects(session):
+        # Đọc từ state đã load để không phát sinh lazy load trong lúc flush
+        state = sa_inspect(obj).dict
+        if isinstance(obj, _PROJECT_SCOPED):
+            project_ids.add(state.get("project_id"))
+            # Task đổi project: project cũ cũng phải đổi version
+            if isinstance(obj, Task):
+                history = sa_inspect(obj).attrs.project_id.history
+                project_ids.update(history.deleted or ())
+        elif isinstance(obj, _TASK_SCOPED):
+            task_ids.add(state.get("task_id"))
+        elif type(obj) in _GLOBAL_COUNTERS:
+            counters.add(_GLOBAL_COUNTERS[type(obj)])
+            if isinstance(obj, Project) and obj not in session.new:
+                # Task list hiển thị tên project
+                project_ids.add(state.get("id"))
+
+    connection = session.connection()
+    task_ids.discard(None)
+    if task_ids:
+        project_ids.update(connection.execute(select(Task.project_id).where(Task.id.in_(task_ids))).scalars())
+    project_ids.discard(None)
+    if project_ids:
+        # Giữ nguyên updated_at (onupdate=now()): project không đổi, danh sách /api/projects/ cũng không
+        connection.execute(
+            update(Project)
+            .where(Project.id.in_(project_ids))
+            .values(version=Project.version + 1, updated_at=Project.updated_at)
+        )
+    if counters and schema_capabilities.has_table("resource_versions"):
+        for name in counters:
+            bump_resource_version(connection, name)
+
+
+def bump_resource_version(connection, name: str):
+    result = connection.execute(
+        update(ResourceVersion).where(ResourceVersion.name == name).values(version=ResourceVersion.version + 1)
+    )
+    if result.rowcount == 0:
+        # DB tạo bằng init_db chưa có dòng counter (migration có seed sẵn)
+        connection.execute(insert(ResourceVersion).values(name=name, version=1))
+
+
+def resource_version_statement(name: str):
+    return select(ResourceVersion.version).where(ResourceVersion.name == name)
+
+
+def project_version_statement(project_id: int):
+    """Version của project kèm counter users (task list có thông tin assignee)"""
+    return select(
+        Project.version,
+        resource_version_statement(USERS).scalar_subquery(),
+    ).where(Project.id == project_id)
+
+
+def versioning_available() -> bool:
+    """Chưa chạy migrate_resource_versions.sql thì không dùng ETag (tránh ETag không bao giờ đổi)"""
+    return schema_capabilities.has_table("resource_versions") and schema_capabilities.has_column("projects", "version")
+
+
+def resource_etag(request: Request, db, user_id: int, name: str) -> Optional[str]:
+    """ETag cho danh sách dùng counter toàn cục (Session sync)"""
+    if not versioning_available():
+        return None
+    return make_etag(request, user_id, name, db.scalar(resource_version_statement(name)))
+
+
+def make_etag(request: Request, user_id: int, *parts) -> str:
+    """Weak ETag theo counter, user (response lọc theo quyền) và query string (filter, phân trang)"""
+    raw = "|".join(str(part) for part in (*parts, user_id, request.url.query))
+    return 'W/"' + hashlib.sha1(raw.encode("utf-8")).hexdigest()[:20] + '"'
+
+
+def check_etag(request: Request, response: Response, etag: Optional[str]) -> Optional[Response]:
+    """Trả 304 nếu client đã có bản mới nhất, ngược lại gắn ETag vào response sẽ trả về"""
+    if etag is None:
+        return None
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [value.strip() for value in if_none_match.split(",")] or if_none_match.strip() == "*":
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
+
+
+def with_etag(response: Response, returned: Response) -> Response:
+    """Chép ETag/Cache-Control đã gắn bởi check_etag sang response được trả trực tiếp
+    (sparse_response, sideload_response), nếu không các shape đó không bao giờ nhận được 304"""
+    for header in ("ETag", "Cache-Control"):
+        if header in response.headers:
+            returned.headers[header] = response.headers[header]
+    return returned
@@ -1,7 +1,4 @@
 from typing import List, Optional
-import os
-import uuid
-from pathlib import Path
 
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
 from sqlalchemy.orm import Session
@@ -10,13 +7,14 @@ from database import get_db
 from models import WorkLog, UserRole, SubTask, Task, TaskAssignee
 from schemas import WorkLogCreate, WorkLogUpdate, WorkLogResponse
 from routers.auth import get_current_user
+from routers.fields import column_entities, load_only_columns, parse_fields, sparse_response, sparse_row
+from routers.attachment_store import (
+    OWNER_WORKLOG, load_attachment_entries, remove_reference, store_attachment, store_attachments,
+)
 from sqlalchemy.orm import joinedload
 
 router = APIRouter()
 
-WORKLOG_UPLOAD_DIR = Path("static/uploads/worklogs")
-WORKLOG_UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
-
 
 def _get_worklog_or_404(db: Session, worklog_id: int) -> WorkLog:
     worklog = db.query(WorkLog).filter(WorkLog.id == worklog_id).first()
@@ -25,6 +23,14 @@ def _get_worklog_or_404(db: Session, worklog_id: int) -> WorkLog:
     return worklog
 
 
+def load_worklog_attachments(db: Session, worklogs: List[WorkLog]) -> List[WorkLog]:
+    """Gán attachment_list = file cũ trong cột JSON + file trong attachment_refs (một query cho cả list)"""
+    entries = load_attachment_entries(db, OWNER_WORKLOG, [worklog.id for worklog in worklogs])
+    for worklog in worklogs:
+        worklog.attachment_list = (worklog.attachments or []) + entries.get(worklog.id, [])
+    return worklogs
+
+
 def _ensure_worklog_permission(worklog: WorkLog, current_user):
     if worklog.owner_id != current_user.id and current_user.role != UserRole.ADMIN.value:
         raise HTTPException(status_code=403, detail="Permission denied for this work log")
@@ -69,9 +75,11 @@ def _sync_worklog_subtask(db: Session, worklog: WorkLog, new_subtask_id: Optiona
 def list_worklogs(
     project_id: Optional[int] = None,
     task_id: Optional[int] = None,
+    fields: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user=Depends(get_current_user),
 ):
+    requested = parse_fields(fields, WorkLogResponse)
     query = db.query(WorkLog)
     if current_user.role != UserRole.ADMIN.value:
         query = query.filter(WorkLog.owner_id == current_user.id)
@@ -79,7 +87,16 @@ def list_worklogs(
         query = query.filter(WorkLog.project_id == project_id)
     if task_id:
         query = query.filter(WorkLog.task_id == task_id)
-    return query.order_by(WorkLog.updated_at.desc().nullslast(), WorkLog.created_at.desc()).all()
+    query = query.order_by(WorkLog.updated_at.desc().nullslast(), WorkLog.created_at.desc())
+    if requested is not None and "attachments" in requested:
+        worklogs = load_worklog_attachments(db, query.options(load_only_columns(WorkLog, requested, "id")).all())
+        return sparse_response(
+            sparse_row(worklog, requested, {"attachments": worklog.attachment_list}) for worklog in worklogs
+        )
+    if requested is not None:
+        # Chỉ SELECT các cột được yêu cầu (bỏ content/attachments khi không cần)
+        return sparse_response(row._mapping for row in query.with_entities(*column_entities(WorkLog, requested)))
+    return load_worklog_attachments(db, query.all())
 
 
 @router.post("/", response_model=WorkLogResponse)
@@ -119,7 +136,7 @@ def update_worklog(
     _sync_worklog_subtask(db, worklog, subtask_id, current_user)
     db.commit()
     db.refresh(worklog)
-    return worklog
+    return load_worklog_attachments(db, [worklog])[0]
 
 
 @router.delete("/{worklog_id}")
@@ -146,23 +163,43 @@ async def upload_worklog_attachment(
     worklog = _get_worklog_or_404(db, worklog_id)
     _ensure_worklog_permission(worklog, current_user)
 
-    extension = os.path.splitext(file.filename)[1] or ".dat"
-    filename = f"worklog_{worklog_id}_{uuid.uuid4().hex}{extension}"
-    destination = WORKLOG_UPLOAD_DIR / filename
-
-    with destination.open("wb") as buffer:
-        buffer.write(await file.read())
-
-    attachment_entry = {
-        "name": file.filename,
-        "url": f"/static/uploads/worklogs/{filename}",
-        "size": destination.stat().st_size,
-        "type": file.content_type,
-    }
-    attachments = worklog.attachments or []
-    attachments.append(attachment_entry)
-    worklog.attachments = attachments
+    # Thêm một dòng attachment_refs, không ghi lại cột JSON attachments
+    await store_attachment(db, file, "worklog", OWNER_WORKLOG, worklog_id)
     db.commit()
     db.refresh(worklog)
-    return worklog
+    return load_worklog_attachments(db, [worklog])[0]
+
+
+@router.post("/{worklog_id}/attachments/batch", response_model=WorkLogResponse)
+async def upload_worklog_attachments(
+    worklog_id: int,
+    files: List[UploadFile] = File(...),
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    """Upload nhiều file trong một request: stream song song, một transaction cho cả batch"""
+    worklog = _get_worklog_or_404(db, worklog_id)
+    _ensure_worklog_permission(worklog, current_user)
+
+    await store_attachments(db, files, "worklog", OWNER_WORKLOG, worklog_id)
+    db.commit()
+    db.refresh(worklog)
+    return load_worklog_attachments(db, [worklog])[0]
+
+
+@router.delete("/{worklog_id}/attachments/{ref_id}", response_model=WorkLogResponse)
+def delete_worklog_attachment(
+    worklog_id: int,
+    ref_id: int,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    """Gỡ file khỏi work log (blob bị GC xóa khi không còn nơi nào dùng)"""
+    worklog = _get_worklog_or_404(db, worklog_id)
+    _ensure_worklog_permission(worklog, current_user)
+    if not remove_reference(db, OWNER_WORKLOG, worklog_id, ref_id):
+        raise HTTPException(status_code=404, detail="Attachment not found")
+    db.commit()
+    db.refresh(worklog)
+    return load_worklog_attachments(db, [worklog])[0]
 
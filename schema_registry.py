@@ -0,0 +1,51 @@
+"""
+Registry các khả năng của schema DB hiện tại (bảng/cột nào đã có sau migration)
+Detect một lần lúc startup (hoặc lần đầu được hỏi) rồi cache, router chỉ đọc
+thay vì reflect schema trên mỗi request.
+"""
+import threading
+
+from sqlalchemy import inspect
+
+from database import engine
+
+
+class SchemaCapabilities:
+    def __init__(self, bind):
+        self._bind = bind
+        self._lock = threading.Lock()
+        self._columns = None  # tên bảng -> set tên cột
+
+    def _reflect(self) -> dict:
+        inspector = inspect(self._bind)
+        return {
+            table_name: {column["name"] for column in inspector.get_columns(table_name)}
+            for table_name in inspector.get_table_names()
+        }
+
+    def detect(self):
+        """Reflect schema và thay cache hiện tại (gọi lại sau khi chạy migration)"""
+        columns = self._reflect()
+        with self._lock:
+            self._columns = columns
+        return self
+
+    def _get_columns(self) -> dict:
+        if self._columns is None:
+            # Script/worker không chạy startup event: detect lazy đúng một lần
+            with self._lock:
+                if self._columns is None:
+                    self._columns = self._reflect()
+        return self._columns
+
+    def has_table(self, table_name: str) -> bool:
+        return table_name in self._get_columns()
+
+    def has_column(self, table_name: str, column_name: str) -> bool:
+        return column_name in self._get_columns().get(table_name, ())
+
+    def summary(self) -> dict:
+        return {table_name: sorted(columns) for table_name, columns in sorted(self._get_columns().items())}
+
+
+schema_capabilities = SchemaCapabilities(engine)
@@ -1,7 +1,8 @@
-from pydantic import BaseModel, EmailStr, field_serializer, model_validator
-from typing import Optional, List
+from pydantic import AliasChoices, BaseModel, EmailStr, Field, computed_field, field_serializer, model_validator
+from typing import Dict, Optional, List
 from datetime import datetime
 from models import ProjectStatus, TaskStatus, TaskPriority, UserRole
+from routers.avatars import avatar_variants
 
 # User Schemas
 class UserBase(BaseModel):
@@ -41,6 +42,12 @@ class UserResponse(UserBase):
     role: Optional[str] = None
     is_active: bool
     created_at: datetime
+
+    @computed_field
+    @property
+    def avatar_variants(self) -> Optional[Dict[str, str]]:
+        """URL thumbnail avatar theo kích thước ("32", "64", "128")"""
+        return avatar_variants(self.avatar_url)
     
     class Config:
         from_attributes = True
@@ -128,6 +135,8 @@ class SubTaskResponse(SubTaskBase):
     created_at: datetime
     updated_at: Optional[datetime] = None
     work_log_id: Optional[int] = None
+    # Router gán attachment_list = các file trong bảng attachment_refs (attachment_url là file chính)
+    attachments: Optional[List[dict]] = Field(default=None, validation_alias="attachment_list")
 
     class Config:
         from_attributes = True
@@ -159,6 +168,8 @@ class WorkLogResponse(WorkLogBase):
     owner_id: int
     created_at: datetime
     updated_at: Optional[datetime] = None
+    # Router gán attachment_list = file cũ trong cột JSON + file trong bảng attachment_refs
+    attachments: Optional[List[dict]] = Field(default=None, validation_alias=AliasChoices("attachment_list", "attachments"))
 
     class Config:
         from_attributes = True
@@ -422,3 +433,6 @@ class NotificationResponse(NotificationBase):
     class Config:
         from_attributes = True
 
+
+class NotificationBulkRequest(BaseModel):
+    ids: List[int]
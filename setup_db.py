@@ -0,0 +1,20 @@
+"""
+Bước setup schema chạy một lần lúc deploy (thay cho việc mỗi worker tự create_all khi import)
+Chạy: python setup_db.py
+Sau đó có thể đặt DB_CREATE_SCHEMA_ON_STARTUP=false để worker khởi động nhanh hơn.
+"""
+from database import init_db
+from schema_registry import schema_capabilities
+
+
+def main():
+    init_db()
+    print("✓ Schema created/verified")
+    tables = schema_capabilities.detect().summary()
+    print(f"✓ {len(tables)} tables detected")
+    for table_name, columns in tables.items():
+        print(f"  - {table_name}: {len(columns)} columns")
+
+
+if __name__ == "__main__":
+    main()
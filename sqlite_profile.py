@@ -0,0 +1,53 @@
+"""
+Profile hiệu năng cho SQLite (cài đặt edge / single-node)
+- WAL: reader không chặn writer và ngược lại
+- Pool ghi (pool bình thường) + pool connection đọc (query_only)
+- Ghi được tuần tự hóa ở SQLite thay vì ở pool: connection ghi mở transaction bằng BEGIN IMMEDIATE
+  (lấy write lock ngay ở câu lệnh ghi đầu tiên, chờ tối đa busy_timeout), nên không có transaction
+  đọc nào phải "nâng cấp" lên ghi rồi lỗi "database is locked" giữa chừng
+- Không giới hạn pool ghi còn 1 connection: request cần connection thứ hai (listener mở session
+  riêng, nhiều handler async giữ session qua await) sẽ treo tới pool timeout
+"""
+import os
+
+from sqlalchemy import event
+
+SQLITE_PERFORMANCE_PROFILE = os.getenv("SQLITE_PERFORMANCE_PROFILE", "true").lower() in ("1", "true", "yes")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+SQLITE_READ_POOL_SIZE = int(os.getenv("SQLITE_READ_POOL_SIZE", "4"))
+
+
+def apply_sqlite_pragmas(dbapi_connection, read_only: bool = False):
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("PRAGMA journal_mode=WAL")
+        # NORMAL an toàn với WAL (không corrupt), chỉ có thể mất transaction cuối khi mất điện
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        # Giá trị âm = đơn vị KiB
+        cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+    finally:
+        cursor.close()
+    if not read_only:
+        # sqlite3/aiosqlite chỉ tự BEGIN trước câu lệnh ghi (SELECT chạy autocommit): BEGIN IMMEDIATE
+        # lấy write lock đúng lúc đó, các writer khác chờ theo busy_timeout
+        dbapi_connection.isolation_level = "IMMEDIATE"
+
+
+def enable_sqlite_profile(engine, read_only: bool = False):
+    """Áp pragma cho mọi connection mới của engine (với AsyncEngine thì truyền engine.sync_engine)"""
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        apply_sqlite_pragmas(dbapi_connection, read_only=read_only)
+
+
+def supports_sqlite_profile(url) -> bool:
+    """Profile chỉ áp dụng cho SQLite dạng file (DB in-memory không dùng chung được giữa các connection)"""
+    return url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:")
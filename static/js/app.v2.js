@@ -51,6 +51,7 @@ document.addEventListener('DOMContentLoaded', async () => {
     initEventListeners();
     updateTaskButtonState();
     await Promise.all([loadProjects(), loadDashboard(), loadUsers(), loadNotificationCount(), loadProjectTypes()]);
+    startNotificationStream();
 });
 
 async function initAuth() {
@@ -79,7 +80,7 @@ function updateUserBadge() {
     // Hiển thị avatar nếu có
     if (avatar) {
         if (currentUser.avatar_url) {
-            avatar.innerHTML = `<img src="${currentUser.avatar_url}" alt="Avatar" style="width: 100%; height: 100%; border-radius: 50%; object-fit: cover;">`;
+            avatar.innerHTML = `<img ${avatarImgAttrs(currentUser, 128)} alt="Avatar" style="width: 100%; height: 100%; border-radius: 50%; object-fit: cover;">`;
         } else {
             const initials = (currentUser.full_name || currentUser.username || 'U')
                 .split(' ')
@@ -101,7 +102,22 @@ function updateUserBadge() {
     });
 }
 
+async function logout() {
+    // Thu hồi token phía server; lỗi mạng không chặn việc đăng xuất ở client
+    try {
+        await fetch(`${API_BASE}/auth/logout`, {
+            method: 'POST',
+            headers: { 'Authorization': `Bearer ${authToken}` },
+            keepalive: true
+        });
+    } catch (error) {
+        console.error('Error revoking token:', error);
+    }
+    forceLogout();
+}
+
 function forceLogout() {
+    stopNotificationStream();
     localStorage.removeItem('pm_token');
     window.location.href = '/login';
 }
@@ -155,9 +171,7 @@ function initEventListeners() {
     document.getElementById('taskForm').addEventListener('submit', handleTaskSubmit);
     const logoutBtn = document.getElementById('logoutBtn');
     if (logoutBtn) {
-        logoutBtn.addEventListener('click', () => {
-            forceLogout();
-        });
+        logoutBtn.addEventListener('click', logout);
     }
     const addSubtaskBtn = document.getElementById('btnAddSubtask');
     if (addSubtaskBtn) {
@@ -541,6 +555,12 @@ async function handleChangePassword(event) {
         });
         
         if (response && response.message) {
+            // Token cũ đã bị vô hiệu sau khi đổi mật khẩu - dùng token mới server trả về
+            if (response.access_token) {
+                authToken = response.access_token;
+                localStorage.setItem('pm_token', authToken);
+                startNotificationStream();
+            }
             if (statusEl) {
                 statusEl.textContent = '✓ Đổi mật khẩu thành công!';
                 statusEl.style.color = 'var(--success-color)';
@@ -1038,12 +1058,23 @@ function renderWorkLogAttachments(worklog) {
     }
     container.innerHTML = attachments.map(file => `
         <div class="worklog-attachment-item">
-            <a href="${file.url}" target="_blank" rel="noopener">${escapeHtml(file.name || 'Tệp đính kèm')}</a>
+            <a href="${attachmentHref(file.download_url || file.url)}" target="_blank" rel="noopener">${escapeHtml(file.name || 'Tệp đính kèm')}</a>
             <span>${Math.round((file.size || 0) / 1024)} KB</span>
+            ${file.id ? `<button type="button" title="Gỡ file" onclick="removeWorkLogAttachment(${worklog.id}, ${file.id})">✕</button>` : ''}
         </div>
     `).join('');
 }
 
+async function removeWorkLogAttachment(workLogId, refId) {
+    if (!confirm('Gỡ file này khỏi work log?')) return;
+    const result = await apiCall(`/work-logs/${workLogId}/attachments/${refId}`, 'DELETE');
+    if (result) {
+        updateWorkLogState(result);
+        renderWorkLogAttachments(result);
+        renderWorkLogList();
+    }
+}
+
 function handleWorkLogTaskChange() {
     const taskSelect = document.getElementById('workLogTask');
     const taskId = taskSelect?.value ? Number(taskSelect.value) : null;
@@ -1112,17 +1143,16 @@ async function handleWorkLogAttachmentUpload(event) {
         event.target.value = '';
         return;
     }
-    for (const file of files) {
-        const formData = new FormData();
-        formData.append('file', file);
-        const result = await apiCall(`/work-logs/${currentWorkLogId}/attachments`, 'POST', formData);
-        if (result) {
-            updateWorkLogState(result);
-            if (result.id === currentWorkLogId) {
-                renderWorkLogAttachments(result);
-            }
-            renderWorkLogList();
+    // Một request cho cả batch: server stream song song và ghi DB trong một transaction
+    const formData = new FormData();
+    files.forEach(file => formData.append('files', file));
+    const result = await apiCall(`/work-logs/${currentWorkLogId}/attachments/batch`, 'POST', formData);
+    if (result) {
+        updateWorkLogState(result);
+        if (result.id === currentWorkLogId) {
+            renderWorkLogAttachments(result);
         }
+        renderWorkLogList();
     }
     event.target.value = '';
 }
@@ -1459,6 +1489,18 @@ async function apiCall(endpoint, method = 'GET', data = null) {
     }
 }
 
+// Response dạng sideload_users=true: gắn lại object user từ map users vào từng dòng
+// (các dòng cùng user dùng chung một object, payload không lặp lại thông tin user)
+function attachSideloadedUsers(data) {
+    if (!data) return null;
+    const attach = (row) => {
+        row.user = data.users[row.user_id] || null;
+        (row.replies || []).forEach(attach);
+        return row;
+    };
+    return data.items.map(attach);
+}
+
 // Projects
 async function loadProjects() {
     const data = await apiCall('/projects/');
@@ -1494,7 +1536,7 @@ function updateAssigneesList() {
             <label class="assignee-checkbox">
                 <input type="checkbox" value="${userId}" class="assignee-checkbox-input" data-user-id="${userId}">
                 <span class="assignee-checkbox-label">
-                    ${user.avatar_url ? `<img src="${escapeHtml(user.avatar_url)}" alt="${name}" class="assignee-avatar-small">` : ''}
+                    ${user.avatar_url ? `<img ${avatarImgAttrs(user, 64)} alt="${name}" class="assignee-avatar-small">` : ''}
                     <span>${name} (${email})</span>
                 </span>
             </label>
@@ -1848,7 +1890,7 @@ function createTaskCard(task) {
         assigneesHtml = assignees.map(assignee => {
             const assigneeName = assignee.full_name || assignee.username;
             if (assignee.avatar_url) {
-                return `<img src="${escapeHtml(assignee.avatar_url)}" alt="${escapeHtml(assigneeName)}" class="task-assignee-avatar" title="${escapeHtml(assigneeName)}">`;
+                return `<img ${avatarImgAttrs(assignee, 64)} alt="${escapeHtml(assigneeName)}" class="task-assignee-avatar" title="${escapeHtml(assigneeName)}">`;
             } else {
                 const initials = (assigneeName || 'U').split(' ').map(p => p.charAt(0).toUpperCase()).slice(0, 2).join('') || '👤';
                 return `<div class="task-assignee-avatar task-assignee-initials" title="${escapeHtml(assigneeName)}">${initials}</div>`;
@@ -2060,8 +2102,8 @@ async function loadUpcomingDeadlines() {
     if (!currentUser) return;
     
     try {
-        // Load tasks assigned to current user
-        const tasksData = await apiCall('/tasks/?assigned_only=true');
+        // Load tasks assigned to current user (chỉ lấy các field widget cần)
+        const tasksData = await apiCall('/tasks/?assigned_only=true&fields=id,title,status,due_date,project_id');
         if (!tasksData) {
             renderUpcomingDeadlines([]);
             return;
@@ -2102,7 +2144,7 @@ function renderUpcomingDeadlines(tasks) {
         container.innerHTML = `
             <div class="empty-state" style="text-align: center; padding: 40px 20px; color: var(--text-secondary);">
                 <div style="margin-bottom: 12px;">Xin chúc mừng! Bạn đã hoàn thành toàn bộ deadline</div>
-                <img src="/assets/icon/smiling.png" alt="Smiling" style="width: 60px; height: 60px; object-fit: contain;">
+                <img src="${container.dataset.emptyIcon}" alt="Smiling" style="width: 60px; height: 60px; object-fit: contain;">
             </div>
         `;
         return;
@@ -2841,6 +2883,29 @@ function escapeHtml(text) {
     return div.innerHTML;
 }
 
+// File đính kèm tải qua /api/attachments/{id} (kiểm tra quyền). Link <a>/<img> không gửi được
+// header Authorization nên token đi qua ?token= (giống SSE); link ngoài / file cũ giữ nguyên.
+function attachmentHref(url) {
+    if (!url || !url.startsWith(`${API_BASE}/attachments/`)) return url || '';
+    return `${url}${url.includes('?') ? '&' : '?'}token=${encodeURIComponent(authToken || '')}`;
+}
+
+// Thumbnail avatar (32/64/128 px) do server tạo nền sau khi upload; chọn size ~2x kích thước hiển thị.
+// Thumbnail chưa tạo xong (404) thì onerror chuyển về ảnh gốc.
+function avatarImgAttrs(user, size) {
+    const original = user.avatar_url || '';
+    const src = user.avatar_variants?.[size] || original;
+    const attr = (value) => escapeHtml(value).replace(/"/g, '&quot;');
+    return `src="${attr(src)}" data-fallback="${attr(original)}" onerror="avatarFallback(this)" loading="lazy"`;
+}
+
+function avatarFallback(img) {
+    img.onerror = null;
+    if (img.dataset.fallback && img.src !== img.dataset.fallback) {
+        img.src = img.dataset.fallback;
+    }
+}
+
 function stripHtml(html) {
     const div = document.createElement('div');
     div.innerHTML = html || '';
@@ -2880,7 +2945,7 @@ function renderUsersTable() {
         <tr style="border-bottom: 1px solid var(--border-color);">
             <td style="padding: 12px;">
                 ${user.avatar_url 
-                    ? `<img src="${user.avatar_url}" alt="Avatar" style="width: 40px; height: 40px; border-radius: 50%; object-fit: cover; border: 1px solid var(--border-color);">`
+                    ? `<img ${avatarImgAttrs(user, 128)} alt="Avatar" style="width: 40px; height: 40px; border-radius: 50%; object-fit: cover; border: 1px solid var(--border-color);">`
                     : '<div style="width: 40px; height: 40px; border-radius: 50%; background: var(--sidebar-bg); display: flex; align-items: center; justify-content: center; font-weight: 600; color: var(--text-secondary);">' + 
                       ((user.full_name || user.username || 'U').split(' ').map(p => p.charAt(0).toUpperCase()).slice(0, 2).join('') || '👤') + 
                       '</div>'
@@ -3062,7 +3127,7 @@ async function loadThreads(shouldScrollToBottom = false) {
         return;
     }
     
-    const data = await apiCall(`/threads/?project_id=${currentProjectId}`);
+    const data = attachSideloadedUsers(await apiCall(`/threads/?project_id=${currentProjectId}&sideload_users=true`));
     if (data) {
         // Kiểm tra xem có message mới không (so sánh số lượng hoặc last message ID)
         const hasNewMessages = projectThreads.length !== data.length || 
@@ -3152,7 +3217,7 @@ function createThreadMessage(thread) {
     // Avatar HTML
     let avatarHtml = '';
     if (avatarUrl) {
-        avatarHtml = `<img src="${avatarUrl}" alt="${escapeHtml(authorName)}" class="thread-message-avatar">`;
+        avatarHtml = `<img ${avatarImgAttrs(user, 128)} alt="${escapeHtml(authorName)}" class="thread-message-avatar">`;
     } else {
         const initials = (authorName || 'U').split(' ').map(p => p.charAt(0).toUpperCase()).slice(0, 2).join('') || '👤';
         avatarHtml = `<div class="thread-message-avatar-initials">${initials}</div>`;
@@ -3414,7 +3479,7 @@ function showMentionDropdown(query) {
         const avatarUrl = user.avatar_url;
         let avatarHtml = '';
         if (avatarUrl) {
-            avatarHtml = `<img src="${avatarUrl}" alt="${escapeHtml(userName)}" class="mention-item-avatar">`;
+            avatarHtml = `<img ${avatarImgAttrs(user, 64)} alt="${escapeHtml(userName)}" class="mention-item-avatar">`;
         } else {
             const initials = userName.split(' ').map(p => p.charAt(0).toUpperCase()).slice(0, 2).join('') || '👤';
             avatarHtml = `<div class="mention-item-avatar-initials">${initials}</div>`;
@@ -3542,7 +3607,7 @@ function createCommentItem(comment) {
     // Avatar HTML
     let avatarHtml = '';
     if (avatarUrl) {
-        avatarHtml = `<img src="${avatarUrl}" alt="${escapeHtml(authorName)}" class="comment-item-avatar">`;
+        avatarHtml = `<img ${avatarImgAttrs(user, 128)} alt="${escapeHtml(authorName)}" class="comment-item-avatar">`;
     } else {
         const initials = (authorName || 'U').split(' ').map(p => p.charAt(0).toUpperCase()).slice(0, 2).join('') || '👤';
         avatarHtml = `<div class="comment-item-avatar-initials">${initials}</div>`;
@@ -3557,7 +3622,7 @@ function createCommentItem(comment) {
     if (comment.attachment_url && !comment.is_deleted) {
         attachmentHtml = `
             <div class="comment-item-attachment">
-                <img src="${comment.attachment_url}" alt="Attachment" onclick="window.open('${comment.attachment_url}', '_blank')">
+                <img src="${attachmentHref(comment.attachment_url)}" alt="Attachment" onclick="window.open(this.src, '_blank')">
             </div>
         `;
     }
@@ -3747,7 +3812,7 @@ async function loadActivities(projectId) {
         return;
     }
     
-    const data = await apiCall(`/activities/?project_id=${projectId}&limit=50`);
+    const data = attachSideloadedUsers(await apiCall(`/activities/?project_id=${projectId}&limit=50&sideload_users=true`));
     if (data) {
         projectActivities = data;
         renderActivities();
@@ -3832,7 +3897,7 @@ function createActivityItem(activity) {
     // Avatar HTML
     let avatarHtml = '';
     if (avatarUrl) {
-        avatarHtml = `<img src="${avatarUrl}" alt="${escapeHtml(authorName)}" class="activity-item-avatar">`;
+        avatarHtml = `<img ${avatarImgAttrs(user, 64)} alt="${escapeHtml(authorName)}" class="activity-item-avatar">`;
     } else {
         const initials = (authorName || 'U').split(' ').map(p => p.charAt(0).toUpperCase()).slice(0, 2).join('') || '👤';
         avatarHtml = `<div class="activity-item-avatar-initials">${initials}</div>`;
@@ -3902,28 +3967,104 @@ function stopActivityPolling() {
 }
 
 // Notifications
+let notificationStream = null;
+let notificationPollingInterval = null;
+let notificationStreamRetryTimeout = null;
+let notificationStreamRetryDelay = 5000;
+const NOTIFICATION_POLL_INTERVAL = 30000; // 30 giây - chỉ dùng khi SSE stream bị ngắt
+const NOTIFICATION_STREAM_MAX_RETRY_DELAY = 60000;
+
+function setNotificationBadge(count) {
+    const badge = document.getElementById('notificationBadge');
+    if (!badge) return;
+    if (count > 0) {
+        badge.textContent = count > 99 ? '99+' : count;
+        badge.style.display = 'flex';
+    } else {
+        badge.style.display = 'none';
+    }
+}
+
 async function loadNotificationCount() {
     if (!currentUser) return;
     
     try {
         const data = await apiCall('/notifications/unread-count');
-        if (data && data.count > 0) {
-            const badge = document.getElementById('notificationBadge');
-            if (badge) {
-                badge.textContent = data.count > 99 ? '99+' : data.count;
-                badge.style.display = 'flex';
-            }
-        } else {
-            const badge = document.getElementById('notificationBadge');
-            if (badge) {
-                badge.style.display = 'none';
-            }
-        }
+        setNotificationBadge(data ? data.count : 0);
     } catch (error) {
         console.error('Error loading notification count:', error);
     }
 }
 
+function startNotificationStream() {
+    if (!currentUser || !authToken) return;
+    if (typeof EventSource === 'undefined') {
+        startNotificationPolling();
+        return;
+    }
+
+    stopNotificationStream();
+    notificationStream = new EventSource(`${API_BASE}/notifications/stream?token=${encodeURIComponent(authToken)}`);
+
+    notificationStream.onopen = () => {
+        notificationStreamRetryDelay = 5000;
+        stopNotificationPolling();
+    };
+
+    notificationStream.addEventListener('unread_count', (event) => {
+        const data = JSON.parse(event.data);
+        setNotificationBadge(data.count);
+    });
+
+    notificationStream.addEventListener('notification', (event) => {
+        const data = JSON.parse(event.data);
+        setNotificationBadge(data.unread_count);
+        if (currentView === 'notifications') {
+            loadNotifications();
+        }
+    });
+
+    // Server bỏ bớt event vì client đọc không kịp - tải lại trạng thái đầy đủ
+    notificationStream.addEventListener('resync', () => {
+        loadNotificationCount();
+        if (currentView === 'notifications') {
+            loadNotifications();
+        }
+    });
+
+    notificationStream.onerror = () => {
+        // Stream bị ngắt: quay về polling và thử kết nối lại với backoff
+        stopNotificationStream();
+        startNotificationPolling();
+        notificationStreamRetryTimeout = setTimeout(startNotificationStream, notificationStreamRetryDelay);
+        notificationStreamRetryDelay = Math.min(notificationStreamRetryDelay * 2, NOTIFICATION_STREAM_MAX_RETRY_DELAY);
+    };
+}
+
+function stopNotificationStream() {
+    if (notificationStreamRetryTimeout) {
+        clearTimeout(notificationStreamRetryTimeout);
+        notificationStreamRetryTimeout = null;
+    }
+    if (notificationStream) {
+        notificationStream.close();
+        notificationStream = null;
+    }
+}
+
+function startNotificationPolling() {
+    if (notificationPollingInterval) return;
+    loadNotificationCount();
+    notificationPollingInterval = setInterval(loadNotificationCount, NOTIFICATION_POLL_INTERVAL);
+}
+
+function stopNotificationPolling() {
+    if (notificationPollingInterval) {
+        clearInterval(notificationPollingInterval);
+        notificationPollingInterval = null;
+    }
+}
+
 async function loadNotifications() {
     if (!currentUser) return;
     